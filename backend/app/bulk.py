@@ -0,0 +1,223 @@
+"""
+Bulk lead import and export.
+
+Import reads a CSV (header row naming LeadCreate fields) or JSONL upload row by row,
+validates each row with schemas.LeadCreate, skips emails that already exist (in the
+table or earlier in the file) and inserts in IMPORT_BATCH-row executemany batches,
+committing each batch. Memory depends on the batch size, not the file size: duplicate
+detection asks the database about each batch instead of remembering every email, and
+only the first MAX_ERRORS row errors are kept. Each batch's profile vectors go into
+lead_embeddings in the same transaction. With dedup=True each batch is also checked
+against the leads stored so far, earlier batches included, for near-duplicates
+(similarity.find_duplicates); those rows are still inserted, only reported.
+
+Export streams leads in id order from a server-side cursor (yield_per), so the
+response starts immediately and never holds the table in memory.
+"""
+
+import csv, io, json, time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, now_utc
+from . import models, schemas, search
+
+IMPORT_BATCH = 5000
+MAX_ERRORS = 1000          # row errors reported back; the count keeps going
+EXPORT_YIELD_PER = 2000    # rows per server-side cursor fetch
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+FORMATS = ("csv", "jsonl")
+MEDIA_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+LEAD_FIELDS = tuple(schemas.LeadCreate.model_fields)
+EXPORT_COLUMNS = (
+    "id", "company", "contact_name", "email", "title", "website", "notes", "score", "stage",
+    "industry_score", "size_score", "intent_score", "data_quality_score", "created_at", "updated_at",
+)
+
+
+def detect_format(filename: Optional[str], explicit: Optional[str] = None) -> str:
+    """Explicit ?format= wins, then the file extension; CSV otherwise."""
+    if explicit:
+        fmt = {"ndjson": "jsonl"}.get(explicit.lower(), explicit.lower())
+    else:
+        ext = (filename or "").rsplit(".", 1)[-1].lower()
+        fmt = "jsonl" if ext in ("jsonl", "ndjson") else "csv"
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format {explicit!r}; use csv or jsonl")
+    return fmt
+
+
+# ---- import ----
+
+def iter_rows(binary, fmt: str) -> Iterator[tuple]:
+    """(row_number, dict or error string) for each record of a binary file-like object."""
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        if reader.fieldnames:
+            reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames]
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, f"invalid JSON: {e}"
+            continue
+        yield number, row if isinstance(row, dict) else "expected a JSON object"
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()
+    )
+
+
+def _clean(row: Dict) -> Dict:
+    """Only LeadCreate fields; blank CSV cells count as missing."""
+    return {k: v for k, v in row.items() if k in LEAD_FIELDS and v not in (None, "")}
+
+
+class ImportReport:
+    def __init__(self):
+        self.total = self.inserted = self.duplicates = self.failed = 0
+        self.errors: List[Dict] = []
+        self.possible_duplicates: List[Dict] = []
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def possible_duplicate(self, row: int, lead_id: int, similarity: float):
+        if len(self.possible_duplicates) < MAX_ERRORS:
+            self.possible_duplicates.append({"row": row, "lead_id": lead_id, "similarity": similarity})
+
+
+def _existing_emails(db: Session, emails: Iterable[str]) -> set:
+    return set(db.execute(select(models.Lead.email).where(models.Lead.email.in_(list(emails)))).scalars())
+
+
+def _insert(db: Session, rows: List[Dict]):
+    now = now_utc()
+    defaults = {"notes": "", "score": 0.0, "stage": "new", "created_at": now, "updated_at": now}
+    db.execute(insert(models.Lead), [
+        {**row, **{k: v for k, v in defaults.items() if row.get(k) is None}} for row in rows
+    ])
+
+
+def _store_vectors(db: Session, rows: List[Dict]):
+    from . import similarity  # NumPy; loaded by the first import, not at server start
+
+    ids = dict(db.execute(
+        select(models.Lead.email, models.Lead.id).where(models.Lead.email.in_([row["email"] for row in rows]))
+    ).all())
+    similarity.store(db, [{**row, "id": ids[row["email"]]} for row in rows])
+
+
+def _flush(db: Session, batch: Dict[str, Dict], lines: Dict[str, int], report: ImportReport, dedup: bool):
+    if not batch:
+        return
+    taken = _existing_emails(db, batch)
+    rows = [row for email, row in batch.items() if email not in taken]
+    report.duplicates += len(batch) - len(rows)
+    if rows:
+        if dedup:
+            from . import similarity
+
+            for n, lead_id, score in similarity.find_duplicates(db, rows):
+                report.possible_duplicate(lines[rows[n]["email"]], lead_id, score)
+        _insert(db, rows)
+        _store_vectors(db, rows)
+        report.inserted += len(rows)
+    db.commit()
+    batch.clear()
+    lines.clear()
+
+
+def import_leads(db: Session, binary, fmt: str, batch_size: int = IMPORT_BATCH,
+                 dedup: bool = False) -> schemas.ImportResult:
+    """Stream rows from `binary` into leads. Records an "import" Job with the totals."""
+    started = time.perf_counter()
+    report = ImportReport()
+    batch: Dict[str, Dict] = {}  # email -> row; also dedupes within the batch
+    lines: Dict[str, int] = {}   # email -> line number, for the duplicate report
+    for number, row in iter_rows(binary, fmt):
+        report.total += 1
+        if isinstance(row, str):
+            report.error(number, row)
+            continue
+        try:
+            lead = schemas.LeadCreate(**_clean(row))
+        except ValidationError as e:
+            report.error(number, _validation_message(e))
+            continue
+        data = lead.model_dump()
+        if data["email"] in batch:
+            report.duplicates += 1
+            continue
+        batch[data["email"]] = data
+        lines[data["email"]] = number
+        if len(batch) >= batch_size:
+            _flush(db, batch, lines, report, dedup)
+    _flush(db, batch, lines, report, dedup)
+
+    job = models.Job(
+        kind="import", status="done", total=report.total, done=report.inserted, failed=report.failed,
+        params=json.dumps({"format": fmt, "duplicates": report.duplicates}),
+        started_at=now_utc(), finished_at=now_utc(),
+    )
+    db.add(job)
+    db.commit()
+    return schemas.ImportResult(
+        job_id=job.id, total=report.total, inserted=report.inserted, duplicates=report.duplicates,
+        failed=report.failed, errors=report.errors, possible_duplicates=report.possible_duplicates,
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+
+# ---- export ----
+
+def _value(v):
+    return v.isoformat() if hasattr(v, "isoformat") else v
+
+
+def export_leads(fmt: str, stage: Optional[str] = None, q: Optional[str] = None) -> Iterator[str]:
+    """
+    Yields the export in ~EXPORT_FLUSH_BYTES text chunks. Opens its own session: the
+    response body is produced after the request's dependencies have been closed.
+    """
+    columns = [getattr(models.Lead, c) for c in EXPORT_COLUMNS]
+    with SessionLocal() as db:
+        query = db.query(*columns)
+        if stage:
+            query = query.filter(models.Lead.stage == stage)
+        if q:
+            query = search.filter_matching(query, q)
+        rows = db.execute(
+            query.order_by(models.Lead.id).statement.execution_options(yield_per=EXPORT_YIELD_PER)
+        )
+        buf = io.StringIO()
+        writer = csv.writer(buf) if fmt == "csv" else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            values = [_value(v) for v in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False))
+                buf.write("\n")
+            if buf.tell() >= EXPORT_FLUSH_BYTES:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
@@ -0,0 +1,193 @@
+"""
+Content-addressed cache for Grok completions.
+
+Key = sha256 over (model, messages, temperature, max tokens), so an unchanged lead
+re-scored at temperature 0 maps to the same entry. Two tiers:
+- in-process LRU (fast, per worker)
+- SQLite file (shared by workers on the box, survives restarts)
+Both tiers have a TTL and a max item count; least-recently-used entries are evicted first.
+"""
+
+import hashlib, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+ENABLED = os.getenv("GROK_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("GROK_CACHE_PATH", "./grok_cache.db")  # "" disables the disk tier
+TTL = float(os.getenv("GROK_CACHE_TTL", str(7 * 24 * 3600)))
+MEMORY_MAX_ITEMS = int(os.getenv("GROK_CACHE_MEMORY_ITEMS", "1024"))
+DISK_MAX_ITEMS = int(os.getenv("GROK_CACHE_DISK_ITEMS", "100000"))
+
+
+def cache_key(model: str, messages, temperature: float, max_tokens: int, **extra) -> str:
+    """Stable hash of everything that determines the completion."""
+    blob = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature,
+         "max_tokens": max_tokens, **extra},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """OrderedDict LRU with per-entry expiry. Not shared across processes."""
+
+    def __init__(self, max_items: int = MEMORY_MAX_ITEMS, ttl: float = TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """SQLite-backed tier. Evicts expired rows, then least-recently-accessed ones above max_items."""
+
+    PRUNE_EVERY = 64  # writes between eviction passes
+
+    def __init__(self, path: str = CACHE_PATH, max_items: int = DISK_MAX_ITEMS, ttl: float = TTL):
+        self.path = path
+        self.max_items = max_items
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed ON responses (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + (self.ttl if ttl is None else ttl), now),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        self.evictions += self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,)).rowcount
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_items:
+            self.evictions += self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_items,),
+            ).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Memory tier in front of the disk tier, with hit/miss counters."""
+
+    def __init__(self, memory: LRUCache, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.counters["disk_hits"] += 1
+                self.memory.set(key, value)  # promote
+                return value
+        self.counters["misses"] += 1
+        return None
+
+    def set(self, key: str, value: str):
+        self.counters["stores"] += 1
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def bypass(self):
+        self.counters["bypassed"] += 1
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict:
+        c = self.counters
+        lookups = c["memory_hits"] + c["disk_hits"] + c["misses"]
+        return {
+            **c,
+            "hit_rate": round((c["memory_hits"] + c["disk_hits"]) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_items": len(self.disk) if self.disk is not None else 0,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    """Process-wide cache, created on first use so importing this module touches no files."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(LRUCache(), DiskCache() if CACHE_PATH else None)
+    return _cache
@@ -0,0 +1,125 @@
+"""
+Campaign drafting: outreach emails for many leads with few model calls.
+
+`draft_pack` puts up to CampaignCreate.pack_size leads in one schema-constrained request
+(CAMPAIGN_PROMPT), so the system prompt, instructions and round trip are paid once per
+pack instead of once per lead, then splits the reply back out by lead_id. Leads the
+reply leaves out (or garbles) are drafted one by one with the regular OUTREACH_PROMPT.
+The job runner and the bulk Message inserts live in jobs.py.
+"""
+
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from . import qualification, schemas
+from .grok_client import GrokAPIError, achat
+from .prompts import CAMPAIGN_LEAD, CAMPAIGN_PROMPT, OUTREACH_PROMPT, SALES_SYSTEM_PROMPT
+
+TOKENS_PER_EMAIL = 300  # same budget as a single draft
+
+CAMPAIGN_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "outreach_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "emails": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"lead_id": {"type": "integer"}, "email": {"type": "string"}},
+                        "required": ["lead_id", "email"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["emails"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# packed: drafted from a pack reply, single: fallback per-lead calls, calls: model requests
+COUNTS: Counter = Counter()
+
+
+def _context(lead, req: schemas.CampaignCreate) -> str:
+    return req.extra_context or lead.notes or "No extra context"
+
+
+def pack_messages(leads, req: schemas.CampaignCreate) -> List[Dict]:
+    listing = "\n".join(
+        CAMPAIGN_LEAD.format(id=lead.id, contact_name=lead.contact_name, company=lead.company,
+                             title=lead.title or "Unknown", context=_context(lead, req))
+        for lead in leads
+    )
+    prompt = CAMPAIGN_PROMPT.format(tone=req.tone, cta=req.call_to_action, leads=listing)
+    return [{"role": "system", "content": SALES_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def single_messages(lead, req: schemas.CampaignCreate) -> List[Dict]:
+    prompt = OUTREACH_PROMPT.format(
+        contact_name=lead.contact_name, company=lead.company, title=lead.title or "Unknown",
+        context=_context(lead, req), tone=req.tone, cta=req.call_to_action,
+    )
+    return [{"role": "system", "content": SALES_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def split_reply(content: str, lead_ids) -> Dict[int, str]:
+    """lead_id -> email for the ids asked about; anything unparseable, unknown or empty is dropped."""
+    try:
+        data = qualification.parse_json(content)
+    except ValueError:
+        data = qualification.extract_json(content, keys=("emails",))
+    entries = data.get("emails") if isinstance(data, dict) else None
+    wanted, drafts = set(lead_ids), {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            lead_id = int(entry.get("lead_id"))
+        except (TypeError, ValueError):
+            continue
+        email = entry.get("email")
+        if lead_id in wanted and lead_id not in drafts and isinstance(email, str) and email.strip():
+            drafts[lead_id] = email.strip()
+    return drafts
+
+
+async def _ask_pack(messages: List[Dict], max_tokens: int) -> str:
+    if qualification.STRUCTURED_OUTPUT:
+        try:
+            return await achat(messages, temperature=0.4, max_tokens=max_tokens,
+                               response_format=CAMPAIGN_SCHEMA)
+        except GrokAPIError as e:
+            if not qualification.structured_rejected(e):
+                raise
+    return await achat(messages, temperature=0.4, max_tokens=max_tokens)
+
+
+async def draft_pack(leads, req: schemas.CampaignCreate) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """(drafts, errors), both keyed by lead id. One call for the pack, one per lead it missed."""
+    drafts: Dict[int, str] = {}
+    if len(leads) > 1:
+        COUNTS["calls"] += 1
+        content = await _ask_pack(pack_messages(leads, req), TOKENS_PER_EMAIL * len(leads))
+        drafts = split_reply(content, [lead.id for lead in leads])
+        COUNTS["packed"] += len(drafts)
+    errors: Dict[int, str] = {}
+    for lead in leads:
+        if lead.id in drafts:
+            continue
+        COUNTS["calls"] += 1
+        try:
+            content = await achat(single_messages(lead, req), temperature=0.4, max_tokens=TOKENS_PER_EMAIL)
+        except Exception as e:
+            errors[lead.id] = f"{type(e).__name__}: {e}"
+            continue
+        if content and content.strip():
+            drafts[lead.id] = content.strip()
+            COUNTS["single"] += 1
+        else:
+            errors[lead.id] = "Empty draft"
+    return drafts, errors
@@ -0,0 +1,77 @@
+"""
+In-process request coalescing.
+
+`SingleFlight.do(key, factory)`: concurrent callers with the same key share one
+execution of `factory()` and its result (or exception). The work runs as its own
+task, so a caller that goes away (client disconnect) doesn't cancel it for the others.
+
+`KeyedLocks.hold(key)`: one asyncio.Lock per key (a lead id), dropped once nobody
+holds or waits on it.
+
+Both are per process. Across workers, score writes stay safe because the stage is
+decided inside the UPDATE itself (qualification.SCORE_WRITE).
+"""
+
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.counters = Counter()  # leaders: executions started, joined: callers that shared one
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """(result, shared); shared is True for callers that joined someone else's execution."""
+        task = self._inflight.get(key)
+        shared = task is not None and not task.done()
+        if shared:
+            self.counters["joined"] += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.counters["leaders"] += 1
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller has gone
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+class KeyedLocks:
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users = Counter()
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                self._locks.pop(key, None)
+
+
+grok_calls = SingleFlight()  # identical upstream requests (grok_client)
+lead_ops = SingleFlight()    # identical score / draft requests for one lead (main)
+lead_locks = KeyedLocks()    # serializes scoring of one lead
+
+
+def stats() -> Dict:
+    return {
+        "grok_calls": {**grok_calls.counters, "in_flight": grok_calls.in_flight()},
+        "lead_ops": {**lead_ops.counters, "in_flight": lead_ops.in_flight()},
+    }
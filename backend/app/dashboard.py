@@ -0,0 +1,201 @@
+"""
+Pipeline dashboard aggregates.
+
+`pipeline_stats` holds one counter per (metric, bucket): leads per stage, leads per
+score decile and activities per UTC day. Database triggers on `leads` and `activities`
+adjust the counters in the same transaction as the write, so every path that changes
+a stage or score (handlers, scoring and campaign jobs, rescore, imports, raw SQL) is
+covered without application code, and reading the dashboard touches a few dozen rows
+however large the tables get.
+
+SQLite uses row triggers with upserts. PostgreSQL uses statement triggers over
+transition tables, so a bulk statement costs one upsert per bucket rather than one
+per row; buckets are written in sorted order to keep concurrent writers from
+deadlocking on the counter rows. `rebuild_stats` recomputes everything from the base
+tables (python -m app.manage rebuild-stats) after restoring a backup or editing
+with triggers disabled.
+"""
+
+from datetime import timedelta
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import now_utc
+
+STAGE_ORDER = ("new", "qualified", "contacted", "meeting", "won", "lost")
+DAYS = 30  # activity history shown by default
+
+
+def _score_bucket(dialect: str, col: str) -> str:
+    """SQL for a score's decile label: '00', '10', ... '90' (100 lands in '90'), 'none' for NULL."""
+    if dialect == "postgresql":
+        return (f"coalesce(lpad((least(greatest(floor({col} / 10)::int, 0), 9) * 10)::text, 2, '0'),"
+                f" 'none')")
+    return f"coalesce(printf('%02d', min(max(cast({col} / 10 AS INTEGER), 0), 9) * 10), 'none')"
+
+
+def _day(dialect: str, col: str) -> str:
+    if dialect == "postgresql":
+        return f"coalesce(to_char({col} AT TIME ZONE 'UTC', 'YYYY-MM-DD'), 'none')"
+    return f"coalesce(substr({col}, 1, 10), 'none')"
+
+
+def _buckets(dialect: str, prefix: str = "") -> Dict[str, str]:
+    """metric -> bucket expression over a leads / activities row."""
+    return {
+        "stage": f"coalesce({prefix}stage, 'none')",
+        "score": _score_bucket(dialect, f"{prefix}score"),
+        "activity_day": _day(dialect, f"{prefix}created_at"),
+    }
+
+
+_UPSERT = (
+    "INSERT INTO pipeline_stats (metric, bucket, count) VALUES ('{metric}', {bucket}, {delta})"
+    " ON CONFLICT (metric, bucket) DO UPDATE SET count = pipeline_stats.count + excluded.count"
+)
+
+
+def sqlite_ddl() -> List[str]:
+    new, old = _buckets("sqlite", "new."), _buckets("sqlite", "old.")
+
+    def body(*steps):
+        return " ".join(_UPSERT.format(metric=m, bucket=b, delta=d) + ";" for m, b, d in steps)
+
+    return [
+        "CREATE TRIGGER IF NOT EXISTS pipeline_stats_leads_ai AFTER INSERT ON leads BEGIN "
+        + body(("stage", new["stage"], 1), ("score", new["score"], 1)) + " END",
+        "CREATE TRIGGER IF NOT EXISTS pipeline_stats_leads_ad AFTER DELETE ON leads BEGIN "
+        + body(("stage", old["stage"], -1), ("score", old["score"], -1)) + " END",
+        "CREATE TRIGGER IF NOT EXISTS pipeline_stats_leads_stage AFTER UPDATE OF stage ON leads"
+        " WHEN old.stage IS NOT new.stage BEGIN "
+        + body(("stage", old["stage"], -1), ("stage", new["stage"], 1)) + " END",
+        "CREATE TRIGGER IF NOT EXISTS pipeline_stats_leads_score AFTER UPDATE OF score ON leads"
+        f" WHEN {old['score']} IS NOT {new['score']} BEGIN "
+        + body(("score", old["score"], -1), ("score", new["score"], 1)) + " END",
+        "CREATE TRIGGER IF NOT EXISTS pipeline_stats_activities_ai AFTER INSERT ON activities BEGIN "
+        + body(("activity_day", new["activity_day"], 1)) + " END",
+        "CREATE TRIGGER IF NOT EXISTS pipeline_stats_activities_ad AFTER DELETE ON activities BEGIN "
+        + body(("activity_day", old["activity_day"], -1)) + " END",
+    ]
+
+
+def _pg_deltas(metrics: List[str], table: str, sign: int) -> str:
+    b = _buckets("postgresql")
+    return " UNION ALL ".join(f"SELECT '{m}' AS metric, {b[m]} AS bucket, {sign} AS delta FROM {table}"
+                              for m in metrics)
+
+
+def _pg_function(name: str, metrics: List[str]) -> str:
+    def apply(deltas: str) -> str:
+        return (
+            "INSERT INTO pipeline_stats AS s (metric, bucket, count)"
+            f" SELECT metric, bucket, sum(delta) FROM ({deltas}) d"
+            " GROUP BY metric, bucket HAVING sum(delta) <> 0 ORDER BY metric, bucket"
+            " ON CONFLICT (metric, bucket) DO UPDATE SET count = s.count + excluded.count;"
+        )
+
+    both = _pg_deltas(metrics, "new_rows", 1) + " UNION ALL " + _pg_deltas(metrics, "old_rows", -1)
+    return (
+        f"CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN"
+        f" IF TG_OP = 'INSERT' THEN {apply(_pg_deltas(metrics, 'new_rows', 1))}"
+        f" ELSIF TG_OP = 'DELETE' THEN {apply(_pg_deltas(metrics, 'old_rows', -1))}"
+        f" ELSE {apply(both)} END IF; RETURN NULL; END $$"
+    )
+
+
+def pg_ddl() -> List[str]:
+    ddl = [
+        _pg_function("pipeline_stats_leads", ["stage", "score"]),
+        _pg_function("pipeline_stats_activities", ["activity_day"]),
+    ]
+    for table, ops in (("leads", ("insert", "update", "delete")), ("activities", ("insert", "delete"))):
+        for op in ops:
+            rows = {"insert": "NEW TABLE AS new_rows", "delete": "OLD TABLE AS old_rows",
+                    "update": "OLD TABLE AS old_rows NEW TABLE AS new_rows"}[op]
+            name = f"pipeline_stats_{table}_{op}"
+            ddl += [
+                f"DROP TRIGGER IF EXISTS {name} ON {table}",
+                f"CREATE TRIGGER {name} AFTER {op.upper()} ON {table} REFERENCING {rows}"
+                f" FOR EACH STATEMENT EXECUTE FUNCTION pipeline_stats_{table}()",
+            ]
+    return ddl
+
+
+def _installed(conn, dialect: str) -> bool:
+    if dialect == "postgresql":
+        sql = "SELECT 1 FROM pg_trigger WHERE tgname = 'pipeline_stats_leads_insert'"
+    else:
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'pipeline_stats_leads_ai'"
+    return conn.execute(text(sql)).first() is not None
+
+
+def install_stats(engine: Engine) -> bool:
+    """
+    Create the counter triggers if missing (idempotent) and fill the counters the first
+    time. Returns False on other dialects, where the counters stay empty.
+    """
+    dialect = engine.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return False
+    with engine.begin() as conn:
+        existed = _installed(conn, dialect)
+        for ddl in (pg_ddl() if dialect == "postgresql" else sqlite_ddl()):
+            if dialect == "postgresql" and existed and not ddl.startswith("CREATE OR REPLACE"):
+                continue  # triggers already there; functions are refreshed
+            conn.execute(text(ddl))
+    if not existed:
+        rebuild_stats(engine)
+    return True
+
+
+def rebuild_stats(engine: Engine):
+    """Recompute every counter from leads and activities in one transaction."""
+    dialect = engine.dialect.name
+    b = _buckets(dialect)
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            # hold writers off so no trigger delta lands between the wipe and the recount
+            conn.execute(text("LOCK TABLE leads, activities IN SHARE ROW EXCLUSIVE MODE"))
+            conn.execute(text("LOCK TABLE pipeline_stats IN EXCLUSIVE MODE"))
+        conn.execute(text("DELETE FROM pipeline_stats"))
+        for metric, table in (("stage", "leads"), ("score", "leads"), ("activity_day", "activities")):
+            conn.execute(text(
+                f"INSERT INTO pipeline_stats (metric, bucket, count)"
+                f" SELECT '{metric}', {b[metric]}, count(*) FROM {table} GROUP BY {b[metric]}"
+            ))
+
+
+def _counters(db: Session, day_from: str) -> Dict[str, Dict[str, int]]:
+    stat = models.PipelineStat
+    rows = db.query(stat.metric, stat.bucket, stat.count).filter(
+        (stat.metric != "activity_day") | (stat.bucket >= day_from)
+    )
+    out: Dict[str, Dict[str, int]] = {"stage": {}, "score": {}, "activity_day": {}}
+    for metric, bucket, count in rows:
+        if count:
+            out.setdefault(metric, {})[bucket] = count
+    return out
+
+
+def summary(db: Session, days: int = DAYS) -> Dict:
+    """Funnel, score distribution and the last `days` days of activity, from the counters."""
+    today = now_utc().date()
+    first = today - timedelta(days=days - 1)
+    counters = _counters(db, first.isoformat())
+    stages = counters["stage"]
+    order = [s for s in STAGE_ORDER if s in stages] + sorted(set(stages) - set(STAGE_ORDER))
+    per_day = counters["activity_day"]
+    return {
+        "total_leads": sum(stages.values()),
+        "stages": [{"stage": s, "count": stages[s]} for s in order],
+        "scores": [{"bucket": f"{d}-{d + 9 if d < 90 else 100}", "count": counters["score"].get(f"{d:02d}", 0)}
+                   for d in range(0, 100, 10)],
+        "activity_per_day": [
+            {"day": day, "count": per_day.get(day, 0)}
+            for day in ((first + timedelta(days=i)).isoformat() for i in range(days))
+        ],
+    }
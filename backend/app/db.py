@@ -1,15 +1,105 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 from datetime import datetime, timezone  # for timezone-aware timestamps
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sdr.db"
+from . import telemetry
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SQLite for local dev; point several uvicorn workers at one shared database with e.g.
+# DATABASE_URL=postgresql+psycopg://user:pass@db:5432/sdr
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sdr.db")
+
+# Connection pool (server databases; SQLite ignores size/overflow/timeout/recycle)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; stay under server idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+# Create tables on app startup. Turn off in multi-worker deployments and run
+# `python -m app.manage init-db` once instead.
+AUTO_CREATE_SCHEMA = os.getenv("DB_AUTO_CREATE", "1") != "0"
+
+# WAL lets readers run alongside the single writer, and synchronous=NORMAL fsyncs
+# at checkpoints instead of on every commit (still crash-safe in WAL mode).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,       # ms to wait on a locked database instead of failing
+    "temp_store": "MEMORY",
+    "cache_size": -32000,       # KiB (negative = size, not pages)
+    "mmap_size": 268435456,
+}
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, **overrides) -> Engine:
+    """Engine with dialect-appropriate pool settings; `overrides` go straight to create_engine."""
+    backend = make_url(url).get_backend_name()
+    kwargs = {"pool_pre_ping": DB_POOL_PRE_PING, "echo": DB_ECHO}
+    if backend == "sqlite":
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            # one shared in-memory database instead of one per connection
+            kwargs["poolclass"] = StaticPool
+    else:
+        kwargs.update(
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+        )
+    kwargs.update(overrides)
+    new_engine = create_engine(url, **kwargs)
+    if backend == "sqlite":
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    telemetry.instrument_engine(new_engine)
+    return new_engine
+
+engine = make_engine()
+
+# expire_on_commit=False: handlers read lead.score etc. after commit without a refresh SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
+def create_missing_indexes(bind=None):
+    """create_all() only builds indexes with new tables; add ones declared later on existing tables."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind or engine, checkfirst=True)
+
+def add_missing_columns(bind=None):
+    """
+    create_all() never alters existing tables; add nullable columns declared since.
+    Only covers additive, nullable columns; anything else needs a real migration.
+    """
+    bind = bind or engine
+    existing = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not existing.has_table(table.name):
+                continue
+            present = {c["name"] for c in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+def init_db(bind=None):
+    """Create tables, columns, indexes, the search index and dashboard counters. Idempotent; never runs at import."""
+    from . import dashboard, models, search  # noqa: F401  (registers the tables on Base)
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    create_missing_indexes(bind)
+    search.install_fts(bind)
+    dashboard.install_stats(bind)
+
 def get_db():
     db = SessionLocal()
     try:
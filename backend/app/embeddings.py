@@ -0,0 +1,109 @@
+"""
+Text embedders for lead similarity (see similarity.py).
+
+An embedder has a `name` (stored with every vector, so vectors from another embedder
+are never compared), a `dim`, and `embed(texts)` returning an (n, dim) float32 array
+of L2-normalised rows. EMBEDDER picks one: a key of EMBEDDERS, or "package.module:factory"
+for your own (e.g. a hosted embedding model).
+
+The default "hashing" embedder needs no model or network. Word tokens and character
+trigrams of the normalised text (lower-cased, accents and legal suffixes dropped) are
+hashed into `dim` signed buckets, so "Contoso Inc." and "contoso" embed identically and
+"Contosso" lands close by. Hashes are CRC32, not hash(), so vectors are the same in every
+process and on every machine.
+"""
+
+import importlib, os, re, unicodedata, zlib
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EMBEDDER = os.getenv("EMBEDDER", "hashing")
+EMBED_DIM = int(os.getenv("EMBED_DIM", "128"))
+
+# weights of the lead fields in its profile vector; the company dominates so that
+# near-duplicates rank first, title and notes pull in lookalikes
+FIELD_WEIGHTS = {"company": 2.0, "title": 1.0, "notes": 1.0}
+
+# legal forms and filler that don't tell two companies apart
+STOPWORDS = frozenset(
+    "inc incorporated llc llp ltd limited corp corporation co company gmbh ag sa sas bv nv plc pty"
+    " the and of".split()
+)
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(w for w in _NON_ALNUM.sub(" ", text).split() if w not in STOPWORDS)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class HashingEmbedder:
+    """Feature-hashing bag of words + character trigrams; deterministic and offline."""
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        # words repeat heavily across leads (company names, titles); hash each once
+        self._word = lru_cache(maxsize=100_000)(self._word_features)
+
+    def _word_features(self, word: str) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+        padded = f" {word} "
+        feats = [f"w:{word}"] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+        hashes = [zlib.crc32(f.encode()) for f in feats]
+        return tuple(h % self.dim for h in hashes), tuple(1.0 if h >> 31 else -1.0 for h in hashes)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        cols: List[int] = []
+        signs: List[float] = []
+        for row, text in enumerate(texts):
+            for word in normalize(text).split():
+                idx, sign = self._word(word)
+                rows.extend([row] * len(idx))
+                cols.extend(idx)
+                signs.extend(sign)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(out, (rows, cols), np.asarray(signs, dtype=np.float32))
+        return normalize_rows(out)
+
+
+EMBEDDERS: Dict[str, Callable] = {"hashing": HashingEmbedder}
+
+_embedder = None
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        if EMBEDDER in EMBEDDERS:
+            _embedder = EMBEDDERS[EMBEDDER]()
+        else:
+            module, _, factory = EMBEDDER.partition(":")
+            _embedder = getattr(importlib.import_module(module), factory)()
+    return _embedder
+
+
+def _field(lead, name: str) -> str:
+    value = lead.get(name) if isinstance(lead, dict) else getattr(lead, name, None)
+    return value or ""
+
+
+def lead_vectors(leads: Sequence, embedder=None) -> np.ndarray:
+    """
+    Profile vectors for leads (ORM objects, rows or dicts with company/title/notes):
+    the FIELD_WEIGHTS-weighted sum of each field's embedding, normalised. One embed call.
+    """
+    embedder = embedder or get_embedder()
+    fields = list(FIELD_WEIGHTS)
+    parts = embedder.embed([_field(lead, f) for lead in leads for f in fields])
+    parts = parts.reshape(len(leads), len(fields), -1)
+    weights = np.asarray([FIELD_WEIGHTS[f] for f in fields], dtype=np.float32)
+    return normalize_rows(np.einsum("nfd,f->nd", parts, weights)).astype(np.float32, copy=False)
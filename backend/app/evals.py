@@ -1,13 +1,25 @@
 """
 Evals helper module.
 
-Currently, the main eval logic is implemented directly in main.py under
-the /evals/run endpoint. This file is reserved per (what I understand of)
-best practices for hypothetical future reusable evaluation functions
-or scenario definitions.
+Scenarios live in files (app/eval_scenarios/<suite>.jsonl or .json) and are parsed
+into schemas.EvalScenario. `run_suite` fans every (scenario, sample) pair out
+concurrently under a cap, checks each output with `basic_eval` plus any extra
+checkers named in the scenario, and `save_run` persists the results so runs can
+be compared over time.
 """
 
-from typing import Dict, List
+import asyncio, json, math, os, re, time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .prompts import SALES_SYSTEM_PROMPT
+
+SCENARIO_DIR = Path(os.getenv("EVAL_SCENARIO_DIR", Path(__file__).resolve().parent / "eval_scenarios"))
+DEFAULT_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "16"))
 
 def basic_eval(output: str, must_include: str = None,
                must_not_include: str = None,
@@ -32,3 +44,160 @@ def basic_eval(output: str, must_include: str = None,
         notes.append(f"too long ({len(output.split())}>{max_words})")
 
     return {"ok": ok, "notes": "; ".join(notes) if notes else "pass"}
+
+
+# ---- checker registry ----
+# A checker takes (output, scenario) and returns the same {ok, notes} dict as basic_eval.
+
+CHECKS: Dict[str, Callable[[str, schemas.EvalScenario], Dict]] = {}
+
+def register_check(name: str):
+    def deco(fn):
+        CHECKS[name] = fn
+        return fn
+    return deco
+
+@register_check("no_placeholders")
+def no_placeholders(output: str, scenario: schemas.EvalScenario) -> Dict:
+    """Template residue such as [[FILL]], {{name}} or [Company]."""
+    found = re.findall(r"\[\[.*?\]\]|\{\{.*?\}\}|\[(?:Name|Company|Title|Your Name)\]", output)
+    if found:
+        return {"ok": False, "notes": f"placeholder leaked ({found[0]})"}
+    return {"ok": True, "notes": "pass"}
+
+@register_check("calendar_link")
+def calendar_link(output: str, scenario: schemas.EvalScenario) -> Dict:
+    if "cal.example/xai" not in output:
+        return {"ok": False, "notes": "missing calendar link"}
+    return {"ok": True, "notes": "pass"}
+
+@register_check("json")
+def valid_json(output: str, scenario: schemas.EvalScenario) -> Dict:
+    try:
+        json.loads(output.strip().strip("`").removeprefix("json"))
+    except ValueError:
+        return {"ok": False, "notes": "not valid JSON"}
+    return {"ok": True, "notes": "pass"}
+
+def check_output(output: str, scenario: schemas.EvalScenario) -> Dict:
+    """basic_eval with the scenario's limits, then every extra checker it names."""
+    results = [basic_eval(output, scenario.must_include, scenario.must_not_include, scenario.max_words)]
+    for name in scenario.checks:
+        check = CHECKS.get(name)
+        if check is None:
+            results.append({"ok": False, "notes": f"unknown check '{name}'"})
+        else:
+            results.append(check(output, scenario))
+    notes = [r["notes"] for r in results if not r["ok"]]
+    return {"ok": not notes, "notes": "; ".join(notes) if notes else "pass"}
+
+
+# ---- scenario registry ----
+
+def load_scenarios(path) -> List[schemas.EvalScenario]:
+    """A .jsonl file (one scenario per line) or a .json file holding a list."""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        rows = json.loads(text)
+    return [schemas.EvalScenario(**row) for row in rows]
+
+def load_registry(directory=None) -> Dict[str, List[schemas.EvalScenario]]:
+    """suite name (file stem) -> scenarios, for every scenario file in the directory."""
+    directory = Path(directory or SCENARIO_DIR)
+    registry = {}
+    for path in sorted(directory.glob("*.json*")):
+        if path.suffix in (".json", ".jsonl"):
+            registry[path.stem] = load_scenarios(path)
+    return registry
+
+
+# ---- running ----
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+async def run_suite(scenarios: List[schemas.EvalScenario], concurrency: int = DEFAULT_CONCURRENCY,
+                    complete: Optional[Callable] = None) -> List[Dict]:
+    """
+    Runs every sample of every scenario concurrently (at most `concurrency` in flight).
+    `complete` defaults to grok_client.achat_completion; tests can pass a stub.
+    Returns one dict per sample: the EvalRunResult fields plus `output`.
+    """
+    if complete is None:
+        from .grok_client import achat_completion as complete
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(sc: schemas.EvalScenario, sample: int) -> Dict:
+        async with sem:
+            started = time.perf_counter()
+            try:
+                result = await complete(
+                    [{"role": "system", "content": SALES_SYSTEM_PROMPT},
+                     {"role": "user", "content": sc.prompt}],
+                    temperature=sc.temperature, max_tokens=sc.max_tokens,
+                )
+            except Exception as e:
+                result, check = None, {"ok": False, "notes": f"error: {e}"}
+            latency_ms = (time.perf_counter() - started) * 1000
+        if result is not None:
+            check = check_output(result["content"], sc)
+        usage = (result or {}).get("usage") or {}
+        return {
+            "scenario": sc.name, "sample": sample, "ok": check["ok"], "notes": check["notes"],
+            "latency_ms": round(latency_ms, 1),
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "output": (result or {}).get("content", ""),
+        }
+
+    return await asyncio.gather(*(one(sc, i) for sc in scenarios for i in range(sc.samples)))
+
+def summarize(results: List[Dict]) -> List[schemas.EvalScenarioSummary]:
+    """Per-scenario pass rate, latency p50/p95 and token totals, in first-seen order."""
+    by_scenario: Dict[str, List[Dict]] = {}
+    for r in results:
+        by_scenario.setdefault(r["scenario"], []).append(r)
+    out = []
+    for name, rows in by_scenario.items():
+        latencies = [r["latency_ms"] for r in rows]
+        passed = sum(1 for r in rows if r["ok"])
+        failures = sorted({r["notes"] for r in rows if not r["ok"]})
+        out.append(schemas.EvalScenarioSummary(
+            scenario=name, samples=len(rows), passed=passed,
+            pass_rate=round(passed / len(rows), 3),
+            p50_ms=percentile(latencies, 50), p95_ms=percentile(latencies, 95),
+            prompt_tokens=sum(r["prompt_tokens"] for r in rows),
+            completion_tokens=sum(r["completion_tokens"] for r in rows),
+            notes="; ".join(failures) if failures else "pass",
+        ))
+    return out
+
+def save_run(db: Session, suite: str, results: List[Dict], concurrency: int,
+             duration_ms: float, model: str = None) -> models.EvalRun:
+    run = models.EvalRun(
+        suite=suite, model=model, total=len(results), passed=sum(1 for r in results if r["ok"]),
+        concurrency=concurrency, duration_ms=round(duration_ms, 1),
+    )
+    db.add(run)
+    db.flush()
+    if results:
+        db.execute(insert(models.EvalResult), [{"run_id": run.id, **r} for r in results])
+    db.commit()
+    return run
+
+def run_summary(db: Session, run: models.EvalRun) -> schemas.EvalRunOut:
+    rows = db.query(
+        models.EvalResult.scenario, models.EvalResult.ok, models.EvalResult.notes,
+        models.EvalResult.latency_ms, models.EvalResult.prompt_tokens, models.EvalResult.completion_tokens,
+    ).filter(models.EvalResult.run_id == run.id).order_by(models.EvalResult.id).all()
+    out = schemas.EvalRunOut.model_validate(run)
+    out.scenarios = summarize([r._asdict() for r in rows])
+    return out
@@ -1,90 +1,367 @@
-import os, time, json
-import requests
-from typing import List, Dict
-from pathlib import Path
-from dotenv import load_dotenv
+import os, time, json, asyncio, logging
+import httpx
+from contextlib import contextmanager
+from typing import List, Dict, Optional, AsyncIterator
 
+from . import cache as response_cache
+from . import coalesce, ratelimit, telemetry
 
-load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
-
+# Settings come from the process environment only; nothing is read from disk at import.
+# Dev: `uvicorn app.main:app --env-file .env`; containers pass env vars / env_file.
 XAI_API_KEY = os.getenv("XAI_API_KEY")
 BASE_URL = os.getenv("XAI_BASE_URL", "https://api.x.ai")
-MODEL = os.getenv("XAI_MODEL", "grok-4-latest") 
+MODEL = os.getenv("XAI_MODEL", "grok-4-latest")
 
 HEADERS = {
     "Authorization": f"Bearer {XAI_API_KEY}" if XAI_API_KEY else "",
     "Content-Type": "application/json"
 }
 
+# Connection pool settings for the shared async client.
+TIMEOUT = float(os.getenv("XAI_TIMEOUT", "30"))
+MAX_CONNECTIONS = int(os.getenv("XAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("XAI_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("XAI_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to HTTP/1.1 keep-alive without it.
+try:
+    import h2  # noqa: F401
+    HTTP2 = os.getenv("XAI_HTTP2", "1") != "0"
+except ImportError:
+    HTTP2 = False
+
+RETRYABLE = (429, 500, 502, 503, 504)
+DRAIN_TIMEOUT = float(os.getenv("XAI_DRAIN_TIMEOUT", "20"))  # seconds shutdown waits for in-flight calls
+# Attempts, backoff, RPM/TPM quotas and the adaptive concurrency limit live in ratelimit.py.
+
 # Of note: xAI provides both chat completions (/v1/chat/completions) and a stateful Responses API (/v1/responses).
 # We will use chat completions here for simplicity; see xAI API reference and guides.
 
-def chat(messages: List[Dict], temperature: float = 0.3, max_tokens: int = 400):
+log = logging.getLogger("app.grok")
+
+_client: Optional[httpx.AsyncClient] = None
+_inflight = 0  # async calls started and not finished, retries and backoff included
+
+
+def get_client() -> httpx.AsyncClient:
     """
-    Calls xAI /v1/chat/completions.
-    - Uses max_output_tokens (xAI style) instead of max_tokens.
-    - Never raises on HTTP 200; returns "" if no content so caller can fallback.
+    Shared AsyncClient for the whole process, so every coroutine reuses the same
+    keep-alive (HTTP/2 when available) connection pool instead of opening a socket per call.
     """
-    if not XAI_API_KEY:
-        raise RuntimeError("XAI_API_KEY not set")
-    url = f"{BASE_URL}/v1/chat/completions"
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers=HEADERS,
+            http2=HTTP2,
+            timeout=httpx.Timeout(TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+@contextmanager
+def _tracked():
+    global _inflight
+    _inflight += 1
+    try:
+        yield
+    finally:
+        _inflight -= 1
+
+
+async def drain(timeout: float = DRAIN_TIMEOUT) -> int:
+    """
+    Wait up to `timeout` seconds for in-flight async calls (request handlers, background
+    jobs) to finish, so a shutdown doesn't throw away answers already paid for.
+    Returns the number still running when it gave up.
+    """
+    deadline = time.monotonic() + timeout
+    while _inflight and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if _inflight:
+        log.warning("shutting down with %d Grok calls in flight", _inflight)
+    return _inflight
+
+
+async def aclose():
+    """Close the shared AsyncClient (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class GrokAPIError(RuntimeError):
+    """Non-retryable HTTP error from the API; `status` lets callers tell a 400 from a 401."""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"Grok API error {status}: {body}")
+        self.status = status
+
+
+def _chat_payload(messages: List[Dict], temperature: float, max_tokens: int,
+                  response_format: Optional[Dict] = None) -> Dict:
     payload = {
         "model": MODEL,
         "messages": messages,
         "temperature": temperature,
         "max_output_tokens": max_tokens,  # <-- here we can use xAI-style param
     }
+    if response_format is not None:
+        # e.g. {"type": "json_schema", "json_schema": {...}} for schema-constrained output
+        payload["response_format"] = response_format
+    return payload
 
-    for attempt in range(3):
-        try:
-            resp = requests.post(url, headers=HEADERS, json=payload, timeout=30)
-        except Exception as e:
-            print(f"[GROK HTTP ERROR attempt {attempt+1}] {e}")
-            time.sleep(1.5 * (attempt + 1))
-            continue
-
-        # Debugging handling: show first 400 chars of body
-        print(f"[GROK HTTP {resp.status_code}] {resp.text[:400]!r}")
-
-        if resp.status_code == 200:
-            # Try compatible shape
-            try:
-                data = resp.json()
-                content = data["choices"][0]["message"].get("content", "")
-                # if empty, let caller fallback; don't throw
-                return content or ""
-            except Exception:
-                pass
-            # Try /v1/responses-like shape
-            try:
-                data = resp.json()
-                return data.get("output_text", "")  # may be ""
-            except Exception:
-                # return raw text so caller can try to parse
-                return resp.text
-
-        if resp.status_code in (429, 500, 502, 503, 504):
-            time.sleep(1.5 * (attempt + 1))
-            continue
-
-        # Non-retryable error: surface it
-        raise RuntimeError(f"Grok API error {resp.status_code}: {resp.text}")
-
-    raise RuntimeError("Grok API retry limit exceeded")
-
-
-def respond(input_text: str, temperature: float = 0.3, max_output_tokens: int = 400):
-    if not XAI_API_KEY:
-        raise RuntimeError("XAI_API_KEY not set")
-    url = f"{BASE_URL}/v1/responses"
-    payload = {
+
+def _responses_payload(input_text: str, temperature: float, max_output_tokens: int) -> Dict:
+    return {
         "model": MODEL,
         "input": input_text,
         "temperature": temperature,
         "max_output_tokens": max_output_tokens,
     }
-    resp = requests.post(url, headers=HEADERS, json=payload, timeout=30)
-    print(f"[GROK RESPONSES {resp.status_code}] {resp.text[:400]!r}")
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("output_text") or resp.text
+
+
+def _chat_content(text: str, json_fn):
+    """
+    Pull the completion text out of a 200 response.
+    Tries the chat-completions shape, then the /v1/responses shape, then raw text.
+    """
+    # Try compatible shape
+    try:
+        data = json_fn()
+        content = data["choices"][0]["message"].get("content", "")
+        # if empty, let caller fallback; don't throw
+        return content or ""
+    except Exception:
+        pass
+    # Try /v1/responses-like shape
+    try:
+        data = json_fn()
+        return data.get("output_text", "")  # may be ""
+    except Exception:
+        # return raw text so caller can try to parse
+        return text
+
+
+def _usage(json_fn) -> Dict[str, int]:
+    """Token counts from the response `usage` block (zeros if absent or unparseable)."""
+    try:
+        usage = json_fn().get("usage") or {}
+    except Exception:
+        usage = {}
+    return {
+        "prompt_tokens": int(usage.get("prompt_tokens") or usage.get("input_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or usage.get("output_tokens") or 0),
+    }
+
+
+NO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _log_body(endpoint: str, status: int, text: str):
+    # response bodies hold lead data; only at DEBUG, and only formatted when enabled
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("grok response", extra={"fields": {"endpoint": endpoint, "status": status, "body": text[:400]}})
+
+
+def _retrying(endpoint: str, attempt: int, delay: float, status: Optional[int] = None,
+              error: Optional[Exception] = None):
+    reason = str(status) if status is not None else "transport"
+    telemetry.GROK_RETRIES.labels(endpoint, reason).inc()
+    log.warning("grok call failed, retrying", extra={"fields": {
+        "endpoint": endpoint, "attempt": attempt + 1, "status": status,
+        "error": str(error) if error else None, "delay_s": round(delay, 3),
+    }})
+
+
+def _cache_key(messages: List[Dict], temperature: float, max_tokens: int, cache: Optional[bool],
+               response_format: Optional[Dict] = None) -> Optional[str]:
+    """
+    The call's cache key, or None when it should skip the cache:
+    by default only deterministic (temperature == 0) calls are cached; `cache=True/False` overrides.
+    """
+    use = response_cache.ENABLED and (cache if cache is not None else temperature == 0)
+    if not use:
+        if response_cache.ENABLED:
+            response_cache.get_cache().bypass()
+        return None
+    return _request_key(messages, temperature, max_tokens, response_format)
+
+
+def _request_key(messages: List[Dict], temperature: float, max_tokens: int,
+                 response_format: Optional[Dict] = None) -> str:
+    extra = {"response_format": response_format} if response_format is not None else {}
+    return response_cache.cache_key(MODEL, messages, temperature, max_tokens, **extra)
+
+
+def _cache_store(key: Optional[str], content: str):
+    # empty content means "let the caller fall back"; don't pin that in the cache
+    if key is not None and content:
+        response_cache.get_cache().set(key, content)
+
+
+async def achat(messages: List[Dict], temperature: float = 0.3, max_tokens: int = 400,
+                cache: Optional[bool] = None, response_format: Optional[Dict] = None):
+    """
+    Calls xAI /v1/chat/completions on the shared connection pool.
+    - Uses max_output_tokens (xAI style) instead of max_tokens.
+    - Never raises on HTTP 200; returns "" if no content so caller can fallback.
+    - Deterministic calls are served from the response cache (see cache.py).
+    Calls are admitted by the process-wide limiter (ratelimit.py); backoff uses
+    asyncio.sleep, so a retrying call never holds a worker thread or a concurrency slot.
+    """
+    result = await achat_completion(messages, temperature, max_tokens, cache=cache,
+                                    response_format=response_format)
+    return result["content"]
+
+
+async def achat_completion(messages: List[Dict], temperature: float = 0.3, max_tokens: int = 400,
+                           cache: Optional[bool] = None, response_format: Optional[Dict] = None) -> Dict:
+    """
+    Like `achat`, but returns {"content", "usage", "cached", "coalesced"} so callers can
+    account for tokens. Concurrent identical deterministic requests (the calls the cache would
+    serve: temperature 0, or `cache=True`) share one upstream call; sampled calls never do, so
+    N concurrent eval samples are N completions. Cache hits and the callers that joined
+    another's call report zero usage (no API spend).
+    """
+    key = _cache_key(messages, temperature, max_tokens, cache, response_format)
+    # the disk tier is SQLite; a locked or slow file must not stall the event loop
+    hit = await asyncio.to_thread(response_cache.get_cache().get, key) if key is not None else None
+    if hit is not None:
+        return {"content": hit, "usage": dict(NO_USAGE), "cached": True, "coalesced": False}
+    call = lambda: _achat_uncached(messages, temperature, max_tokens, response_format)
+    if cache if cache is not None else temperature == 0:
+        flight = key or _request_key(messages, temperature, max_tokens, response_format)
+        (content, usage), shared = await coalesce.grok_calls.do(flight, call)
+    else:
+        (content, usage), shared = await call(), False
+    if shared:
+        return {"content": content, "usage": dict(NO_USAGE), "cached": False, "coalesced": True}
+    if key is not None and content:
+        await asyncio.to_thread(_cache_store, key, content)
+    return {"content": content, "usage": usage, "cached": False, "coalesced": False}
+
+
+async def _achat_uncached(messages: List[Dict], temperature: float, max_tokens: int,
+                          response_format: Optional[Dict] = None):
+    if not XAI_API_KEY:
+        raise RuntimeError("XAI_API_KEY not set")
+    payload = _chat_payload(messages, temperature, max_tokens, response_format)
+    estimate = ratelimit.estimate_tokens(messages, max_tokens)
+    resp, usage = await _apost("chat", "/v1/chat/completions", payload, estimate)
+    return _chat_content(resp.text, resp.json), usage
+
+
+async def _apost(endpoint: str, path: str, payload: Dict, estimate: int):
+    """
+    POST under the process-wide limiter with retries; returns (response, usage) for a 200.
+    Every reply is fed to the governor and usage is recorded while the slot is held.
+    Non-retryable statuses raise GrokAPIError.
+    """
+    limiter = ratelimit.get_limiter()
+    with _tracked():
+        for attempt in range(ratelimit.MAX_ATTEMPTS):
+            if attempt:
+                limiter.retried()
+            # the slot is released before any backoff sleep, so waiting never holds concurrency
+            async with limiter.slot(estimate) as ticket:
+                try:
+                    with telemetry.grok_call(endpoint) as call:
+                        resp = await get_client().post(path, json=payload)
+                        call.status = resp.status_code
+                except httpx.HTTPError as e:
+                    delay = ratelimit.backoff(attempt)
+                    _retrying(endpoint, attempt, delay, error=e)
+                else:
+                    _log_body(endpoint, resp.status_code, resp.text)
+                    ticket.observe(resp.status_code, resp.headers)
+
+                    if resp.status_code == 200:
+                        usage = _usage(resp.json)
+                        telemetry.record_tokens(usage)
+                        ticket.usage(sum(usage.values()))
+                        return resp, usage
+
+                    if resp.status_code not in RETRYABLE:
+                        raise GrokAPIError(resp.status_code, resp.text)
+                    delay = ratelimit.retry_delay(attempt, resp.headers)
+                    _retrying(endpoint, attempt, delay, status=resp.status_code)
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("Grok API retry limit exceeded")
+
+
+async def achat_stream(messages: List[Dict], temperature: float = 0.3,
+                      max_tokens: int = 400) -> AsyncIterator[str]:
+    """
+    Streaming variant of `achat`: yields content deltas as the upstream sends them
+    (`stream: true`, SSE `data:` lines, terminated by `data: [DONE]`).
+    Retries only happen before the first delta; once text is flowing an error is raised to the caller.
+    Streams are never cached.
+    """
+    if not XAI_API_KEY:
+        raise RuntimeError("XAI_API_KEY not set")
+    payload = {**_chat_payload(messages, temperature, max_tokens), "stream": True}
+    limiter = ratelimit.get_limiter()
+    estimate = ratelimit.estimate_tokens(messages, max_tokens)
+
+    with _tracked():
+        for attempt in range(ratelimit.MAX_ATTEMPTS):
+            if attempt:
+                limiter.retried()
+            started = False
+            async with limiter.slot(estimate) as ticket:
+                try:
+                    sent = time.perf_counter()
+                    async with get_client().stream("POST", "/v1/chat/completions", json=payload) as resp:
+                        # time to response headers; the body arrives at the model's pace
+                        telemetry.GROK_LATENCY.labels("chat_stream", str(resp.status_code)).observe(
+                            time.perf_counter() - sent)
+                        ticket.observe(resp.status_code, resp.headers)
+                        if resp.status_code in RETRYABLE:
+                            await resp.aread()
+                            _log_body("chat_stream", resp.status_code, resp.text)
+                            delay = ratelimit.retry_delay(attempt, resp.headers)
+                            _retrying("chat_stream", attempt, delay, status=resp.status_code)
+                        elif resp.status_code != 200:
+                            await resp.aread()
+                            raise GrokAPIError(resp.status_code, resp.text)
+                        else:
+                            async for line in resp.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[5:].strip()
+                                if data == "[DONE]":
+                                    return
+                                try:
+                                    chunk = json.loads(data)
+                                    delta = chunk["choices"][0].get("delta", {}).get("content")
+                                except (ValueError, KeyError, IndexError):
+                                    continue
+                                if delta:
+                                    started = True
+                                    yield delta
+                            return
+                except httpx.HTTPError as e:
+                    if started:
+                        raise
+                    delay = ratelimit.backoff(attempt)
+                    _retrying("chat_stream", attempt, delay, error=e)
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("Grok API retry limit exceeded")
+
+
+async def arespond(input_text: str, temperature: float = 0.3, max_output_tokens: int = 400):
+    """Calls xAI /v1/responses with the same limiter admission and retry policy as `achat`."""
+    if not XAI_API_KEY:
+        raise RuntimeError("XAI_API_KEY not set")
+    payload = _responses_payload(input_text, temperature, max_output_tokens)
+    estimate = len(input_text) // ratelimit.CHARS_PER_TOKEN + max_output_tokens
+    resp, _ = await _apost("respond", "/v1/responses", payload, estimate)
+    return resp.json().get("output_text") or resp.text
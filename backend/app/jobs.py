@@ -0,0 +1,330 @@
+"""
+Background jobs.
+
+Bulk scoring fans QUALIFICATION_PROMPT calls out through a bounded worker pool
+(per-job concurrency + rate limit) and writes Lead.score/stage back in batched commits.
+Campaigns do the same for outreach drafts, one call per pack of leads (campaigns.py),
+and bulk-insert the resulting Message rows.
+Progress and per-lead failures live in the jobs / job_failures tables, so any
+worker process can answer GET /jobs/{id}. On server shutdown running jobs write what
+they have in flight and end as 'interrupted' (see shutdown()).
+"""
+
+import asyncio, time
+from typing import Callable, List
+
+from sqlalchemy import case, insert, or_, update
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, now_utc
+from . import campaigns, models, schemas, search
+from .qualification import SCORE_WRITE, QualificationError, activity_detail, qualify, score_params, score_update
+
+COMMIT_EVERY = 50   # results per write transaction
+FETCH_CHUNK = 200   # leads loaded per read
+# a campaign draft moves these stages to "contacted"; later ones (meeting, won, lost) are kept
+DRAFT_ADVANCES = ("new", "qualified")
+
+# Keep references to running jobs so they aren't garbage-collected mid-flight.
+_tasks = set()
+# set by shutdown(): workers stop taking leads, finish the ones in flight and write them
+_stopping = False
+
+
+class RateLimiter:
+    """Spaces acquisitions evenly so at most `per_minute` go through per minute."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def start(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def shutdown(timeout: float) -> int:
+    """
+    Server shutdown: running jobs stop taking new leads, write what their in-flight model
+    calls return and end as 'interrupted'. Jobs still running after `timeout` seconds are
+    cancelled (they keep what they wrote and end as 'interrupted' too). Returns how many
+    had to be cancelled.
+    """
+    global _stopping
+    _stopping = True
+    stragglers = set()
+    if _tasks:
+        _, stragglers = await asyncio.wait(set(_tasks), timeout=timeout)
+        for task in stragglers:
+            task.cancel()
+        await asyncio.gather(*stragglers, return_exceptions=True)
+    if not _tasks:
+        _stopping = False  # the app can be started again in the same process (tests)
+    return len(stragglers)
+
+
+def select_lead_ids(db: Session, req: schemas.LeadSelection) -> List[int]:
+    query = db.query(models.Lead.id)
+    if req.lead_ids is not None:
+        query = query.filter(models.Lead.id.in_(req.lead_ids))
+    if req.stage:
+        query = query.filter(models.Lead.stage == req.stage)
+    if req.q:
+        query = search.filter_matching(query, req.q)
+    if req.unscored_only:
+        query = query.filter(or_(models.Lead.score.is_(None), models.Lead.score == 0))
+    return [row.id for row in query.order_by(models.Lead.id)]
+
+
+def create_job(db: Session, req: schemas.LeadSelection, kind: str):
+    """Resolve the lead selection and persist a queued job. Returns (job, lead_ids)."""
+    lead_ids = select_lead_ids(db, req)
+    job = models.Job(
+        kind=kind, status="queued", total=len(lead_ids),
+        params=req.model_dump_json(exclude={"lead_ids"}),
+    )
+    db.add(job)
+    db.commit()
+    return job, lead_ids
+
+
+# ---- sync DB helpers (run via asyncio.to_thread) ----
+
+def _load_leads(lead_ids: List[int]):
+    with SessionLocal() as db:
+        return db.query(
+            models.Lead.id, models.Lead.company, models.Lead.contact_name,
+            models.Lead.title, models.Lead.website, models.Lead.notes,
+        ).filter(models.Lead.id.in_(lead_ids)).all()
+
+
+def _mark(job_id: int, **values):
+    with SessionLocal() as db:
+        db.query(models.Job).filter(models.Job.id == job_id).update(values)
+        db.commit()
+
+
+def _write_batch(job_id: int, scored: list, failed: list):
+    with SessionLocal() as db:
+        if scored:
+            db.execute(SCORE_WRITE, [score_params(lead_id, upd) for lead_id, data, upd in scored])
+            db.execute(insert(models.Activity), [
+                {"lead_id": lead_id, "type": "scored", "detail": activity_detail(upd["parts"], upd["score"], data)}
+                for lead_id, data, upd in scored
+            ])
+        if failed:
+            db.execute(insert(models.JobFailure), [
+                {"job_id": job_id, "lead_id": lead_id, "error": error} for lead_id, error in failed
+            ])
+        db.query(models.Job).filter(models.Job.id == job_id).update({
+            models.Job.done: models.Job.done + len(scored) + len(failed),
+            models.Job.failed: models.Job.failed + len(failed),
+        })
+        db.commit()
+
+
+def _write_messages(job_id: int, drafted: list, failed: list):
+    """One transaction per batch: Message + Activity inserts, one stage UPDATE, job counters."""
+    with SessionLocal() as db:
+        if drafted:
+            now = now_utc()
+            db.execute(insert(models.Message), [
+                {"lead_id": lead_id, "role": "assistant", "content": content, "created_at": now}
+                for lead_id, content in drafted
+            ])
+            db.execute(insert(models.Activity), [
+                {"lead_id": lead_id, "type": "messaged", "detail": f"Generated outreach email (campaign job {job_id})"}
+                for lead_id, _ in drafted
+            ])
+            db.execute(
+                update(models.Lead)
+                .where(models.Lead.id.in_([lead_id for lead_id, _ in drafted]))
+                .values(stage=case((models.Lead.stage.in_(DRAFT_ADVANCES), "contacted"),
+                                   else_=models.Lead.stage),
+                        updated_at=now)
+            )
+        if failed:
+            db.execute(insert(models.JobFailure), [
+                {"job_id": job_id, "lead_id": lead_id, "error": error} for lead_id, error in failed
+            ])
+        db.query(models.Job).filter(models.Job.id == job_id).update({
+            models.Job.done: models.Job.done + len(drafted) + len(failed),
+            models.Job.failed: models.Job.failed + len(failed),
+        })
+        db.commit()
+
+
+class _BatchWriter:
+    """Buffers per-lead results and commits them COMMIT_EVERY at a time through `write`."""
+
+    def __init__(self, job_id: int, commit_every: int = COMMIT_EVERY, write: Callable = _write_batch):
+        self.job_id = job_id
+        self.commit_every = commit_every
+        self.write = write
+        self.scored, self.failed = [], []
+        self.written = 0
+        self.cut_short = False  # set when shutdown() made the job skip leads
+        self._lock = asyncio.Lock()
+
+    async def ok(self, lead_id: int, *result):
+        self.scored.append((lead_id, *result))
+        await self._maybe_flush()
+
+    async def fail(self, lead_id: int, error: str):
+        self.failed.append((lead_id, error))
+        await self._maybe_flush()
+
+    async def _maybe_flush(self):
+        if len(self.scored) + len(self.failed) >= self.commit_every:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            scored, failed = self.scored, self.failed
+            self.scored, self.failed = [], []
+            if scored or failed:
+                await asyncio.to_thread(self.write, self.job_id, scored, failed)
+                self.written += len(scored) + len(failed)
+
+
+async def _finish(job_id: int, writer: _BatchWriter, total: int):
+    await writer.flush()
+    if writer.cut_short:
+        await asyncio.to_thread(_mark, job_id, status="interrupted", finished_at=now_utc(),
+                                error=f"server shut down after {writer.written} of {total} leads")
+    else:
+        await asyncio.to_thread(_mark, job_id, status="done", finished_at=now_utc())
+
+
+async def _cancelled(job_id: int, writer: _BatchWriter, total: int):
+    """shutdown() stopped waiting: keep what finished and record the job as cut short."""
+    writer.cut_short = True
+    await _finish(job_id, writer, total)
+
+
+async def run_score_job(job_id: int, lead_ids: List[int], weights: schemas.ScoreWeights,
+                        concurrency: int = 8, rate_per_minute: int = 120):
+    await asyncio.to_thread(_mark, job_id, status="running", started_at=now_utc())
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    limiter = RateLimiter(rate_per_minute)
+    writer = _BatchWriter(job_id)
+
+    async def producer():
+        for i in range(0, len(lead_ids), FETCH_CHUNK):
+            if _stopping:
+                writer.cut_short = True
+                break
+            chunk = lead_ids[i:i + FETCH_CHUNK]
+            rows = await asyncio.to_thread(_load_leads, chunk)
+            for row in rows:
+                await queue.put(row)
+            # leads deleted since the job was created
+            for lead_id in set(chunk) - {row.id for row in rows}:
+                await writer.fail(lead_id, "Lead not found")
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            lead = await queue.get()
+            if lead is None:
+                return
+            if _stopping:
+                writer.cut_short = True
+                continue  # drop it, but keep the queue moving so the producer can finish
+            await limiter.wait()
+            if _stopping:
+                writer.cut_short = True
+                continue
+            try:
+                data = await qualify(lead)
+                upd = score_update(data, weights)
+            except QualificationError as e:
+                await writer.fail(lead.id, str(e))
+            except Exception as e:
+                await writer.fail(lead.id, f"{type(e).__name__}: {e}")
+            else:
+                await writer.ok(lead.id, data, upd)
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(producer())
+            for _ in range(concurrency):
+                tg.create_task(worker())
+        await _finish(job_id, writer, len(lead_ids))
+    except asyncio.CancelledError:
+        await _cancelled(job_id, writer, len(lead_ids))
+        raise
+    except Exception as e:
+        await writer.flush()
+        await asyncio.to_thread(_mark, job_id, status="failed", error=repr(e), finished_at=now_utc())
+        raise
+
+
+async def run_campaign_job(job_id: int, lead_ids: List[int], req: schemas.CampaignCreate):
+    """Draft outreach for every lead, `req.pack_size` leads per model call, `req.concurrency` packs at once."""
+    await asyncio.to_thread(_mark, job_id, status="running", started_at=now_utc())
+    queue = asyncio.Queue(maxsize=req.concurrency * 2)
+    limiter = RateLimiter(req.rate_per_minute)
+    writer = _BatchWriter(job_id, write=_write_messages)
+
+    async def producer():
+        for i in range(0, len(lead_ids), FETCH_CHUNK):
+            if _stopping:
+                writer.cut_short = True
+                break
+            chunk = lead_ids[i:i + FETCH_CHUNK]
+            rows = await asyncio.to_thread(_load_leads, chunk)
+            for j in range(0, len(rows), req.pack_size):
+                await queue.put(rows[j:j + req.pack_size])
+            for lead_id in set(chunk) - {row.id for row in rows}:
+                await writer.fail(lead_id, "Lead not found")
+        for _ in range(req.concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            pack = await queue.get()
+            if pack is None:
+                return
+            if _stopping:
+                writer.cut_short = True
+                continue  # drop it, but keep the queue moving so the producer can finish
+            await limiter.wait()
+            if _stopping:
+                writer.cut_short = True
+                continue
+            try:
+                drafts, errors = await campaigns.draft_pack(pack, req)
+            except Exception as e:
+                drafts, errors = {}, {lead.id: f"{type(e).__name__}: {e}" for lead in pack}
+            for lead_id, content in drafts.items():
+                await writer.ok(lead_id, content)
+            for lead_id, error in errors.items():
+                await writer.fail(lead_id, error)
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(producer())
+            for _ in range(req.concurrency):
+                tg.create_task(worker())
+        await _finish(job_id, writer, len(lead_ids))
+    except asyncio.CancelledError:
+        await _cancelled(job_id, writer, len(lead_ids))
+        raise
+    except Exception as e:
+        await writer.flush()
+        await asyncio.to_thread(_mark, job_id, status="failed", error=repr(e), finished_at=now_utc())
+        raise
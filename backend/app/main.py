@@ -1,38 +1,125 @@
-import json
-from fastapi import FastAPI, Depends, Form, Request
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+import asyncio, hashlib, logging, os, time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, Depends, File, Form, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 
-from .db import Base, engine, get_db, now_utc
-from . import models, schemas
-from .grok_client import chat, respond
-from .prompts import SALES_SYSTEM_PROMPT, QUALIFICATION_PROMPT, OUTREACH_PROMPT
-from .scoring import weighted_score
+from . import db as database
+from .db import get_db, now_utc, SessionLocal
+from . import models, schemas, jobs, evals, search, pagination, qualification, bulk, telemetry, coalesce, dashboard
+from . import grok_client
+from .grok_client import achat, achat_stream
+from .prompts import SALES_SYSTEM_PROMPT, OUTREACH_PROMPT
+from .qualification import QualificationError, qualify, score_update, activity_detail
 
-Base.metadata.create_all(bind=engine)
+log = logging.getLogger("app.http")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+# compiled templates persisted across processes (the Docker image fills it at build time)
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "")
 
-app = FastAPI(title="Grok SDR Demo")
-templates = Jinja2Templates(directory="app/templates")
-app.mount("/static", StaticFiles(directory="app/templates"), name="static")
+templates = Jinja2Templates(directory=str(TEMPLATE_DIR))
+if TEMPLATE_CACHE_DIR:
+    from jinja2 import FileSystemBytecodeCache
+
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+
+def compile_templates() -> int:
+    """Compile every template into the environment cache (and the bytecode cache, if set)."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    telemetry.configure_logging()
+    # schema setup happens at startup, not import; multi-worker deployments set
+    # DB_AUTO_CREATE=0 and run `python -m app.manage init-db` once before starting
+    if database.AUTO_CREATE_SCHEMA:
+        await asyncio.to_thread(database.init_db)
+    # first page view shouldn't pay for template compilation
+    compile_templates()
+    yield
+    # the server has stopped taking requests: jobs stop taking leads and write what's in
+    # flight, then any other Grok call gets the rest of the drain window
+    started = time.monotonic()
+    await jobs.shutdown(grok_client.DRAIN_TIMEOUT)
+    await grok_client.drain(max(0.0, grok_client.DRAIN_TIMEOUT - (time.monotonic() - started)))
+    # release the pooled keep-alive connections to the Grok API
+    await grok_client.aclose()
+
+app = FastAPI(title="Grok SDR Demo", lifespan=lifespan)
+app.mount("/static", StaticFiles(directory=str(TEMPLATE_DIR)), name="static")
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    """Request latency histogram, a Server-Timing header (grok/db/total) and a structured log line."""
+    timing = telemetry.start_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        telemetry.HTTP_LATENCY.labels(request.method, route, str(status)).observe(elapsed)
+        fields = {
+            "method": request.method, "route": route, "status": status,
+            "ms": round(elapsed * 1000, 1), "db_ms": round(timing.db_s * 1000, 1),
+            "db_queries": timing.db_queries, "grok_ms": round(timing.grok_s * 1000, 1),
+            "grok_calls": timing.grok_calls,
+        }
+        log.log(logging.WARNING if elapsed * 1000 >= SLOW_REQUEST_MS else logging.DEBUG,
+                "request", extra={"fields": fields})
+    response.headers["Server-Timing"] = timing.server_timing(elapsed)
+    return response
 
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request, q: str | None = None, db: Session = Depends(get_db)):
-    leads = db.query(models.Lead)
+    next_cursor = None
     if q:
-        qlike = f"%{q}%"
-        leads = leads.filter(
-            (models.Lead.company.ilike(qlike)) |
-            (models.Lead.contact_name.ilike(qlike)) |
-            (models.Lead.notes.ilike(qlike))
+        # ranked full-text prefix search (see search.py); top matches only, no paging
+        leads = search.search_leads(db, q, query=db.query(*pagination.LIST_COLUMNS)).all()
+    else:
+        leads, next_cursor = pagination.lead_page(db)
+    return templates.TemplateResponse(
+        "index.html", {"request": request, "leads": leads, "next_cursor": next_cursor, "q": q or ""}
+    )
+
+@app.get("/leads", response_model=schemas.LeadPage)
+def list_leads(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = pagination.PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """
+    Keyset-paginated lead list. HTMX requests (infinite scroll on the home page) get
+    table rows; everyone else gets JSON {items, next_cursor}.
+    """
+    try:
+        leads, next_cursor = pagination.lead_page(db, cursor, limit)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if request.headers.get("HX-Request"):
+        return templates.TemplateResponse(
+            "_lead_rows.html", {"request": request, "leads": leads, "next_cursor": next_cursor}
         )
-    leads = leads.order_by(models.Lead.updated_at.desc()).all()
-    return templates.TemplateResponse("index.html", {"request": request, "leads": leads, "q": q or ""})
+    return schemas.LeadPage(items=leads, next_cursor=next_cursor)
 
 @app.post("/leads", response_class=RedirectResponse)
 def create_lead(
+    request: Request,
     company: str = Form(...),
     contact_name: str = Form(...),
     email: str = Form(...),
@@ -41,33 +128,140 @@ def create_lead(
     notes: str = Form(""),
     db: Session = Depends(get_db),
 ):
-    lead = models.Lead(company=company, contact_name=contact_name, email=email, title=title, website=website, notes=notes)
-    db.add(lead)
-    db.commit(); db.refresh(lead)
-    _log(db, lead.id, "created", f"Lead created for {contact_name} at {company}")
+    lead = _create_lead(db, dict(company=company, contact_name=contact_name, email=email,
+                                 title=title, website=website, notes=notes))
+    if request.headers.get("HX-Request"):
+        # the Add Lead form prepends the new row to the table instead of leaving the page
+        return templates.TemplateResponse(
+            "_lead_rows.html", {"request": request, "leads": [lead], "next_cursor": None}
+        )
     return RedirectResponse(url=f"/lead/{lead.id}", status_code=303)
 
+def _create_lead(db: Session, fields: dict) -> models.Lead:
+    lead = models.Lead(**fields)
+    db.add(lead)
+    db.flush()  # assigns lead.id inside the same transaction
+    _log(db, lead.id, "created", f"Lead created for {lead.contact_name} at {lead.company}")
+    from . import similarity  # pulls in NumPy; imported on first use to keep startup light
+
+    similarity.store(db, [lead])  # searchable as soon as it commits
+    db.commit()
+    return lead
+
+@app.post("/leads/import", response_model=schemas.ImportResult)
+def import_leads(file: UploadFile = File(...), format: str | None = None, dedup: bool = False,
+                 db: Session = Depends(get_db)):
+    """
+    Bulk-create leads from a CSV (header row) or JSONL upload; rows are validated as LeadCreate,
+    duplicate emails are skipped and bad rows reported without failing the import.
+    dedup=true also reports rows resembling a stored lead (e.g. "Contoso Inc" vs "Contoso").
+    """
+    try:
+        fmt = bulk.detect_format(file.filename, format)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+    return bulk.import_leads(db, file.file, fmt, dedup=dedup)
+
+@app.get("/leads/export")
+def export_leads(format: str = "csv", stage: str | None = None, q: str | None = None):
+    """All leads (optionally one stage / search matches) as streamed CSV or JSONL."""
+    try:
+        fmt = bulk.detect_format(None, format)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+    return StreamingResponse(
+        bulk.export_leads(fmt, stage, q), media_type=bulk.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="leads.{fmt}"'},
+    )
+
 @app.get("/lead/{lead_id}", response_class=HTMLResponse)
 def lead_detail(lead_id: int, request: Request, db: Session = Depends(get_db)):
     lead = db.get(models.Lead, lead_id)
     if not lead:
         return HTMLResponse("Lead not found", status_code=404)
-    return templates.TemplateResponse("lead_detail.html", {"request": request, "lead": lead})
+    # newest N of each, sorted in SQL; older rows load on demand
+    activities, activities_cursor = pagination.history_page(db, models.Activity, lead_id)
+    messages, messages_cursor = pagination.history_page(db, models.Message, lead_id, limit=10)
+    return templates.TemplateResponse("lead_detail.html", {
+        "request": request, "lead": lead, "lead_id": lead.id,
+        "activities": activities, "activities_cursor": activities_cursor,
+        "messages": messages, "messages_cursor": messages_cursor,
+    })
 
-def _log(db: Session, lead_id: int, t: str, detail: str):
-    db.add(models.Activity(lead_id=lead_id, type=t, detail=detail))
-    db.commit()
+@app.get("/lead/{lead_id}/similar", response_model=list[schemas.SimilarLead])
+def similar_leads(lead_id: int, k: int = Query(10, ge=1, le=100), db: Session = Depends(get_db)):
+    """Lookalike leads by company / title / notes embedding, most similar first."""
+    lead = db.get(models.Lead, lead_id)
+    if not lead:
+        return JSONResponse({"detail": "Lead not found"}, status_code=404)
+    from . import similarity
+
+    return similarity.similar_leads(db, lead, k)
+
+@app.get("/lead/{lead_id}/activities", response_class=HTMLResponse)
+def lead_activities(lead_id: int, request: Request, cursor: str | None = None, db: Session = Depends(get_db)):
+    """"Show older" activity rows (HTMX fragment)."""
+    try:
+        activities, next_cursor = pagination.history_page(db, models.Activity, lead_id, cursor)
+    except ValueError as e:
+        return HTMLResponse(str(e), status_code=400)
+    return templates.TemplateResponse("_activity_rows.html", {
+        "request": request, "lead_id": lead_id,
+        "activities": activities, "activities_cursor": next_cursor,
+    })
+
+@app.get("/lead/{lead_id}/messages", response_class=HTMLResponse)
+def lead_messages(lead_id: int, request: Request, cursor: str | None = None, db: Session = Depends(get_db)):
+    """"Show older" message rows (HTMX fragment)."""
+    try:
+        messages, next_cursor = pagination.history_page(db, models.Message, lead_id, cursor, limit=10)
+    except ValueError as e:
+        return HTMLResponse(str(e), status_code=400)
+    return templates.TemplateResponse("_message_rows.html", {
+        "request": request, "lead_id": lead_id,
+        "messages": messages, "messages_cursor": next_cursor,
+    })
+
+def _log(db: Session, lead_id: int, t: str, detail: str) -> models.Activity:
+    """Add an Activity to the caller's transaction; the caller's commit persists both."""
+    activity = models.Activity(lead_id=lead_id, type=t, detail=detail)
+    db.add(activity)
+    return activity
+
+def _set_stage(db: Session, lead: models.Lead, stage: str, t: str, detail: str) -> models.Activity:
+    lead.stage = stage
+    lead.updated_at = now_utc()
+    return _log(db, lead.id, t, detail)
+
+def _stage_changed(request: Request, lead: models.Lead, activity: models.Activity):
+    """
+    HTMX reply to the stage / meeting forms: the new stage pill plus the new activity row
+    (swapped in out of band), a few hundred bytes instead of the whole lead page.
+    Plain form posts still redirect to the page.
+    """
+    if not request.headers.get("HX-Request"):
+        return RedirectResponse(url=f"/lead/{lead.id}", status_code=303)
+    return templates.TemplateResponse("_stage_update.html", {
+        "request": request, "lead": lead, "lead_id": lead.id,
+        "activities": [activity], "activities_cursor": None,
+    })
+
+def _load_lead(lead_id: int, db: Session = Depends(get_db)) -> models.Lead | None:
+    """
+    The path's lead, for async handlers: FastAPI runs sync dependencies in its threadpool,
+    so the lookup doesn't block the event loop. Columns are loaded; relationships aren't.
+    """
+    return db.get(models.Lead, lead_id)
 
 @app.post("/lead/{lead_id}/score", response_class=HTMLResponse)
-def score_lead(
+async def score_lead(
     lead_id: int,
     industry_fit: float = Form(0.4),
     size_fit: float = Form(0.2),
     intent_signals: float = Form(0.3),
     data_quality: float = Form(0.1),
-    db: Session = Depends(get_db),
+    lead: models.Lead | None = Depends(_load_lead),
 ):
-    lead = db.get(models.Lead, lead_id)
     if not lead:
         return HTMLResponse("Lead not found", status_code=404)
 
@@ -78,116 +272,188 @@ def score_lead(
         intent_signals=intent_signals,
         data_quality=data_quality,
     )
+    # a double-click (or two reps) scoring the same lead with the same weights share one run
+    (status, html), _ = await coalesce.lead_ops.do(
+        ("score", lead_id, *weights.model_dump().values()), lambda: _score_lead(lead, weights))
+    return HTMLResponse(html, status_code=status)
 
-    # build the user prompt from the template
-    user_prompt = QUALIFICATION_PROMPT.format(
-        company=lead.company,
-        contact_name=lead.contact_name,
-        title=lead.title or "Unknown",
-        website=lead.website or "N/A",
-        notes=lead.notes or "N/A",
-    )
 
-    # ---- CALL GROK (primary: chat, fallback: responses) ----
-    content = chat(
-        [{"role": "system", "content": SALES_SYSTEM_PROMPT},
-         {"role": "user", "content": user_prompt}],
-        temperature=0.0, max_tokens=300
-    )
-    if not content or not content.strip():
-        # fallback to /v1/responses if chat returns nothing
-        content = respond(
-            "You are an SDR assistant. Reply with ONLY one JSON object with keys: "
-            "overall, industry, size, intent, data_quality, rationale.\n\n"
-            f"{user_prompt}",
-            temperature=0.0, max_output_tokens=300
-        )
+async def _score_lead(lead: models.Lead, weights: schemas.ScoreWeights):
+    """(status, html). Runs under the lead's lock with its own sessions: it may outlive the first caller."""
+    async with coalesce.lead_locks.hold(lead.id):
+        # ---- CALL GROK + PARSE (see qualification.qualify) ----
+        try:
+            data = await qualify(lead)
+            upd = score_update(data, weights)
+        except QualificationError as e:
+            await asyncio.to_thread(_save_activity, lead.id, "scored", str(e))
+            return 502, "<div>Scoring failed (unusable reply). Try again.</div>"
 
-    print("\n=== RAW QUALIFICATION OUTPUT (attempt 1) ===\n", (content or "")[:800], "\n")
+        # ---- SCORE + SAVE (stage decided against the row's current stage) ----
+        # a busy database waits in a worker thread, not on the event loop
+        stage = await asyncio.to_thread(_save_score, lead.id, upd, data)
+    return 200, f"<div><b>Score:</b> {upd['score']:.0f} &nbsp; <span class='pill'>{stage}</span></div>"
 
-    # ---- PARSE (with tiny sanitizer + repair retry) ----
-    def _try_parse(text: str):
-        t = (text or "").strip()
-        if t.startswith("```"):
-            # strip code fences like ```json ... ```
-            t = t.strip("`")
-            if t.lower().startswith("json"):
-                t = t[4:].strip()
-        return json.loads(t)
 
-    try:
-        data = _try_parse(content)
-    except Exception:
-        repair = (
-            "Convert the following to a single JSON object with keys: "
-            "overall, industry, size, intent, data_quality, rationale. "
-            "Return ONLY JSON and nothing else.\n\n"
-            f"{content}"
-        )
-        content2 = chat(
-            [{"role": "system", "content": "Return ONLY a JSON object."},
-             {"role": "user", "content": repair}],
-            temperature=0.0, max_tokens=200
-        )
-        print("\n=== RAW QUALIFICATION OUTPUT (attempt 2) ===\n", (content2 or "")[:800], "\n")
-        try:
-            data = _try_parse(content2)
-        except Exception:
-            _log(db, lead.id, "scored", "Model returned non-JSON twice")
-            return HTMLResponse("<div>Scoring failed (non-JSON). Try again.</div>", status_code=502)
-
-    # ---- SCORE + SAVE ----
-    parts = {
-        "industry": float(data.get("industry", 0)),
-        "size": float(data.get("size", 0)),
-        "intent": float(data.get("intent", 0)),
-        "data_quality": float(data.get("data_quality", 0)),
-    }
-    lead.score = weighted_score(parts, weights)
-    lead.stage = "qualified" if lead.score >= 60 else "new"
-    lead.updated_at = now_utc()
+def _save_activity(lead_id: int, t: str, detail: str):
+    with SessionLocal() as db:
+        _log(db, lead_id, t, detail)
+        db.commit()
+
+
+def _save_score(lead_id: int, upd: dict, data: dict) -> str:
+    """Write a score and its activity; returns the lead's resulting stage."""
+    with SessionLocal() as db:
+        db.execute(qualification.SCORE_WRITE, [qualification.score_params(lead_id, upd)])
+        _log(db, lead_id, "scored", activity_detail(upd["parts"], upd["score"], data))
+        db.commit()
+        return db.scalar(select(models.Lead.stage).where(models.Lead.id == lead_id))
+
+
+def _queue_job(req: schemas.LeadSelection, kind: str):
+    """jobs.create_job with its own session, for asyncio.to_thread. Returns (JobOut, lead_ids)."""
+    with SessionLocal() as db:
+        job, lead_ids = jobs.create_job(db, req, kind=kind)
+        return schemas.JobOut.model_validate(job), lead_ids
+
+
+@app.post("/leads/score", response_model=schemas.JobOut, status_code=202)
+async def score_leads_bulk(req: schemas.ScoreJobCreate):
+    """Queue a background scoring job for an ID list or a lead filter; poll GET /jobs/{id}."""
+    job, lead_ids = await asyncio.to_thread(_queue_job, req, "score")
+    jobs.start(jobs.run_score_job(job.id, lead_ids, req.weights, req.concurrency, req.rate_per_minute))
+    return job
+
 
+@app.post("/campaigns", response_model=schemas.JobOut, status_code=202)
+async def create_campaign(req: schemas.CampaignCreate):
+    """Queue outreach drafts for an ID list or a lead filter, packed several leads per call; poll GET /jobs/{id}."""
+    job, lead_ids = await asyncio.to_thread(_queue_job, req, "campaign")
+    jobs.start(jobs.run_campaign_job(job.id, lead_ids, req))
+    return job
 
-    db.commit(); db.refresh(lead)
-    _log(db, lead.id, "scored", f"Parts={parts} -> weighted={lead.score}. Rationale: {str(data.get('rationale',''))[:220]}")
-    return f"<div><b>Score:</b> {lead.score:.0f} &nbsp; <span class='pill'>{lead.stage}</span></div>"
+
+@app.post("/leads/rescore", response_model=schemas.RescoreOut)
+def rescore_leads(weights: schemas.ScoreWeights, db: Session = Depends(get_db)):
+    """Re-score and re-stage every scored lead from its stored components under new weights (no API calls)."""
+    from . import rescore  # pulls in NumPy; imported on first use to keep startup light
+
+    return rescore.rescore_all(db, weights)
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobOut)
+def job_status(job_id: int, request: Request, db: Session = Depends(get_db)):
+    """Job progress; pollers sending If-None-Match get an empty 304 until it moves."""
+    job = db.get(models.Job, job_id)
+    if not job:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    return _json(request, schemas.JobOut.model_validate(job))
 
 
 @app.post("/lead/{lead_id}/message", response_class=HTMLResponse)
-def generate_message(
+async def generate_message(
     lead_id: int,
     tone: str = Form("concise, helpful, human"),
     call_to_action: str = Form("Would you be open to a 20-minute intro call this week?"),
     extra_context: str = Form(None),
-    db: Session = Depends(get_db),
+    lead: models.Lead | None = Depends(_load_lead),
 ):
-    lead = db.get(models.Lead, lead_id)
     if not lead:
         return HTMLResponse("Lead not found", status_code=404)
 
+    content = await _generate_message(lead, tone, call_to_action, extra_context)
+    return f"<pre>{content}</pre>"
+
+
+async def _generate_message(lead: models.Lead, tone: str, call_to_action: str, extra_context: str | None) -> str:
+    # identical concurrent drafts (double-click) make one call and one Message row
+    content, _ = await coalesce.lead_ops.do(
+        ("message", lead.id, tone, call_to_action, extra_context),
+        lambda: _draft_message(lead.id, _outreach_messages(lead, tone, call_to_action, extra_context)))
+    return content
+
+
+async def _draft_message(lead_id: int, messages):
+    content = await achat(messages, temperature=0.4, max_tokens=300)
+    async with coalesce.lead_locks.hold(lead_id):
+        await asyncio.to_thread(_save_message, lead_id, content)
+    return content
+
+
+def _outreach_messages(lead, tone: str, call_to_action: str, extra_context: str | None):
     prompt = OUTREACH_PROMPT.format(
         contact_name=lead.contact_name, company=lead.company,
         title=lead.title or "Unknown",
         context=extra_context or lead.notes or "No extra context",
         tone=tone, cta=call_to_action
     )
-    content = chat(
-        [{"role": "system", "content": SALES_SYSTEM_PROMPT},
-         {"role": "user", "content": prompt}],
-        temperature=0.4, max_tokens=300
-    )
+    return [{"role": "system", "content": SALES_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}]
+
+
+def _record_message(db: Session, lead: models.Lead, content: str):
     msg = models.Message(lead_id=lead.id, role="assistant", content=content)
     db.add(msg)
     lead.stage = "contacted"
     lead.updated_at = now_utc()
-    db.commit(); db.refresh(lead)
     _log(db, lead.id, "messaged", "Generated outreach email")
-    return f"<pre>{content}</pre>"
+    db.commit()
+
+
+def _sse(event: str, data: str) -> str:
+    # multi-line payloads become several data: lines; EventSource re-joins them with \n
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+
+@app.get("/lead/{lead_id}/message/stream")
+async def stream_message(
+    lead_id: int,
+    tone: str = "concise, helpful, human",
+    call_to_action: str = "Would you be open to a 20-minute intro call this week?",
+    extra_context: str | None = None,
+    lead: models.Lead | None = Depends(_load_lead),
+):
+    """
+    Same draft as POST /lead/{id}/message, streamed as Server-Sent Events:
+    `token` events carry text deltas, then `done` (or `error`).
+    The Message row is written once, after the last token; an aborted or empty stream saves nothing.
+    """
+    if not lead:
+        return HTMLResponse("Lead not found", status_code=404)
+    messages = _outreach_messages(lead, tone, call_to_action, extra_context)
+
+    async def events():
+        parts = []
+        try:
+            async for delta in achat_stream(messages, temperature=0.4, max_tokens=300):
+                parts.append(delta)
+                yield _sse("token", delta)
+        except Exception as e:
+            yield _sse("error", str(e))
+            return
+        # the request-scoped session is closed by now; persist with a fresh one
+        if parts:
+            await asyncio.to_thread(_save_message, lead_id, "".join(parts))
+        yield _sse("done", "")
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _save_message(lead_id: int, content: str):
+    with SessionLocal() as db:
+        lead = db.get(models.Lead, lead_id)
+        if lead:
+            _record_message(db, lead, content)
 
 
 @app.post("/lead/{lead_id}/meeting", response_class=HTMLResponse)
 def schedule_meeting(
     lead_id: int,
+    request: Request,
     when: str = Form("Next Tue 2pm CT"),
     link: str = Form("https://cal.example/xai"),
     db: Session = Depends(get_db),
@@ -195,56 +461,187 @@ def schedule_meeting(
     lead = db.get(models.Lead, lead_id)
     if not lead:
         return HTMLResponse("Lead not found", status_code=404)
-    lead.stage = "meeting"
-    lead.updated_at = now_utc()
-    db.add(models.Activity(lead_id=lead.id, type="meeting", detail=f"Proposed: {when} — {link}"))
+    activity = _set_stage(db, lead, "meeting", "meeting", f"Proposed: {when} — {link}")
     db.commit()
-    return RedirectResponse(url=f"/lead/{lead_id}", status_code=303)
+    return _stage_changed(request, lead, activity)
 
 
 @app.post("/lead/{lead_id}/stage")
-def update_stage(lead_id: int, stage: str = Form(...), db: Session = Depends(get_db)):
+def update_stage(lead_id: int, request: Request, stage: str = Form(...), db: Session = Depends(get_db)):
     lead = db.get(models.Lead, lead_id)
     if not lead: return JSONResponse({"error":"not found"}, status_code=404)
-    lead.stage = stage; lead.updated_at = now_utc()
+    activity = _set_stage(db, lead, stage, "stage_change", f"Stage -> {stage}")
     db.commit()
-    _log(db, lead.id, "stage_change", f"Stage -> {stage}")
-    return RedirectResponse(url=f"/lead/{lead_id}", status_code=303)
+    return _stage_changed(request, lead, activity)
+
+
+# ---- JSON API ----
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    """If-None-Match / If-Match: "*" or a comma-separated list; W/ prefixes are ignored."""
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+def _json(request: Request, model, status_code: int = 200, headers: dict | None = None) -> Response:
+    """
+    `model` serialized to bytes by pydantic-core in one pass (FastAPI's response_model path
+    re-validates and walks it through jsonable_encoder first), with an ETag over the body.
+    A GET whose If-None-Match names the current ETag gets an empty 304.
+    """
+    body = model.model_dump_json().encode()
+    etag = _etag(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if request.method == "GET" and _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+def _lead_json(request: Request, lead: models.Lead, status_code: int = 200, headers: dict | None = None) -> Response:
+    return _json(request, schemas.LeadOut.model_validate(lead), status_code, headers)
+
+@app.post("/api/leads", response_model=schemas.LeadOut, status_code=201)
+def api_create_lead(req: schemas.LeadCreate, request: Request, db: Session = Depends(get_db)):
+    lead = _create_lead(db, req.model_dump())
+    return _lead_json(request, lead, 201, {"Location": f"/api/leads/{lead.id}"})
+
+@app.get("/api/leads/{lead_id}", response_model=schemas.LeadOut)
+def api_get_lead(lead_id: int, request: Request, db: Session = Depends(get_db)):
+    """One lead; send its ETag back in If-None-Match to get an empty 304 while it is unchanged."""
+    lead = db.get(models.Lead, lead_id)
+    if not lead:
+        return JSONResponse({"detail": "Lead not found"}, status_code=404)
+    return _lead_json(request, lead)
+
+@app.patch("/api/leads/{lead_id}", response_model=schemas.LeadOut)
+def api_update_lead(lead_id: int, req: schemas.LeadUpdate, request: Request, db: Session = Depends(get_db)):
+    """
+    Set the fields sent (null / absent fields are left alone). With If-Match: <ETag> the
+    update only applies if nobody changed the lead since, else 412. Stage changes are logged
+    like the form's; company, title or notes changes re-embed the lead.
+    """
+    lead = db.get(models.Lead, lead_id)
+    if not lead:
+        return JSONResponse({"detail": "Lead not found"}, status_code=404)
+    if_match = request.headers.get("if-match")
+    if if_match:
+        current = _etag(schemas.LeadOut.model_validate(lead).model_dump_json().encode())
+        if not _etag_matches(if_match, current):
+            return JSONResponse({"detail": "Lead was modified; GET it again"}, status_code=412)
+
+    # values equal to the current ones aren't changes: a no-op PATCH keeps the ETag and
+    # the lead's place in the (updated_at, id) list order
+    changes = {f: v for f, v in req.model_dump(exclude_none=True).items() if getattr(lead, f) != v}
+    if not changes:
+        return _lead_json(request, lead)
+    stage = changes.pop("stage", None)
+    for field, value in changes.items():
+        setattr(lead, field, value)
+    if stage is not None:
+        _set_stage(db, lead, stage, "stage_change", f"Stage -> {stage}")
+    else:
+        lead.updated_at = now_utc()
+    if changes.keys() & {"company", "title", "notes"}:
+        from . import similarity
+
+        similarity.store(db, [lead], replace=True)
+    db.commit()
+    return _lead_json(request, lead)
+
+@app.post("/api/messages", response_model=schemas.MessageOut)
+async def api_generate_message(req: schemas.MessageRequest):
+    """Outreach draft for a lead, as JSON; same call, coalescing and Message row as the form."""
+    lead = await asyncio.to_thread(_get_lead, req.lead_id)
+    if not lead:
+        return JSONResponse({"detail": "Lead not found"}, status_code=404)
+    content = await _generate_message(lead, req.tone, req.call_to_action, req.extra_context)
+    return schemas.MessageOut(lead_id=lead.id, content=content)
+
+
+def _get_lead(lead_id: int) -> models.Lead | None:
+    with SessionLocal() as db:
+        return db.get(models.Lead, lead_id)
+
+
+@app.get("/dashboard", response_model=schemas.DashboardOut)
+def pipeline_dashboard(request: Request, days: int = Query(dashboard.DAYS, ge=1, le=366),
+                       db: Session = Depends(get_db)):
+    """Stage funnel, score distribution and activities per day, read from trigger-maintained counters."""
+    return _json(request, schemas.DashboardOut.model_validate(dashboard.summary(db, days)))
+
+@app.get("/healthz")
+def healthz():
+    """Readiness probe: answers once startup (lifespan) has finished; touches neither the DB nor Grok."""
+    return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus exposition: Grok latency/retries/tokens, DB and HTTP timings, cache and limiter counters."""
+    body, content_type = telemetry.render_metrics()
+    return Response(body, media_type=content_type)
+
+@app.get("/ratelimit/stats")
+def ratelimit_stats():
+    """Grok call admission: adaptive concurrency limit, quotas, throttles and time spent waiting."""
+    return grok_client.ratelimit.get_limiter().stats()
+
+@app.get("/qualification/stats")
+def qualification_stats():
+    """How scoring replies were parsed: structured output, local extraction, or the repair call."""
+    return qualification.path_stats()
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and sizes for the Grok response cache."""
+    if not grok_client.response_cache.ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **grok_client.response_cache.get_cache().stats()}
 
 @app.post("/evals/run", response_class=HTMLResponse)
-def run_evals(db: Session = Depends(get_db)):
-    scenarios = [
-        {"name":"Personalization", "prompt":"Write a 1-paragraph first-touch email to Jane at Contoso about AI SDR automation.", "must_include":"Jane", "must_not_include":"[[FILL]"},
-        {"name":"LengthLimit", "prompt":"In <=120 words, pitch Grok SDR benefits for a data infra startup.", "must_include":"Grok"},
-    ]
-    rows = []
-    for sc in scenarios:
-        out = chat([
-            {"role":"system","content":SALES_SYSTEM_PROMPT},
-            {"role":"user","content": sc["prompt"]}
-        ], temperature=0.3, max_tokens=250)
-        ok, notes = True, []
-        if sc.get("must_include") and sc["must_include"] not in out:
-            ok = False; notes.append("missing personalization")
-        if sc.get("must_not_include") and sc["must_not_include"] in out:
-            ok = False; notes.append("placeholder leaked")
-        if len(out.split()) > 130 and "120" in sc["prompt"]:
-            ok = False; notes.append("over length")
-        rows.append((sc["name"], "pass" if ok else "fail", "; ".join(notes) or "pass"))
-
-    # Simple HTML table for HTMX target
-    html = [
-        '<table style="width:100%;border-collapse:collapse;font:14px system-ui">',
-        '<tr><th style="text-align:left;border-bottom:1px solid #eee;padding:6px">Scenario</th>',
-        '<th style="text-align:left;border-bottom:1px solid #eee;padding:6px">Result</th>',
-        '<th style="text-align:left;border-bottom:1px solid #eee;padding:6px">Notes</th></tr>'
-    ]
-    for name, res, note in rows:
-        color = "#198754" if res=="pass" else "#dc3545"
-        html.append(
-            f'<tr><td style="padding:6px;border-bottom:1px solid #f3f3f3">{name}</td>'
-            f'<td style="padding:6px;border-bottom:1px solid #f3f3f3;color:{color}">{res}</td>'
-            f'<td style="padding:6px;border-bottom:1px solid #f3f3f3">{note}</td></tr>'
-        )
-    html.append("</table>")
-    return HTMLResponse("".join(html))
+async def run_evals(
+    request: Request,
+    suite: str = Form("core"),
+    concurrency: int = Form(evals.DEFAULT_CONCURRENCY, ge=1, le=64),
+    samples: int | None = Form(None, ge=1, le=20),
+):
+    """Run a scenario suite concurrently, persist it as an EvalRun, and return an HTML table (HTMX fragment)."""
+    registry = evals.load_registry()
+    if suite not in registry:
+        return HTMLResponse(f"<div>Unknown eval suite '{suite}'</div>", status_code=404)
+    scenarios = registry[suite]
+    if samples:
+        scenarios = [sc.model_copy(update={"samples": samples}) for sc in scenarios]
+
+    started = time.perf_counter()
+    results = await evals.run_suite(scenarios, concurrency=concurrency)
+    duration_ms = (time.perf_counter() - started) * 1000
+    run = await asyncio.to_thread(_save_eval_run, suite, results, concurrency, duration_ms)
+
+    return templates.TemplateResponse("_eval_table.html", {
+        "request": request, "run": run, "rows": evals.summarize(results),
+    })
+
+
+def _save_eval_run(suite: str, results, concurrency: int, duration_ms: float) -> models.EvalRun:
+    with SessionLocal() as db:
+        return evals.save_run(db, suite, results, concurrency, duration_ms, model=grok_client.MODEL)
+
+
+@app.get("/evals/runs", response_model=list[schemas.EvalRunOut])
+def list_eval_runs(suite: str | None = None, limit: int = 20, db: Session = Depends(get_db)):
+    """Recent runs (newest first) with totals; per-scenario detail is at /evals/runs/{id}."""
+    query = db.query(models.EvalRun)
+    if suite:
+        query = query.filter(models.EvalRun.suite == suite)
+    return query.order_by(models.EvalRun.id.desc()).limit(min(limit, 200)).all()
+
+
+@app.get("/evals/runs/{run_id}", response_model=schemas.EvalRunOut)
+def get_eval_run(run_id: int, db: Session = Depends(get_db)):
+    run = db.get(models.EvalRun, run_id)
+    if not run:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    return evals.run_summary(db, run)
@@ -0,0 +1,74 @@
+"""
+Maintenance commands, run apart from the web workers:
+
+    python -m app.manage init-db       # create tables, indexes and the search index
+    python -m app.manage rebuild-fts   # re-index every lead for search
+    python -m app.manage backfill-components  # component scores from old "scored" activities
+    python -m app.manage rebuild-stats  # recount the dashboard counters from leads/activities
+    python -m app.manage compile-templates  # fill TEMPLATE_CACHE_DIR (done at image build)
+    python -m app.manage build-embeddings   # embed leads lacking a vector; snapshot to EMBED_INDEX_DIR
+"""
+
+import argparse
+
+from . import dashboard, db, rescore, search
+
+
+def init_db(args):
+    db.init_db()
+    print(f"schema ready on {db.engine.url.render_as_string(hide_password=True)}")
+
+
+def rebuild_fts(args):
+    search.rebuild_fts(db.engine)
+    print("search index rebuilt")
+
+
+def backfill_components(args):
+    with db.SessionLocal() as session:
+        filled = rescore.backfill_components(session)
+    print(f"component scores backfilled for {filled} leads")
+
+
+def rebuild_stats(args):
+    dashboard.rebuild_stats(db.engine)
+    print("dashboard counters rebuilt")
+
+
+def compile_templates(args):
+    from . import main
+
+    count = main.compile_templates()
+    print(f"{count} templates compiled" + (f" into {main.TEMPLATE_CACHE_DIR}" if main.TEMPLATE_CACHE_DIR else ""))
+
+
+def build_embeddings(args):
+    from . import similarity
+
+    with db.SessionLocal() as session:
+        added = similarity.backfill(session)
+        print(f"embedded {added} leads")
+        if similarity.INDEX_DIR:
+            count = similarity.write_snapshot(session)
+            print(f"index snapshot of {count} vectors written to {similarity.INDEX_DIR}")
+
+
+COMMANDS = {
+    "init-db": init_db,
+    "rebuild-fts": rebuild_fts,
+    "backfill-components": backfill_components,
+    "rebuild-stats": rebuild_stats,
+    "compile-templates": compile_templates,
+    "build-embeddings": build_embeddings,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
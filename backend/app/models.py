@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from .db import Base, now_utc  # use our UTC helper
 
@@ -13,12 +13,24 @@ class Lead(Base):
     notes = Column(Text, default="")
     score = Column(Float, default=0.0)
     stage = Column(String, default="new")  # new -> qualified -> contacted -> meeting -> won/lost
+    # model component scores (0-100), kept so new ScoreWeights can re-score without API calls;
+    # NULL until the lead is first scored
+    industry_score = Column(Float)
+    size_score = Column(Float)
+    intent_score = Column(Float)
+    data_quality_score = Column(Float)
+    scored_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), default=now_utc)
     updated_at = Column(DateTime(timezone=True), default=now_utc)
 
     messages = relationship("Message", back_populates="lead", cascade="all, delete-orphan")
     activities = relationship("Activity", back_populates="lead", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # keyset pagination of the lead list: ORDER BY updated_at DESC, id DESC
+        Index("ix_leads_updated_at_id", "updated_at", "id"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True)
@@ -28,6 +40,8 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), default=now_utc)
     lead = relationship("Lead", back_populates="messages")
 
+    __table_args__ = (Index("ix_messages_lead_id_created_at", "lead_id", "created_at"),)
+
 class Activity(Base):
     __tablename__ = "activities"
     id = Column(Integer, primary_key=True)
@@ -36,3 +50,72 @@ class Activity(Base):
     detail = Column(Text)
     created_at = Column(DateTime(timezone=True), default=now_utc)
     lead = relationship("Lead", back_populates="activities")
+
+    __table_args__ = (Index("ix_activities_lead_id_created_at", "lead_id", "created_at"),)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, index=True)  # score, rescore, import, campaign
+    status = Column(String, default="queued")  # queued -> running -> done/failed/interrupted
+    total = Column(Integer, default=0)
+    done = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    params = Column(Text, default="{}")  # JSON: weights, concurrency, rate limit
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=now_utc)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    failures = relationship("JobFailure", back_populates="job", cascade="all, delete-orphan")
+
+class JobFailure(Base):
+    __tablename__ = "job_failures"
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), index=True)
+    lead_id = Column(Integer)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=now_utc)
+    job = relationship("Job", back_populates="failures")
+
+class EvalRun(Base):
+    __tablename__ = "eval_runs"
+    id = Column(Integer, primary_key=True)
+    suite = Column(String, index=True)
+    model = Column(String)
+    total = Column(Integer, default=0)
+    passed = Column(Integer, default=0)
+    concurrency = Column(Integer, default=1)
+    duration_ms = Column(Float, default=0.0)
+    created_at = Column(DateTime(timezone=True), default=now_utc, index=True)
+
+    results = relationship("EvalResult", back_populates="run", cascade="all, delete-orphan")
+
+class EvalResult(Base):
+    __tablename__ = "eval_results"
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("eval_runs.id"), index=True)
+    scenario = Column(String, index=True)
+    sample = Column(Integer, default=0)
+    ok = Column(Boolean, default=False)
+    notes = Column(Text)
+    latency_ms = Column(Float, default=0.0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    output = Column(Text)
+    run = relationship("EvalRun", back_populates="results")
+
+class PipelineStat(Base):
+    """Dashboard counters kept current by database triggers (see dashboard.py)."""
+    __tablename__ = "pipeline_stats"
+    metric = Column(String, primary_key=True)  # stage | score | activity_day
+    bucket = Column(String, primary_key=True)  # stage name | score decile "00".."90" | YYYY-MM-DD
+    count = Column(Integer, nullable=False, default=0)
+
+class LeadEmbedding(Base):
+    """A lead's profile vector for similarity search (see similarity.py)."""
+    __tablename__ = "lead_embeddings"
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), primary_key=True)
+    model = Column(String, nullable=False)      # embedder name, e.g. hashing-128
+    vector = Column(LargeBinary, nullable=False)  # float32, little-endian
+    updated_at = Column(DateTime(timezone=True), default=now_utc, index=True)  # running indexes re-read newer rows
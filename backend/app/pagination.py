@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination.
+
+The lead list is ordered by (updated_at DESC, id DESC) and the cursor is the last row's
+(updated_at, id), so each page is an index range scan on ix_leads_updated_at_id
+no matter how deep the user scrolls. Only the columns the list shows are loaded.
+
+A lead's activities and messages page the same way on (lead_id, created_at), so the
+detail page costs the same for a lead with 5 or 50,000 history rows.
+"""
+
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from . import models
+
+PAGE_SIZE = 50
+HISTORY_SIZE = 20  # activities/messages shown before "show older"
+MAX_PAGE_SIZE = 200
+
+# what index.html renders; notes and other wide columns stay on disk
+LIST_COLUMNS = (
+    models.Lead.id, models.Lead.company, models.Lead.contact_name, models.Lead.title,
+    models.Lead.score, models.Lead.stage, models.Lead.updated_at,
+)
+
+
+def encode_cursor(updated_at: datetime, lead_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{lead_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, lead_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(lead_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def lead_page(db: Session, cursor: Optional[str] = None, limit: int = PAGE_SIZE):
+    """Returns (rows, next_cursor); next_cursor is None on the last page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(*LIST_COLUMNS)
+    if cursor:
+        updated_at, lead_id = decode_cursor(cursor)
+        query = query.filter(tuple_(models.Lead.updated_at, models.Lead.id) < (updated_at, lead_id))
+    rows = (
+        query.order_by(models.Lead.updated_at.desc(), models.Lead.id.desc())
+        .limit(limit + 1).all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def history_page(db: Session, model, lead_id: int, cursor: Optional[str] = None,
+                 limit: int = HISTORY_SIZE):
+    """
+    Newest-first page of a lead's Activity or Message rows, via the (lead_id, created_at) index.
+    Returns (rows, next_cursor) like lead_page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(model).filter(model.lead_id == lead_id)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < (created_at, row_id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
@@ -32,3 +32,20 @@ Constraints:
 - 1 paragraph + bullet CTA options (2).
 - Mention one specific, relevant benefit of Grok for SDRs (lead triage, summarization, or personalized drafts).
 """
+
+CAMPAIGN_PROMPT = """Write a separate first-touch email for each lead below.
+Tone: {tone}
+CTA: {cta}
+Constraints for every email:
+- <150 words.
+- 1 paragraph + bullet CTA options (2).
+- Mention one specific, relevant benefit of Grok for SDRs (lead triage, summarization, or personalized drafts).
+- Personalize each email only with that lead's own details.
+
+Leads:
+{leads}
+
+Return a single JSON object {{"emails": [{{"lead_id": <id>, "email": "<email text>"}}, ...]}} with exactly one entry per lead id. Only JSON, no extra text.
+"""
+
+CAMPAIGN_LEAD = "- lead_id {id}: {contact_name} at {company} ({title}). Context: {context}"
@@ -0,0 +1,294 @@
+"""
+Lead qualification: ask Grok for component scores and turn the reply into a weighted score.
+
+Shared by the single-lead /lead/{id}/score endpoint and the bulk scoring jobs in jobs.py.
+
+The request asks for schema-constrained JSON (response_format json_schema), so the
+reply normally parses as-is. If it doesn't, `extract_json` recovers the object from
+fenced or prefixed text locally; the extra repair call only runs when that fails too.
+`PATHS` counts how often each route is taken.
+"""
+
+import json, logging, math, os, re
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, case, or_, update
+
+from . import models
+from .db import now_utc
+from .grok_client import GrokAPIError, achat, arespond
+from .prompts import SALES_SYSTEM_PROMPT, QUALIFICATION_PROMPT
+from .scoring import COMPONENT_COLUMNS, SCORE_STAGES, stage_for_score, weighted_score
+
+log = logging.getLogger("app.qualification")
+
+QUALIFICATION_KEYS = ("overall", "industry", "size", "intent", "data_quality", "rationale")
+SCORE_KEYS = QUALIFICATION_KEYS[:-1]
+
+QUALIFICATION_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "lead_qualification",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                **{k: {"type": "number"} for k in SCORE_KEYS},
+                "rationale": {"type": "string"},
+            },
+            "required": list(QUALIFICATION_KEYS),
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Set XAI_STRUCTURED_OUTPUT=0 for models/endpoints without response_format support.
+# It is also switched off for the process once the API rejects response_format by name
+# (campaigns.py reads and clears this same flag).
+STRUCTURED_OUTPUT = os.getenv("XAI_STRUCTURED_OUTPUT", "1") != "0"
+
+# structured | direct | extracted | responses_fallback | repair | failed | structured_rejected
+PATHS: Counter = Counter()
+
+
+class QualificationError(Exception):
+    """The model did not return parseable JSON (even after the repair pass), or its scores aren't numbers."""
+
+
+def build_prompt(lead) -> str:
+    """`lead` is anything with the Lead columns as attributes (ORM object or row)."""
+    return QUALIFICATION_PROMPT.format(
+        company=lead.company,
+        contact_name=lead.contact_name,
+        title=lead.title or "Unknown",
+        website=lead.website or "N/A",
+        notes=lead.notes or "N/A",
+    )
+
+
+def parse_json(text: str):
+    """Tiny sanitizer: strip ``` / ```json code fences, then json.loads."""
+    t = (text or "").strip()
+    if t.startswith("```"):
+        # strip code fences like ```json ... ```
+        t = t.strip("`")
+        if t.lower().startswith("json"):
+            t = t[4:].strip()
+    return json.loads(t)
+
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _objects(text: str):
+    """Every balanced top-level {...} span in text, skipping braces inside strings."""
+    depth, start, in_str, escaped = 0, None, False, False
+    for i, ch in enumerate(text):
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i + 1]
+
+
+def extract_json(text: str, keys=SCORE_KEYS) -> Optional[Dict]:
+    """
+    Recover the qualification object from chatty output without another API call:
+    fenced blocks, "Here is the JSON: {...}", trailing commas. Returns the first object
+    carrying any of `keys` (the score keys by default), or None if no object has one.
+    """
+    text = text or ""
+    candidates = [m.group(1) for m in _FENCE.finditer(text)] + [text]
+    found = []
+    for chunk in candidates:
+        for raw in _objects(chunk):
+            for attempt in (raw, _TRAILING_COMMA.sub(r"\1", raw)):
+                try:
+                    obj = json.loads(attempt)
+                except ValueError:
+                    continue
+                if isinstance(obj, dict):
+                    found.append(obj)
+                break
+    for obj in found:
+        if any(k in obj for k in keys):
+            return obj
+    return None
+
+
+def structured_rejected(e: GrokAPIError) -> bool:
+    """
+    True if the API refused `response_format` itself (a 400/422 whose body names it);
+    structured output is then switched off for the process. Any other error is the caller's to raise.
+    """
+    global STRUCTURED_OUTPUT
+    if e.status not in (400, 422) or "response_format" not in str(e):
+        return False
+    PATHS["structured_rejected"] += 1
+    STRUCTURED_OUTPUT = False
+    return True
+
+
+async def _ask(user_prompt: str) -> str:
+    messages = [{"role": "system", "content": SALES_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}]
+    if STRUCTURED_OUTPUT:
+        try:
+            return await achat(messages, temperature=0.0, max_tokens=300,
+                               response_format=QUALIFICATION_SCHEMA)
+        except GrokAPIError as e:
+            if not structured_rejected(e):
+                raise
+    return await achat(messages, temperature=0.0, max_tokens=300)
+
+
+async def qualify(lead) -> Dict:
+    """
+    Returns the parsed qualification dict (overall, industry, size, intent, data_quality, rationale).
+    Primary: schema-constrained chat; fallback: /v1/responses if chat is empty.
+    Parse: as-is, then the local extractor, then (last resort) one JSON repair call.
+    Raises QualificationError if nothing parses.
+    """
+    user_prompt = build_prompt(lead)
+    structured = STRUCTURED_OUTPUT
+
+    # ---- CALL GROK (primary: chat, fallback: responses) ----
+    content = await _ask(user_prompt)
+    if not content or not content.strip():
+        # fallback to /v1/responses if chat returns nothing
+        PATHS["responses_fallback"] += 1
+        structured = False
+        content = await arespond(
+            "You are an SDR assistant. Reply with ONLY one JSON object with keys: "
+            "overall, industry, size, intent, data_quality, rationale.\n\n"
+            f"{user_prompt}",
+            temperature=0.0, max_output_tokens=300
+        )
+
+    # ---- PARSE (as-is, local extraction, then repair call) ----
+    try:
+        data = parse_json(content)
+        if isinstance(data, dict) and any(k in data for k in SCORE_KEYS):
+            PATHS["structured" if structured and STRUCTURED_OUTPUT else "direct"] += 1
+            return data
+    except ValueError:
+        pass
+    data = extract_json(content)
+    if data is not None:
+        PATHS["extracted"] += 1
+        return data
+
+    log.info("unparseable qualification reply, asking for a repair",
+             extra={"fields": {"reply": (content or "")[:800]}})
+    PATHS["repair"] += 1
+    repair = (
+        "Convert the following to a single JSON object with keys: "
+        "overall, industry, size, intent, data_quality, rationale. "
+        "Return ONLY JSON and nothing else.\n\n"
+        f"{content}"
+    )
+    content2 = await achat(
+        [{"role": "system", "content": "Return ONLY a JSON object."},
+         {"role": "user", "content": repair}],
+        temperature=0.0, max_tokens=200
+    )
+    data = extract_json(content2)
+    if data is None:
+        log.warning("qualification repair failed", extra={"fields": {"reply": (content2 or "")[:800]}})
+        PATHS["failed"] += 1
+        raise QualificationError("Model returned non-JSON twice")
+    return data
+
+
+def path_stats() -> Dict:
+    """How qualification replies were obtained, with the share that needed the repair call."""
+    total = sum(PATHS[k] for k in ("structured", "direct", "extracted", "repair"))
+    return {
+        "structured_output": STRUCTURED_OUTPUT,
+        **{k: PATHS[k] for k in ("structured", "direct", "extracted", "responses_fallback",
+                                 "repair", "failed", "structured_rejected")},
+        "repair_rate": round(PATHS["repair"] / total, 4) if total else 0.0,
+    }
+
+
+def component_parts(data: Dict) -> Dict[str, float]:
+    """The four component scores as floats (missing -> 0); a value that isn't a number raises QualificationError."""
+    parts = {}
+    for key in ("industry", "size", "intent", "data_quality"):
+        value = data.get(key, 0)
+        try:
+            parts[key] = float(value)
+        except (TypeError, ValueError):
+            raise QualificationError(f"Non-numeric {key} score: {value!r}") from None
+        if not math.isfinite(parts[key]):
+            raise QualificationError(f"Non-numeric {key} score: {value!r}")
+    return parts
+
+
+def component_columns(parts: Dict[str, float]) -> Dict[str, float]:
+    """component_parts() keys -> Lead column names (industry -> industry_score, ...)."""
+    return {COMPONENT_COLUMNS[k]: v for k, v in parts.items()}
+
+
+def score_update(data: Dict, weights) -> Dict:
+    """
+    Column values to write back for a qualified lead: score, stage, updated_at and
+    the component columns (+ parts for logging).
+    """
+    parts = component_parts(data)
+    score = weighted_score(parts, weights)
+    now = now_utc()
+    return {
+        "parts": parts,
+        "score": score,
+        "stage": stage_for_score(score),
+        "updated_at": now,
+        "columns": {**component_columns(parts), "scored_at": now},
+    }
+
+
+_leads = models.Lead.__table__
+_SCORED_COLUMNS = (*COMPONENT_COLUMNS.values(), "scored_at")
+
+# One statement for every score write (single lead or a job batch, via executemany).
+# The stage is decided in the UPDATE against the row's current value, so a stage change
+# made while the model call was in flight (meeting, won, ...) is never overwritten.
+# (OR of equalities rather than IN: expanding IN can't be used with executemany.)
+SCORE_WRITE = (
+    update(_leads)
+    .where(_leads.c.id == bindparam("b_id"))
+    .values(
+        score=bindparam("b_score"),
+        stage=case((or_(*(_leads.c.stage == s for s in SCORE_STAGES)), bindparam("b_stage")),
+                   else_=_leads.c.stage),
+        updated_at=bindparam("b_updated_at"),
+        **{c: bindparam(f"b_{c}") for c in _SCORED_COLUMNS},
+    )
+)
+
+
+def score_params(lead_id: int, upd: Dict) -> Dict:
+    """Bind parameters of SCORE_WRITE for one score_update() result."""
+    return {
+        "b_id": lead_id, "b_score": upd["score"], "b_stage": upd["stage"],
+        "b_updated_at": upd["updated_at"],
+        **{f"b_{c}": upd["columns"].get(c) for c in _SCORED_COLUMNS},
+    }
+
+
+def activity_detail(parts: Dict, score: float, data: Dict) -> str:
+    return f"Parts={parts} -> weighted={score}. Rationale: {str(data.get('rationale',''))[:220]}"
@@ -0,0 +1,307 @@
+"""
+Process-wide throttling for Grok API calls.
+
+Every call goes through one Limiter:
+- two token buckets, requests/min and tokens/min. A call reserves 1 request and an
+  estimate of its tokens up front; the estimate is corrected from the response's
+  `usage` block once it arrives.
+- a shared pause: a 429 with Retry-After (or rate-limit headers reporting 0 remaining)
+  holds back every caller until the reset, not just the one that got throttled.
+- an AIMD concurrency governor: the in-flight limit grows by ~1 per window of
+  successful calls and halves on a 429/503, so throughput settles just under the quota.
+
+Retries use full-jitter exponential backoff, or the server's Retry-After when it sends one.
+"""
+
+import asyncio, os, random, re, threading, time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Mapping, Optional
+
+REQUESTS_PER_MINUTE = float(os.getenv("XAI_RPM", "480"))
+TOKENS_PER_MINUTE = float(os.getenv("XAI_TPM", "2000000"))
+MAX_ATTEMPTS = int(os.getenv("XAI_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE = float(os.getenv("XAI_BACKOFF_BASE", "0.5"))  # seconds
+BACKOFF_CAP = float(os.getenv("XAI_BACKOFF_CAP", "30"))
+# AIMD bounds for concurrent in-flight calls per process
+CONCURRENCY_START = int(os.getenv("XAI_CONCURRENCY_START", "8"))
+CONCURRENCY_MIN = int(os.getenv("XAI_CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.getenv("XAI_CONCURRENCY_MAX", "64"))
+
+THROTTLED = (429, 503)  # congestion signals: back off concurrency
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Rough prompt size (~4 chars/token) plus the completion budget."""
+    chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return chars // CHARS_PER_TOKEN + max_tokens
+
+
+def backoff(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """'20', '1.5', '6m0s', '250ms' -> seconds; None if absent or unparseable."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from Retry-After (seconds or HTTP date) or retry-after-ms."""
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+    """The server's Retry-After (plus a little jitter to spread callers) or jittered backoff."""
+    server = retry_after(headers) if headers is not None else None
+    if server is not None:
+        return server + random.uniform(0, BACKOFF_BASE)
+    return backoff(attempt)
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket. `reserve` always succeeds and returns how long the caller
+    must wait; the balance may go negative, which queues later callers behind it.
+    Thread-safe.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float):
+        """Refund (positive) or charge (negative) after the real cost is known."""
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+    def clamp(self, remaining: float):
+        """Trust the server's view when it says fewer units are left than we think."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.level, remaining)
+
+    def set_limit(self, per_minute: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = per_minute / 60.0
+            self.capacity = per_minute
+            self.level = min(self.level, self.capacity)
+
+
+class AIMDGovernor:
+    """
+    Adaptive in-flight limit. Additive increase: +1/limit per success while the window
+    is full (about +1 per window). Multiplicative decrease: halve on a congestion signal, at most once
+    per cooldown so a burst of concurrent 429s counts as one event.
+    """
+
+    def __init__(self, start: int = CONCURRENCY_START, minimum: int = CONCURRENCY_MIN,
+                 maximum: int = CONCURRENCY_MAX, decrease: float = 0.5, cooldown: float = 1.0):
+        self.limit = float(start)
+        self.minimum, self.maximum = minimum, maximum
+        self.decrease, self.cooldown = decrease, cooldown
+        self.in_flight = 0
+        self._waiters: List[asyncio.Future] = []
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._wake()  # we were handed a slot; pass it on
+                raise
+            finally:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+        self.in_flight += 1
+
+    def release(self, congested: bool = False, ok: bool = False):
+        # only grow when the window was actually full; idle headroom proves nothing
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        if congested:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._last_decrease = now
+        elif ok and saturated:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.pop(0)
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+
+class Ticket:
+    """One admitted call; report the response through it so the limiter can adapt."""
+
+    def __init__(self, limiter: "Limiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.status: Optional[int] = None
+
+    def observe(self, status: int, headers: Optional[Mapping[str, str]] = None):
+        self.status = status
+        self.limiter.observe(status, headers or {})
+
+    def usage(self, total_tokens: int):
+        if total_tokens:
+            self.limiter.tpm.adjust(self.tokens - total_tokens)
+
+
+class Limiter:
+    def __init__(self, rpm: float = REQUESTS_PER_MINUTE, tpm: float = TOKENS_PER_MINUTE,
+                 governor: Optional[AIMDGovernor] = None):
+        self.configured = (rpm, tpm)
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.governor = governor or AIMDGovernor()
+        self._paused_until = 0.0
+        self.counters = {"calls": 0, "throttled": 0, "retries": 0, "waited_s": 0.0}
+
+    # ---- admission ----
+
+    def _delay(self, tokens: int) -> float:
+        pause = self._paused_until - time.monotonic()
+        return max(pause, self.rpm.reserve(1), self.tpm.reserve(tokens))
+
+    async def acquire(self, tokens: int):
+        """Wait for a concurrency slot and quota. Caller must `release` afterwards."""
+        await self.governor.acquire()
+        try:
+            delay = self._delay(tokens)
+            while delay > 0:
+                self.counters["waited_s"] += delay
+                await asyncio.sleep(delay)
+                # a 429 elsewhere may have extended the pause while we slept
+                delay = self._paused_until - time.monotonic()
+        except BaseException:
+            self.governor.release()
+            raise
+        self.counters["calls"] += 1
+
+    def retried(self):
+        self.counters["retries"] += 1
+
+    def release(self, status: Optional[int]):
+        self.governor.release(congested=status in THROTTLED, ok=status == 200)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        await self.acquire(tokens)
+        ticket = Ticket(self, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket.status)
+
+    # ---- feedback ----
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, status: int, headers: Mapping[str, str]):
+        """Apply Retry-After and x-ratelimit-* headers from any response."""
+        if status in THROTTLED:
+            self.counters["throttled"] += 1
+            wait = retry_after(headers)
+            if wait is not None:
+                self.pause(wait)
+        for kind, bucket, configured in (("requests", self.rpm, self.configured[0]),
+                                         ("tokens", self.tpm, self.configured[1])):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            if limit:
+                try:
+                    server = float(limit)
+                except ValueError:
+                    server = None
+                if server and min(server, configured) != bucket.capacity:
+                    bucket.set_limit(min(server, configured))
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            bucket.clamp(remaining)
+            if remaining <= 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.pause(reset)
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "waited_s": round(self.counters["waited_s"], 3),
+            "concurrency_limit": round(self.governor.limit, 2),
+            "in_flight": self.governor.in_flight,
+            "rpm_limit": round(self.rpm.capacity, 1),
+            "tpm_limit": round(self.tpm.capacity, 1),
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+_limiter: Optional[Limiter] = None
+
+
+def get_limiter() -> Limiter:
+    """The process-wide limiter, built on first use."""
+    global _limiter
+    if _limiter is None:
+        _limiter = Limiter()
+    return _limiter
@@ -0,0 +1,134 @@
+"""
+Re-weighting without model calls.
+
+Scoring stores each lead's component scores (industry/size/intent/data_quality
+columns), so new ScoreWeights only need arithmetic: `rescore_all` streams the
+components through NumPy in id-ordered chunks and writes back the leads whose
+score or stage actually changed, all in one transaction.
+
+Leads scored before the component columns existed can be backfilled from their
+latest "scored" activity with `backfill_components` (python -m app.manage backfill-components).
+"""
+
+import ast, time
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .db import now_utc
+from . import models, schemas
+from .scoring import COMPONENT_COLUMNS, restage, weighted_scores
+
+CHUNK_SIZE = 100_000  # leads per read; memory stays flat on any table size
+
+_leads = models.Lead.__table__
+_COMPONENTS = [_leads.c[name] for name in COMPONENT_COLUMNS.values()]
+
+
+def _read_chunk(db: Session, last_id: int, limit: int):
+    """(id, 4 components, score, stage) rows of scored leads after last_id."""
+    return db.execute(
+        select(_leads.c.id, *_COMPONENTS, _leads.c.score, _leads.c.stage)
+        .where(_leads.c.id > last_id, _leads.c.industry_score.is_not(None))
+        .order_by(_leads.c.id).limit(limit)
+    ).all()
+
+
+def _write_changes(db: Session, ids, scores, stages):
+    db.execute(update(models.Lead), [
+        {"id": i, "score": score, "stage": stage} for i, score, stage in zip(ids, scores, stages)
+    ])
+
+
+def rescore_all(db: Session, weights: schemas.ScoreWeights, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """
+    Re-score every lead with stored components under `weights` and re-stage new/qualified
+    leads (later stages are kept). updated_at is left alone: nothing about the lead changed.
+    Records a finished "rescore" Job and returns its summary counts.
+    """
+    started = time.perf_counter()
+    job = models.Job(kind="rescore", status="running", params=weights.model_dump_json(), started_at=now_utc())
+    db.add(job)
+    db.flush()
+
+    total = changed = promoted = demoted = 0
+    last_id = 0
+    while True:
+        rows = _read_chunk(db, last_id, chunk_size)
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        numeric = np.array([r[:6] for r in rows], dtype=np.float64)  # id, 4 components, score
+        stages = np.array([r[6] for r in rows], dtype=object)
+
+        components = np.nan_to_num(numeric[:, 1:5])
+        scores = weighted_scores(components, weights)
+        new_stages = restage(scores, stages)
+
+        old_scores = np.nan_to_num(numeric[:, 5])
+        diff = (scores != old_scores) | (new_stages != stages)
+        total += len(rows)
+        changed += int(diff.sum())
+        promoted += int(((stages == "new") & (new_stages == "qualified")).sum())
+        demoted += int(((stages == "qualified") & (new_stages == "new")).sum())
+        if diff.any():
+            _write_changes(db, numeric[diff, 0].astype(np.int64).tolist(),
+                           scores[diff].tolist(), new_stages[diff].tolist())
+
+    job.total = job.done = total
+    job.status, job.finished_at = "done", now_utc()
+    db.commit()
+    return {
+        "job_id": job.id, "total": total, "changed": changed,
+        "promoted": promoted, "demoted": demoted,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def parse_parts(detail: str):
+    """Component dict from a "scored" activity detail ("Parts={...} -> weighted=..."), or None."""
+    if not detail or not detail.startswith("Parts="):
+        return None
+    head = detail[len("Parts="):].split(" -> weighted=", 1)[0]
+    try:
+        parts = ast.literal_eval(head)
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(parts, dict) or not set(COMPONENT_COLUMNS) <= set(parts):
+        return None
+    return {COMPONENT_COLUMNS[k]: float(parts[k]) for k in COMPONENT_COLUMNS}
+
+
+def backfill_components(db: Session, batch_size: int = 1000) -> int:
+    """Fill component columns of leads that have none from their latest "scored" activity."""
+    act = models.Activity
+    filled, last_id = 0, 0
+    while True:
+        ids = db.execute(
+            select(_leads.c.id)
+            .where(_leads.c.id > last_id, _leads.c.industry_score.is_(None))
+            .order_by(_leads.c.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        rows = db.execute(
+            select(act.lead_id, act.detail, act.created_at)
+            .where(act.type == "scored", act.lead_id.in_(ids))
+            .order_by(act.lead_id, act.created_at.desc(), act.id.desc())
+        ).all()
+        batch, seen = [], set()
+        for lead_id, detail, created_at in rows:
+            if lead_id in seen:
+                continue
+            seen.add(lead_id)  # newest first per lead
+            parts = parse_parts(detail)
+            if parts is not None:
+                batch.append({"id": lead_id, **parts, "scored_at": created_at})
+        if batch:
+            db.execute(update(models.Lead), batch)
+            filled += len(batch)
+    db.commit()
+    return filled
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_serializer
 from typing import Optional, List
+from datetime import datetime, timezone
 
 class LeadCreate(BaseModel):
     company: str
@@ -23,14 +24,43 @@ class LeadOut(BaseModel):
     id: int
     company: str
     contact_name: str
-    email: EmailStr
+    email: str  # validated on the way in; re-validating every read costs more than the rest of the row
     title: Optional[str]
     website: Optional[str]
-    notes: str
+    notes: Optional[str]
+    score: float
+    stage: str
+    industry_score: Optional[float] = None
+    size_score: Optional[float] = None
+    intent_score: Optional[float] = None
+    data_quality_score: Optional[float] = None
+    scored_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    class Config: from_attributes = True
+
+    @field_serializer("scored_at", "created_at", "updated_at")
+    def _utc(self, value: Optional[datetime]) -> Optional[datetime]:
+        # always UTC with an offset, so the body (and its ETag) doesn't depend on whether
+        # the row came from this session (aware) or back from SQLite (naive)
+        if value is None:
+            return None
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+class LeadListItem(BaseModel):
+    id: int
+    company: str
+    contact_name: str
+    title: Optional[str]
     score: float
     stage: str
+    updated_at: datetime
     class Config: from_attributes = True
 
+class LeadPage(BaseModel):
+    items: List[LeadListItem]
+    next_cursor: Optional[str] = None
+
 class ScoreWeights(BaseModel):
     industry_fit: float = 0.4
     size_fit: float = 0.2
@@ -43,13 +73,141 @@ class MessageRequest(BaseModel):
     call_to_action: str = Field(default="Would you be open to a 20-minute intro call this week?")
     extra_context: Optional[str] = None
 
+class MessageOut(BaseModel):
+    lead_id: int
+    content: str
+
 class EvalScenario(BaseModel):
     name: str
     prompt: str
     must_include: Optional[str] = None
     must_not_include: Optional[str] = None
+    max_words: Optional[int] = None
+    checks: List[str] = Field(default_factory=list)  # extra checkers from evals.CHECKS
+    samples: int = Field(default=1, ge=1)
+    temperature: float = 0.3
+    max_tokens: int = 250
 
 class EvalRunResult(BaseModel):
     scenario: str
     ok: bool
     notes: str
+    sample: int = 0
+    latency_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+class EvalScenarioSummary(BaseModel):
+    scenario: str
+    samples: int
+    passed: int
+    pass_rate: float
+    p50_ms: float
+    p95_ms: float
+    prompt_tokens: int
+    completion_tokens: int
+    notes: str
+
+class EvalRunOut(BaseModel):
+    id: int
+    suite: str
+    model: Optional[str] = None
+    total: int
+    passed: int
+    concurrency: int
+    duration_ms: float
+    created_at: datetime
+    scenarios: List[EvalScenarioSummary] = []
+    class Config: from_attributes = True
+
+class LeadSelection(BaseModel):
+    """Either an explicit ID list or a filter (stage / search text / unscored only)."""
+    lead_ids: Optional[List[int]] = None
+    stage: Optional[str] = None
+    q: Optional[str] = None
+    unscored_only: bool = False
+
+class ScoreJobCreate(LeadSelection):
+    weights: ScoreWeights = Field(default_factory=ScoreWeights)
+    concurrency: int = Field(default=8, ge=1, le=64)
+    rate_per_minute: int = Field(default=120, ge=1)
+
+class CampaignCreate(LeadSelection):
+    """Outreach drafts for every selected lead; `pack_size` leads share one model call."""
+    tone: str = "concise, helpful, human"
+    call_to_action: str = "Would you be open to a 20-minute intro call this week?"
+    extra_context: Optional[str] = None
+    pack_size: int = Field(default=10, ge=1, le=25)
+    concurrency: int = Field(default=4, ge=1, le=64)
+    rate_per_minute: int = Field(default=120, ge=1)
+
+class JobFailureOut(BaseModel):
+    lead_id: int
+    error: str
+    class Config: from_attributes = True
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str
+    total: int
+    done: int
+    failed: int
+    error: Optional[str] = None
+    failures: List[JobFailureOut] = []
+    class Config: from_attributes = True
+
+class RescoreOut(BaseModel):
+    job_id: int
+    total: int      # leads with stored components
+    changed: int    # leads whose score or stage changed
+    promoted: int   # new -> qualified
+    demoted: int    # qualified -> new
+    duration_ms: float
+
+class ImportRowError(BaseModel):
+    row: int        # CSV line / JSONL line number
+    error: str
+
+class PossibleDuplicate(BaseModel):
+    row: int         # CSV line / JSONL line number
+    lead_id: int     # stored lead it resembles
+    similarity: float
+
+class ImportResult(BaseModel):
+    job_id: int
+    total: int
+    inserted: int
+    duplicates: int  # email already present, or repeated in the file
+    failed: int
+    errors: List[ImportRowError] = []  # first bulk.MAX_ERRORS only
+    # with ?dedup=true: inserted rows whose company and contact match a stored lead (first bulk.MAX_ERRORS)
+    possible_duplicates: List[PossibleDuplicate] = []
+    duration_ms: float
+
+class SimilarLead(BaseModel):
+    id: int
+    company: str
+    contact_name: str
+    title: Optional[str]
+    stage: str
+    score: float
+    similarity: float  # cosine of the profile vectors, 1.0 = identical
+
+class StageCount(BaseModel):
+    stage: str
+    count: int
+
+class ScoreBucket(BaseModel):
+    bucket: str     # "0-9" ... "90-100"
+    count: int
+
+class DayCount(BaseModel):
+    day: str        # YYYY-MM-DD (UTC)
+    count: int
+
+class DashboardOut(BaseModel):
+    total_leads: int
+    stages: List[StageCount]
+    scores: List[ScoreBucket]
+    activity_per_day: List[DayCount]
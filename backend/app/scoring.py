@@ -1,3 +1,29 @@
+"""
+Weighted lead scores from the model's component scores.
+
+`weighted_score` scores one lead; `weighted_scores` / `restage` do the same for a whole
+(n, 4) component matrix at once with NumPy (see rescore.py).
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # NumPy is imported by the batch paths only; per-lead scoring doesn't need it
+    import numpy as np
+
+# component -> Lead column, in the column order of the batch matrices below
+COMPONENT_COLUMNS = {
+    "industry": "industry_score",
+    "size": "size_score",
+    "intent": "intent_score",
+    "data_quality": "data_quality_score",
+}
+QUALIFIED_AT = 60
+# stages the score decides; later stages (contacted, meeting, won/lost) are never touched
+SCORE_STAGES = ("new", "qualified")
+
+
 def weighted_score(parts, w):
     """
     parts: dict with numeric keys: industry, size, intent, data_quality
@@ -17,3 +43,32 @@ def weighted_score(parts, w):
         data_quality * w.data_quality
     ) / total_w
     return round(score, 2)
+
+
+def stage_for_score(score: float) -> str:
+    return "qualified" if score >= QUALIFIED_AT else "new"
+
+
+def weighted_scores(components: np.ndarray, w) -> np.ndarray:
+    """
+    components: (n, 4) float array in COMPONENT_COLUMNS order.
+    returns n scores; same formula and term order as weighted_score, one row per lead.
+    """
+    total_w = (w.industry_fit + w.size_fit + w.intent_signals + w.data_quality) or 1.0
+    score = (
+        components[:, 0] * w.industry_fit +
+        components[:, 1] * w.size_fit +
+        components[:, 2] * w.intent_signals +
+        components[:, 3] * w.data_quality
+    ) / total_w
+    import numpy as np
+
+    return np.round(score, 2)
+
+
+def restage(scores: np.ndarray, stages: np.ndarray) -> np.ndarray:
+    """New stage per lead: new/qualified follow the score, any other stage is kept."""
+    import numpy as np
+
+    scored = np.isin(stages, SCORE_STAGES)
+    return np.where(scored, np.where(scores >= QUALIFIED_AT, "qualified", "new"), stages)
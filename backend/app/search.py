@@ -0,0 +1,221 @@
+"""
+Full-text lead search.
+
+On SQLite, `leads_fts` is an external-content FTS5 index over
+leads(company, contact_name, title, notes). Triggers keep it in sync on
+insert/update/delete, so every write path (ORM, bulk inserts, raw SQL) is covered
+without application code. Queries are prefix matches on every term, ranked by bm25
+with company/contact weighted above title and notes; very broad
+queries are ranked over their newest CANDIDATE_CAP matches so latency stays flat.
+
+On PostgreSQL the same columns go into a weighted tsvector (A..D) behind a GIN
+expression index, queried with prefix tsqueries and ranked by ts_rank.
+
+Other dialects fall back to the old ILIKE scan. The mode is detected from the
+database on first use, so workers that didn't run install_fts still use the index.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+SEARCH_LIMIT = 100
+CANDIDATE_CAP = 5000  # matches ranked per query, newest first
+# bm25 column weights, in FTS column order: company, contact_name, title, notes
+RANK_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5("
+    " company, contact_name, title, notes,"
+    " content='leads', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN"
+    " INSERT INTO leads_fts(rowid, company, contact_name, title, notes)"
+    " VALUES (new.id, new.company, new.contact_name, new.title, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN"
+    " INSERT INTO leads_fts(leads_fts, rowid, company, contact_name, title, notes)"
+    " VALUES ('delete', old.id, old.company, old.contact_name, old.title, old.notes); END",
+    # only the indexed columns; score/stage updates never touch the index
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE OF company, contact_name, title, notes ON leads BEGIN"
+    " INSERT INTO leads_fts(leads_fts, rowid, company, contact_name, title, notes)"
+    " VALUES ('delete', old.id, old.company, old.contact_name, old.title, old.notes);"
+    " INSERT INTO leads_fts(rowid, company, contact_name, title, notes)"
+    " VALUES (new.id, new.company, new.contact_name, new.title, new.notes); END",
+]
+
+# PostgreSQL: weights in the same order as RANK_WEIGHTS. Queries must repeat this
+# expression verbatim for the planner to use the GIN index.
+PG_TSVECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(company, '')), 'A') ||"
+    " setweight(to_tsvector('simple', coalesce(contact_name, '')), 'B') ||"
+    " setweight(to_tsvector('simple', coalesce(title, '')), 'C') ||"
+    " setweight(to_tsvector('simple', coalesce(notes, '')), 'D'))"
+)
+PG_DDL = [f"CREATE INDEX IF NOT EXISTS ix_leads_search ON leads USING gin ({PG_TSVECTOR})"]
+
+FTS5, TSVECTOR, ILIKE = "fts5", "tsvector", "ilike"
+_mode: Optional[str] = None  # None until installed or detected
+
+
+def install_fts(engine: Engine) -> bool:
+    """
+    Create the search index if missing (idempotent): FTS5 table + triggers on SQLite,
+    a GIN index on PostgreSQL. A freshly created FTS5 index is rebuilt from existing
+    leads. Returns False (ILIKE fallback) if neither is available.
+    """
+    global _mode
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for ddl in PG_DDL:
+                conn.execute(text(ddl))
+        _mode = TSVECTOR
+        return True
+    if engine.dialect.name != "sqlite":
+        _mode = ILIKE
+        return False
+    with engine.begin() as conn:
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'leads_fts'")
+        ).first() is not None
+        try:
+            for ddl in FTS_DDL:
+                conn.execute(text(ddl))
+        except Exception:
+            # sqlite built without FTS5
+            _mode = ILIKE
+            return False
+        if not existed:
+            conn.execute(text("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')"))
+    _mode = FTS5
+    return True
+
+
+def detect_mode(engine: Engine) -> str:
+    """Which search path the database supports, without creating anything."""
+    if engine.dialect.name == "postgresql":
+        return TSVECTOR
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            found = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'leads_fts'")
+            ).first()
+        return FTS5 if found else ILIKE
+    return ILIKE
+
+
+def _current_mode(db: Session) -> str:
+    global _mode
+    if _mode is None:
+        _mode = detect_mode(db.get_bind())
+    return _mode
+
+
+def rebuild_fts(engine: Engine):
+    """Re-index every lead (repair after restoring a backup or editing leads outside triggers)."""
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("REINDEX INDEX ix_leads_search"))
+        return
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')"))
+
+
+def fts_query(q: str) -> Optional[str]:
+    """User text -> FTS5 MATCH expression: every word as a quoted prefix term, AND-ed."""
+    terms = re.findall(r"\w+", q or "", re.UNICODE)
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def pg_tsquery(q: str) -> Optional[str]:
+    """User text -> to_tsquery input: every word as a prefix term, AND-ed."""
+    terms = re.findall(r"\w+", q or "", re.UNICODE)
+    if not terms:
+        return None
+    return " & ".join(f"{t}:*" for t in terms)
+
+
+def _ranked_matches(match: str, limit: int):
+    # bm25 costs O(matches), so a broad prefix ("a*") over 500k leads would rank
+    # hundreds of thousands of rows. Rank only the newest CANDIDATE_CAP matches:
+    # exact for selective queries, bounded latency for broad ones.
+    weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+    sql = (
+        "SELECT lead_id, rank FROM ("
+        f" SELECT rowid AS lead_id, bm25(leads_fts, {weights}) AS rank"
+        " FROM leads_fts WHERE leads_fts MATCH :match ORDER BY rowid DESC LIMIT :cap"
+        ") ORDER BY rank LIMIT :limit"
+    )
+    return (
+        text(sql).bindparams(match=match, cap=CANDIDATE_CAP, limit=limit)
+        .columns(lead_id=Integer, rank=Float).subquery("fts")
+    )
+
+
+def _pg_ranked_matches(match: str, limit: int):
+    # same newest-CANDIDATE_CAP bound as the FTS5 path
+    weights = "{" + ", ".join(str(w / RANK_WEIGHTS[0]) for w in reversed(RANK_WEIGHTS)) + "}"
+    sql = (
+        "SELECT lead_id, rank FROM ("
+        f" SELECT id AS lead_id, ts_rank('{weights}', {PG_TSVECTOR}, to_tsquery('simple', :match)) AS rank"
+        f" FROM leads WHERE {PG_TSVECTOR} @@ to_tsquery('simple', :match) ORDER BY id DESC LIMIT :cap"
+        ") AS candidates ORDER BY rank DESC LIMIT :limit"
+    )
+    return (
+        text(sql).bindparams(match=match, cap=CANDIDATE_CAP, limit=limit)
+        .columns(lead_id=Integer, rank=Float).subquery("fts")
+    )
+
+
+def _ilike(q: str):
+    qlike = f"%{q}%"
+    return (
+        (models.Lead.company.ilike(qlike)) |
+        (models.Lead.contact_name.ilike(qlike)) |
+        (models.Lead.notes.ilike(qlike))
+    )
+
+
+def search_leads(db: Session, q: str, limit: int = SEARCH_LIMIT, query=None):
+    """
+    Leads matching `q`, best match first. `query` lets callers search a projected
+    query (e.g. db.query(Lead.id, Lead.company, ...)); defaults to full Lead rows.
+    """
+    query = query if query is not None else db.query(models.Lead)
+    mode = _current_mode(db)
+    if mode == ILIKE:
+        return query.filter(_ilike(q)).order_by(models.Lead.updated_at.desc()).limit(limit)
+    if mode == TSVECTOR:
+        match = pg_tsquery(q)
+        if match is None:
+            return query.filter(False)
+        fts = _pg_ranked_matches(match, limit)
+        return query.join(fts, models.Lead.id == fts.c.lead_id).order_by(fts.c.rank.desc())
+    match = fts_query(q)
+    if match is None:
+        return query.filter(False)
+    fts = _ranked_matches(match, limit)
+    return query.join(fts, models.Lead.id == fts.c.lead_id).order_by(fts.c.rank)
+
+
+def filter_matching(query, q: str):
+    """Restrict an existing Lead query to search matches (unranked, unlimited)."""
+    mode = _current_mode(query.session)
+    if mode == ILIKE:
+        return query.filter(_ilike(q))
+    if mode == TSVECTOR:
+        match = pg_tsquery(q)
+        if match is None:
+            return query.filter(False)
+        return query.filter(text(f"{PG_TSVECTOR} @@ to_tsquery('simple', :match)").bindparams(match=match))
+    match = fts_query(q)
+    if match is None:
+        return query.filter(False)
+    ids = text("SELECT rowid FROM leads_fts WHERE leads_fts MATCH :match").bindparams(match=match)
+    return query.filter(models.Lead.id.in_(ids.columns(rowid=Integer)))
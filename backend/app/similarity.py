@@ -0,0 +1,371 @@
+"""
+Lookalike leads and near-duplicate checks over an embedding index.
+
+Every lead's profile vector (embeddings.lead_vectors over company, title and notes) is
+stored as float32 bytes in lead_embeddings, written in the lead's own transaction by
+create_lead and the bulk import, so all workers and pods search the same vectors.
+
+Each process searches them in a VectorIndex: an optional read-only snapshot
+(EMBED_INDEX_DIR, written by `python -m app.manage build-embeddings` and memory-mapped,
+so the workers on a host share one copy through the page cache) plus an in-memory
+float32 tail. Before each query the tail takes the rows past the highest lead id seen
+(one indexed range scan). Every RESYNC_SECONDS a count check also catches rows that
+committed out of id order, e.g. a long import batch.
+
+Edited leads get their vector rewritten with a new updated_at (store(replace=True)). Each
+refresh also reads the rows stamped within CHANGE_WINDOW of the newest stamp it has seen
+(a second range scan, on updated_at) and re-reads those it hasn't applied yet: the new
+vector goes on the tail and the old position is masked out of every later search.
+
+A query is one matrix-vector product plus an argpartition: about 130M multiply-adds for
+1M leads at 128 dims, i.e. tens of milliseconds. Deleted leads can linger in the index;
+results are joined back to `leads`, which drops them.
+"""
+
+import json, os, threading, time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import embeddings, models
+from .db import now_utc
+
+INDEX_DIR = os.getenv("EMBED_INDEX_DIR", "")
+RESYNC_SECONDS = float(os.getenv("EMBED_RESYNC_SECONDS", "30"))
+# how far behind the newest updated_at seen a rewritten vector may commit (transaction time, clock skew)
+CHANGE_WINDOW = timedelta(seconds=float(os.getenv("EMBED_CHANGE_WINDOW_SECONDS", "60")))
+# import rows whose company and contact name both match a stored lead this closely are reported
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+DEDUP_CANDIDATES = 10      # nearest leads per import row that get the company/contact check
+LOAD_CHUNK = 10_000        # embedding rows per fetch
+SCORE_BLOCK = 1 << 25      # floats per (queries x leads) score block, ~128 MB
+
+
+class VectorIndex:
+    """
+    Lead ids and unit float32 rows: a fixed (possibly memory-mapped) base and a growable tail.
+    A replaced vector is appended and its old position goes into `dead`, which searches skip.
+    """
+
+    def __init__(self, dim: int, base_ids: Optional[np.ndarray] = None,
+                 base_vectors: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.base_ids = base_ids if base_ids is not None else np.empty(0, dtype=np.int64)
+        self.base_vectors = base_vectors if base_vectors is not None else np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(1024, dtype=np.int64)
+        self._vectors = np.empty((1024, dim), dtype=np.float32)
+        self._n = 0
+        self._dead = np.empty(0, dtype=np.int64)  # positions (base, then tail) superseded by a newer row
+        self.max_id = int(self.base_ids.max()) if len(self.base_ids) else 0
+        self.known = len(self.base_ids)  # stored rows with lead_id <= max_id, as last counted
+        self.synced_at = time.monotonic()
+        self.changed_since: Optional[datetime] = None  # newest updated_at seen
+        self.stamps: Dict[int, datetime] = {}          # lead id -> updated_at, for rows inside CHANGE_WINDOW
+        self.lock = threading.Lock()       # tail growth vs readers
+        self.sync_lock = threading.Lock()  # one refresh at a time
+
+    def __len__(self) -> int:
+        return len(self.base_ids) + self._n - len(self._dead)
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        if not len(ids):
+            return
+        with self.lock:
+            self._append(ids, vectors)
+
+    def replace(self, ids: np.ndarray, vectors: np.ndarray):
+        """New vectors for leads the index may already hold; their current rows stop matching."""
+        if not len(ids):
+            return
+        with self.lock:
+            held = np.concatenate([self.base_ids, self._ids[:self._n]])
+            self._dead = np.union1d(self._dead, np.flatnonzero(np.isin(held, ids)))
+            self._append(ids, vectors)
+
+    def note(self, ids: np.ndarray, stamps: Sequence[Optional[datetime]]):
+        """Remember the updated_at of rows just loaded, so the change scan doesn't load them again."""
+        newest = max((at for at in stamps if at is not None), default=None)
+        if newest is not None and (self.changed_since is None or newest > self.changed_since):
+            self.changed_since = newest
+        if self.changed_since is None:
+            return
+        cutoff = self.changed_since - CHANGE_WINDOW
+        self.stamps.update((i, at) for i, at in zip(ids.tolist(), stamps) if at is not None and at > cutoff)
+
+    def _append(self, ids: np.ndarray, vectors: np.ndarray):
+        needed = self._n + len(ids)
+        if needed > len(self._ids):
+            # readers keep the old arrays; rows [:n] are never written again
+            capacity = max(needed, 2 * len(self._ids))
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            grown_ids[:self._n] = self._ids[:self._n]
+            grown_vectors[:self._n] = self._vectors[:self._n]
+            self._ids, self._vectors = grown_ids, grown_vectors
+        self._ids[self._n:needed] = ids
+        self._vectors[self._n:needed] = vectors
+        self._n = needed
+        self.max_id = max(self.max_id, int(ids.max()))
+
+    def _parts(self):
+        with self.lock:
+            parts = [(self.base_ids, self.base_vectors), (self._ids[:self._n], self._vectors[:self._n])]
+            return parts, self._dead
+
+    def ids(self) -> np.ndarray:
+        """Ids of the live rows."""
+        parts, dead = self._parts()
+        return np.delete(np.concatenate([ids for ids, _ in parts]), dead)
+
+    def top_k(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, scores), each (len(queries), min(k, len(self))), best first, by cosine (dot of unit rows)."""
+        parts, dead = self._parts()
+        ids = np.concatenate([p_ids for p_ids, _ in parts])
+        k = min(k, len(ids) - len(dead))
+        out_ids = np.empty((len(queries), k), dtype=np.int64)
+        out_scores = np.empty((len(queries), k), dtype=np.float32)
+        if not k:
+            return out_ids, out_scores
+        step = max(1, SCORE_BLOCK // len(ids))
+        for start in range(0, len(queries), step):
+            block = queries[start:start + step]
+            scores = np.concatenate([block @ vectors.T for _, vectors in parts], axis=1)
+            scores[:, dead] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            out_ids[start:start + step] = ids[np.take_along_axis(top, order, axis=1)]
+            out_scores[start:start + step] = np.take_along_axis(top_scores, order, axis=1)
+        return out_ids, out_scores
+
+
+def _decode(vectors: Sequence[bytes], dim: int) -> np.ndarray:
+    return np.frombuffer(b"".join(vectors), dtype=np.float32).reshape(-1, dim)
+
+
+def _fetch(db: Session, embedder, *conditions):
+    """(ids, vectors, updated_at list) chunks of stored rows for the current embedder matching `conditions`."""
+    stored = models.LeadEmbedding
+    result = db.execute(
+        select(stored.lead_id, stored.vector, stored.updated_at)
+        .where(stored.model == embedder.name, *conditions)
+        .order_by(stored.lead_id)
+        .execution_options(yield_per=LOAD_CHUNK)
+    )
+    for rows in result.partitions():
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        yield ids, _decode([r[1] for r in rows], embedder.dim), [r[2] for r in rows]
+
+
+def _apply_changes(db: Session, index: VectorIndex, embedder):
+    """Re-read vectors rewritten since the index last looked (see CHANGE_WINDOW)."""
+    stored = models.LeadEmbedding
+    if index.changed_since is None:
+        # a snapshot without a stamp, or nothing stamped yet: treat what is loaded as current
+        index.changed_since = db.scalar(select(func.max(stored.updated_at)).where(stored.model == embedder.name))
+        return
+    cutoff = index.changed_since - CHANGE_WINDOW
+    index.stamps = {i: at for i, at in index.stamps.items() if at > cutoff}
+    recent = db.execute(
+        select(stored.lead_id, stored.updated_at).where(stored.model == embedder.name, stored.updated_at > cutoff)
+    ).all()
+    changed = [lead_id for lead_id, at in recent if index.stamps.get(lead_id) != at]
+    for i in range(0, len(changed), 1000):
+        for ids, vectors, stamps in _fetch(db, embedder, stored.lead_id.in_(changed[i:i + 1000])):
+            index.replace(ids, vectors)
+            index.note(ids, stamps)
+
+
+def refresh(db: Session, index: VectorIndex, embedder=None):
+    """
+    Bring `index` up to date with lead_embeddings: new ids and rewritten vectors on every
+    call, rows that committed out of id order every RESYNC_SECONDS.
+    """
+    embedder = embedder or embeddings.get_embedder()
+    stored = models.LeadEmbedding
+    with index.sync_lock:
+        for ids, vectors, stamps in _fetch(db, embedder, stored.lead_id > index.max_id):
+            index.add(ids, vectors)
+            index.note(ids, stamps)
+            index.known += len(ids)
+        _apply_changes(db, index, embedder)
+        if time.monotonic() - index.synced_at < RESYNC_SECONDS:
+            return
+        index.synced_at = time.monotonic()
+        upto = (stored.model == embedder.name, stored.lead_id <= index.max_id)
+        count = db.scalar(select(func.count()).select_from(stored).where(*upto))
+        if count != index.known:
+            present = np.fromiter(db.scalars(select(stored.lead_id).where(*upto)), dtype=np.int64)
+            missing = np.setdiff1d(present, index.ids()).tolist()
+            for i in range(0, len(missing), 1000):
+                for ids, vectors, stamps in _fetch(db, embedder, stored.lead_id.in_(missing[i:i + 1000])):
+                    index.add(ids, vectors)
+                    index.note(ids, stamps)
+            index.known = count
+
+
+def load_snapshot(embedder) -> Optional[VectorIndex]:
+    if not INDEX_DIR:
+        return None
+    path = Path(INDEX_DIR)
+    try:
+        meta = json.loads((path / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+    if meta.get("model") != embedder.name:
+        return None  # made by another embedder; the database rows are used instead
+    index = VectorIndex(embedder.dim, np.load(path / "ids.npy", mmap_mode="r"),
+                        np.load(path / "vectors.npy", mmap_mode="r"))
+    if meta.get("changed_since"):
+        index.changed_since = datetime.fromisoformat(meta["changed_since"])
+        index.stamps = {int(i): datetime.fromisoformat(at) for i, at in meta.get("recent", {}).items()}
+    return index
+
+
+def write_snapshot(db: Session, directory: str = INDEX_DIR) -> int:
+    """Write every stored vector to `directory` (ids.npy, vectors.npy, meta.json). Returns the row count."""
+    embedder = embeddings.get_embedder()
+    chunks = list(_fetch(db, embedder))
+    ids = np.concatenate([c[0] for c in chunks]) if chunks else np.empty(0, dtype=np.int64)
+    vectors = np.concatenate([c[1] for c in chunks]) if chunks else np.empty((0, embedder.dim), dtype=np.float32)
+    # the workers' change scan starts here; `recent` keeps it from re-reading the rows just written
+    stamped = [(i, at) for c in chunks for i, at in zip(c[0].tolist(), c[2]) if at is not None]
+    newest = max((at for _, at in stamped), default=None)
+    recent = {i: at.isoformat() for i, at in stamped if at > newest - CHANGE_WINDOW} if newest else {}
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    # replace each file whole: running workers keep their mapping of the old one
+    for name, array in (("ids.npy", ids), ("vectors.npy", vectors)):
+        with open(path / f".{name}.tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path / f".{name}.tmp", path / name)
+    (path / "meta.json").write_text(json.dumps({
+        "model": embedder.name, "count": len(ids),
+        "changed_since": newest.isoformat() if newest is not None else None, "recent": recent,
+    }))
+    return len(ids)
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index(db: Session) -> VectorIndex:
+    """The process-wide index, loaded on first use and refreshed on every call."""
+    global _index
+    embedder = embeddings.get_embedder()
+    with _index_lock:
+        if _index is None:
+            _index = load_snapshot(embedder) or VectorIndex(embedder.dim)
+    refresh(db, _index, embedder)
+    return _index
+
+
+def store(db: Session, leads: Sequence, replace: bool = False) -> np.ndarray:
+    """
+    Embed leads (objects or dicts with an id) and insert their vectors in the caller's transaction.
+    replace=True overwrites the stored vectors of edited leads; the new updated_at makes running
+    indexes swap them in on their next refresh.
+    """
+    embedder = embeddings.get_embedder()
+    now = now_utc()
+    vectors = embeddings.lead_vectors(leads, embedder)
+    ids = [lead["id"] if isinstance(lead, dict) else lead.id for lead in leads]
+    if replace:
+        db.execute(delete(models.LeadEmbedding).where(models.LeadEmbedding.lead_id.in_(ids)))
+    db.execute(insert(models.LeadEmbedding), [
+        {"lead_id": lead_id, "model": embedder.name, "vector": vector.tobytes(), "updated_at": now}
+        for lead_id, vector in zip(ids, vectors)
+    ])
+    return vectors
+
+
+def backfill(db: Session, chunk: int = 5000) -> int:
+    """Embed every lead without a vector from the current embedder, committing per chunk."""
+    embedder = embeddings.get_embedder()
+    stored = models.LeadEmbedding
+    db.execute(delete(stored).where(stored.model != embedder.name))
+    db.commit()
+    lead = models.Lead
+    done, last = 0, 0
+    while True:
+        rows = db.execute(
+            select(lead.id, lead.company, lead.title, lead.notes)
+            .outerjoin(stored, stored.lead_id == lead.id)
+            .where(stored.lead_id.is_(None), lead.id > last)
+            .order_by(lead.id).limit(chunk)
+        ).all()
+        if not rows:
+            return done
+        store(db, rows)
+        db.commit()
+        done += len(rows)
+        last = rows[-1].id
+
+
+SIMILAR_COLUMNS = (
+    models.Lead.id, models.Lead.company, models.Lead.contact_name, models.Lead.title,
+    models.Lead.stage, models.Lead.score,
+)
+
+
+def similar_leads(db: Session, lead: models.Lead, k: int = 10) -> List[Dict]:
+    """The `k` leads closest to `lead` by profile vector, with their cosine similarity."""
+    index = get_index(db)
+    embedder = embeddings.get_embedder()
+    row = db.get(models.LeadEmbedding, lead.id)
+    if row is not None and row.model == embedder.name:
+        query = _decode([row.vector], embedder.dim)
+    else:  # not embedded yet (created before the index existed)
+        query = embeddings.lead_vectors([lead], embedder)
+    ids, scores = index.top_k(query, k + 5)  # a little extra for the lead itself and deleted leads
+    hits = [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != lead.id]
+    found = {r.id: r for r in db.query(*SIMILAR_COLUMNS).filter(models.Lead.id.in_([i for i, _ in hits]))}
+    return [
+        {**found[i]._asdict(), "similarity": round(s, 4)} for i, s in hits if i in found
+    ][:k]
+
+
+def find_duplicates(db: Session, rows: Sequence[Dict]) -> List[Tuple[int, int, float]]:
+    """
+    (position in rows, lead_id, similarity) for rows that look like a stored lead: the
+    DEDUP_CANDIDATES nearest leads by profile are confirmed on company and contact name,
+    both at DEDUP_THRESHOLD or above ("Contoso Inc" / "Jane Doe" vs "Contoso" / "jane doe").
+    """
+    index = get_index(db)
+    if not rows or not len(index):
+        return []
+    embedder = embeddings.get_embedder()
+    ids, _ = index.top_k(embeddings.lead_vectors(rows, embedder), DEDUP_CANDIDATES)
+    wanted = np.unique(ids).tolist()
+    names: Dict[int, Tuple[str, str]] = {}
+    for i in range(0, len(wanted), 1000):
+        query = select(models.Lead.id, models.Lead.company, models.Lead.contact_name)
+        for lead_id, company, contact in db.execute(query.where(models.Lead.id.in_(wanted[i:i + 1000]))):
+            names[lead_id] = (company or "", contact or "")
+    if not names:
+        return []
+    # candidate position per (row, neighbour); -1 = lead deleted since it was indexed
+    known = np.fromiter(names, dtype=np.int64)
+    order = np.argsort(known)
+    slot = np.searchsorted(known, ids, sorter=order).clip(max=len(known) - 1)
+    pos = np.where(known[order[slot]] == ids, order[slot], -1)
+    cand_company = embedder.embed([names[i][0] for i in known.tolist()])
+    cand_contact = embedder.embed([names[i][1] for i in known.tolist()])
+    row_company = embedder.embed([r.get("company") or "" for r in rows])
+    row_contact = embedder.embed([r.get("contact_name") or "" for r in rows])
+    sim = np.minimum(
+        np.einsum("nd,nkd->nk", row_company, cand_company[pos]),
+        np.einsum("nd,nkd->nk", row_contact, cand_contact[pos]),
+    )
+    sim[pos < 0] = -1.0
+    best = sim.argmax(axis=1)
+    best_sim = sim[np.arange(len(rows)), best]
+    return [
+        (n, int(ids[n, best[n]]), round(float(best_sim[n]), 4))
+        for n in np.flatnonzero(best_sim >= DEDUP_THRESHOLD).tolist()
+    ]
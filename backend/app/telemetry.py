@@ -0,0 +1,246 @@
+"""
+Metrics, tracing and logging.
+
+- Prometheus metrics served at GET /metrics: Grok call latency by endpoint/status,
+  retries, token usage, DB statement time, HTTP request time, plus the cache,
+  rate-limiter and qualification-path counters those modules already keep
+  (read at scrape time, nothing extra on the hot path).
+  Under several worker processes (gunicorn.conf.py) PROMETHEUS_MULTIPROC_DIR is set:
+  each worker writes its histograms and counters to files there and a scrape sums
+  them across workers. The scrape-time stats above are per process and carry a
+  `pid` label in that mode.
+- Per-request timing: the middleware in main.py opens a RequestTiming; Grok and DB
+  time spent while serving the request are added to it and returned in a
+  Server-Timing header and the request log line.
+- Optional OpenTelemetry spans around Grok calls and SQL statements, when the
+  opentelemetry API is installed and OTEL_ENABLED=1 (exporters are configured the
+  usual OTel way, e.g. opentelemetry-instrument).
+- Leveled structured logging: LOG_LEVEL, LOG_FORMAT=json|text.
+"""
+
+import contextvars, json, logging, os, sys, time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+try:
+    from opentelemetry import trace as _otel_trace
+    TRACING = os.getenv("OTEL_ENABLED", "0") == "1"
+except ImportError:
+    _otel_trace = None
+    TRACING = False
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# must be set before prometheus_client is first imported (gunicorn.conf.py does it)
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# ---- metrics ----
+
+GROK_LATENCY = Histogram(
+    "grok_request_seconds", "Grok API call latency (one attempt)", ["endpoint", "status"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+GROK_RETRIES = Counter("grok_retries_total", "Grok API attempts that were retried", ["endpoint", "reason"])
+GROK_TOKENS = Counter("grok_tokens_total", "Tokens reported in Grok response usage", ["kind"])
+DB_QUERY = Histogram(
+    "db_query_seconds", "SQL statement execution time", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+HTTP_LATENCY = Histogram(
+    "http_request_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class _StatsCollector:
+    """Exposes counters other modules already keep, read at scrape time."""
+
+    def describe(self):
+        return []  # don't collect at registration (imports those modules)
+
+    def collect(self):
+        for family in self._families():
+            if MULTIPROC_DIR:
+                pid = str(os.getpid())
+                family.samples = [s._replace(labels={**s.labels, "pid": pid}) for s in family.samples]
+            yield family
+
+    def _families(self):
+        from . import cache, coalesce, qualification, ratelimit
+        if cache.ENABLED:
+            stats = cache.get_cache().stats()
+            lookups = CounterMetricFamily("grok_cache_lookups", "Response cache lookups by result", labels=["result"])
+            for result in ("memory_hits", "disk_hits", "misses", "bypassed"):
+                lookups.add_metric([result], stats.get(result, 0))
+            yield lookups
+            yield GaugeMetricFamily("grok_cache_hit_ratio", "Cache hits / cacheable lookups", value=stats.get("hit_rate", 0.0))
+        limiter = ratelimit.get_limiter().stats()
+        yield GaugeMetricFamily("grok_concurrency_limit", "Adaptive in-flight limit", value=limiter["concurrency_limit"])
+        yield GaugeMetricFamily("grok_in_flight", "Grok calls in flight", value=limiter["in_flight"])
+        yield CounterMetricFamily("grok_throttled", "429/503 responses", value=limiter["throttled"])
+        yield CounterMetricFamily("grok_limiter_wait_seconds", "Time spent waiting for quota", value=limiter["waited_s"])
+        joined = CounterMetricFamily("coalesced", "Requests that shared an in-flight identical one", labels=["kind"])
+        for kind, counters in coalesce.stats().items():
+            joined.add_metric([kind], counters.get("joined", 0))
+        yield joined
+        paths = CounterMetricFamily("qualification_parse", "How scoring replies were parsed", labels=["path"])
+        for path, count in qualification.PATHS.items():
+            paths.add_metric([path], count)
+        yield paths
+
+
+_stats = _StatsCollector()
+REGISTRY.register(_stats)
+
+if MULTIPROC_DIR:
+    from prometheus_client import multiprocess
+
+    # every worker's metric files, plus this process's scrape-time stats
+    _scrape_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_scrape_registry)
+    _scrape_registry.register(_stats)
+else:
+    _scrape_registry = REGISTRY
+
+
+def render_metrics():
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(_scrape_registry), CONTENT_TYPE_LATEST
+
+
+def record_tokens(usage: Dict[str, int]):
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            GROK_TOKENS.labels(kind.split("_")[0]).inc(usage[kind])
+
+
+# ---- per-request timing ----
+
+class RequestTiming:
+    def __init__(self):
+        self.grok_s = 0.0
+        self.grok_calls = 0
+        self.db_s = 0.0
+        self.db_queries = 0
+
+    def server_timing(self, total_s: float) -> str:
+        return (f"grok;dur={self.grok_s * 1000:.1f}, db;dur={self.db_s * 1000:.1f}, "
+                f"total;dur={total_s * 1000:.1f}")
+
+
+_timing: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar("request_timing", default=None)
+
+
+def start_request() -> RequestTiming:
+    timing = RequestTiming()
+    _timing.set(timing)
+    return timing
+
+
+# ---- tracing ----
+
+def _tracer():
+    return _otel_trace.get_tracer("grok-sdr") if TRACING else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """An OpenTelemetry span when tracing is on; a no-op otherwise."""
+    tracer = _tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+class GrokCall:
+    status = "error"  # until the caller sets the HTTP status
+
+
+@contextmanager
+def grok_call(endpoint: str):
+    """Time one Grok HTTP attempt: histogram, request timing and span. Set `.status` inside."""
+    call = GrokCall()
+    started = time.perf_counter()
+    with span("grok " + endpoint, **{"http.url.path": endpoint}) as current:
+        try:
+            yield call
+        finally:
+            elapsed = time.perf_counter() - started
+            GROK_LATENCY.labels(endpoint, str(call.status)).observe(elapsed)
+            timing = _timing.get()
+            if timing is not None:
+                timing.grok_s += elapsed
+                timing.grok_calls += 1
+            if current is not None:
+                current.set_attribute("http.response.status_code", str(call.status))
+
+
+def instrument_engine(engine):
+    """Statement timing (metrics, request timing, spans) via SQLAlchemy cursor events."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._telemetry_started = time.perf_counter()
+        tracer = _tracer()
+        if tracer is not None:
+            context._telemetry_span = tracer.start_span(
+                "db " + _operation(statement), attributes={"db.statement": statement[:500]})
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - getattr(context, "_telemetry_started", time.perf_counter())
+        DB_QUERY.labels(_operation(statement)).observe(elapsed)
+        timing = _timing.get()
+        if timing is not None:
+            timing.db_s += elapsed
+            timing.db_queries += 1
+        current = getattr(context, "_telemetry_span", None)
+        if current is not None:
+            current.end()
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA") else "OTHER"
+
+
+# ---- logging ----
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg plus any `extra={"fields": {...}}`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        base = super().format(record)
+        fields = getattr(record, "fields", None)
+        return f"{base} {fields}" if fields else base
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Route the app's loggers to stderr; uvicorn keeps its own handlers."""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else
+                         TextFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger = logging.getLogger("app")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the xAI API, for benchmarks and offline development.
+
+Serves /v1/chat/completions (plain and `stream: true`) and /v1/responses with
+canned but plausible replies: qualification prompts get a JSON score object,
+packed campaign prompts an {"emails": [...]} object, everything else a short email.
+A profile shapes how it misbehaves:
+
+    latency_ms / jitter_ms   per-call delay (normal, clipped at 0)
+    error_rate               share of calls answered 500
+    throttle_rate            share of calls answered 429 with Retry-After
+    malformed_rate           share of 200s whose content isn't the JSON asked for
+                             (campaign replies drop some of their leads instead)
+
+    python -m bench.fake_grok --port 9100 --profile throttled
+    curl -X POST localhost:9100/_profile -d '{"latency_ms": 50}'   # change it live
+    curl localhost:9100/_stats
+
+Point the app at it with XAI_BASE_URL=http://127.0.0.1:9100 XAI_API_KEY=anything.
+"""
+
+import argparse, asyncio, hashlib, json, random, re
+from collections import Counter
+from typing import Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+PROFILES: Dict[str, Dict] = {
+    "fast": {"latency_ms": 5, "jitter_ms": 2},
+    "realistic": {"latency_ms": 600, "jitter_ms": 200},
+    "flaky": {"latency_ms": 300, "jitter_ms": 100, "error_rate": 0.05},
+    "throttled": {"latency_ms": 300, "jitter_ms": 100, "throttle_rate": 0.15, "retry_after_s": 1},
+    "malformed": {"latency_ms": 300, "jitter_ms": 100, "malformed_rate": 0.3},
+}
+DEFAULTS = {"latency_ms": 0.0, "jitter_ms": 0.0, "error_rate": 0.0, "throttle_rate": 0.0,
+            "retry_after_s": 1.0, "malformed_rate": 0.0, "stream_chunk_ms": 10.0}
+
+EMAIL = ("Hi {name}, I noticed {company} is growing its team and thought a quick note might help. "
+         "We help sales teams qualify leads faster with less manual research. "
+         "Would you be open to a 20-minute intro call this week? Best, Alex")
+
+app = FastAPI(title="Fake Grok")
+app.state.profile = dict(DEFAULTS)
+app.state.stats = Counter()
+
+
+def set_profile(name: str = "fast", **overrides) -> Dict:
+    app.state.profile = {**DEFAULTS, **PROFILES[name], **overrides}
+    return app.state.profile
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.blake2b(text.encode(), digest_size=4).hexdigest(), 16)
+
+
+def _wants_json(messages) -> bool:
+    return any("JSON" in str(m.get("content", "")) for m in messages)
+
+
+def _scores(prompt: str) -> Dict:
+    rng = random.Random(_seed(prompt))  # same lead, same scores
+    parts = {k: rng.randint(20, 95) for k in ("industry", "size", "intent", "data_quality")}
+    overall = round(sum(parts.values()) / 4)
+    return {"overall": overall, **parts, "rationale": "Good fit on industry; intent signals are moderate."}
+
+
+_OUTREACH = re.compile(r"email to (.+?) at (.+?) \(")
+_PACKED_LEAD = re.compile(r"^- lead_id (\d+): (.+?) at (.+?) \(", re.MULTILINE)
+
+
+def _email(name: str, company: str) -> str:
+    return EMAIL.format(name=name.split()[0] if name.split() else "there", company=company)
+
+
+def _reply(messages, rng: random.Random) -> str:
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    packed = _PACKED_LEAD.findall(prompt)
+    if packed:
+        if rng.random() < app.state.profile["malformed_rate"]:
+            app.state.stats["malformed"] += 1
+            packed = packed[: max(1, len(packed) * 2 // 3)]
+        return json.dumps({"emails": [{"lead_id": int(i), "email": _email(n, c)} for i, n, c in packed]})
+    if _wants_json(messages):
+        text = json.dumps(_scores(prompt))
+        if rng.random() < app.state.profile["malformed_rate"]:
+            app.state.stats["malformed"] += 1
+            # chatty wrapper half the time (recoverable locally), truncated JSON otherwise (needs repair)
+            return f"Sure! Here is the assessment:\n{text}" if rng.random() < 0.5 else text[: len(text) // 2]
+        return text
+    m = _OUTREACH.search(prompt)
+    return _email(m.group(1), m.group(2)) if m else _email("there", "your team")
+
+
+def _usage(prompt_chars: int, content: str) -> Dict:
+    prompt, completion = prompt_chars // 4, len(content) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+async def _misbehave(rng: random.Random):
+    """Sleep for the profile's latency; maybe return an error response instead of an answer."""
+    p = app.state.profile
+    delay = max(0.0, rng.gauss(p["latency_ms"], p["jitter_ms"])) / 1000
+    roll = rng.random()
+    if roll < p["throttle_rate"]:
+        app.state.stats["throttled"] += 1
+        await asyncio.sleep(min(delay, 0.05))
+        return JSONResponse({"error": "rate limit exceeded"}, status_code=429,
+                            headers={"retry-after": str(p["retry_after_s"])})
+    await asyncio.sleep(delay)
+    if roll < p["throttle_rate"] + p["error_rate"]:
+        app.state.stats["errors"] += 1
+        return JSONResponse({"error": "internal error"}, status_code=500)
+    return None
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.stats["chat"] += 1
+    rng = random.Random()
+    error = await _misbehave(rng)
+    if error is not None:
+        return error
+    messages = body.get("messages", [])
+    content = _reply(messages, rng)
+    usage = _usage(sum(len(str(m.get("content", ""))) for m in messages), content)
+    if body.get("stream"):
+        return StreamingResponse(_stream(content), media_type="text/event-stream")
+    return {
+        "id": f"fake-{rng.getrandbits(32):08x}", "object": "chat.completion", "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+async def _stream(content: str):
+    step = app.state.profile["stream_chunk_ms"] / 1000
+    for word in content.split(" "):
+        chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(step)
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    app.state.stats["responses"] += 1
+    rng = random.Random()
+    error = await _misbehave(rng)
+    if error is not None:
+        return error
+    text = str(body.get("input", ""))
+    content = _reply([{"role": "user", "content": text}], rng)
+    return {"output_text": content, "usage": _usage(len(text), content)}
+
+
+@app.post("/_profile")
+async def update_profile(request: Request):
+    """{"profile": "<name>", ...overrides}; unknown keys are rejected."""
+    body = await request.json()
+    overrides = {k: float(v) for k, v in body.items() if k != "profile"}
+    unknown = set(overrides) - set(DEFAULTS)
+    if unknown or body.get("profile", "fast") not in PROFILES:
+        return PlainTextResponse(f"unknown profile or settings: {sorted(unknown)}", status_code=400)
+    app.state.stats.clear()
+    return set_profile(body.get("profile", "fast"), **overrides)
+
+
+@app.get("/_stats")
+def stats():
+    return {"profile": app.state.profile, **app.state.stats}
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m bench.fake_grok")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    for key in DEFAULTS:
+        parser.add_argument("--" + key.replace("_", "-"), type=float, dest=key)
+    args = parser.parse_args(argv)
+    set_profile(args.profile, **{k: getattr(args, k) for k in DEFAULTS if getattr(args, k) is not None})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
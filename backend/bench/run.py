@@ -0,0 +1,294 @@
+"""
+Benchmark harness: drives scripted workloads against the app and reports RPS and
+latency percentiles per (workload, concurrency).
+
+By default it starts bench.fake_grok and the app (uvicorn, one worker) on free ports
+with a fresh SQLite database, seeds it through POST /leads/import, then runs each
+workload as a closed loop of N concurrent clients for --duration seconds:
+
+    python -m bench.run                                   # every workload at 1, 8, 32
+    python -m bench.run -w score,draft -c 16 --profile realistic
+    python -m bench.run --save bench/baselines/main.json  # record a baseline
+    python -m bench.run --compare bench/baselines/main.json  # exit 1 on a regression
+
+--url benchmarks an app that is already running (it must already point at a fake
+or real Grok); --database-url runs the spawned app on another database.
+A run is a regression when RPS drops or p95 latency rises by more than --tolerance
+(default 20%) against the baseline entry with the same workload, concurrency and profile.
+"""
+
+import argparse, asyncio, csv, io, json, os, platform, random, socket, subprocess, sys, tempfile, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from .fake_grok import PROFILES
+
+BACKEND = Path(__file__).resolve().parents[1]
+WORDS = ("Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay", "Soylent", "Tyrell")
+TITLES = ("CTO", "VP Sales", "Head of Growth", "Founder", "Director of Engineering")
+
+
+# ---- workloads: (client, rng, lead_ids) -> response ----
+
+async def search(client: httpx.AsyncClient, rng: random.Random, ids: List[int]):
+    return await client.get("/", params={"q": rng.choice(WORDS)[:4]})
+
+
+async def lead_detail(client, rng, ids):
+    return await client.get(f"/lead/{rng.choice(ids)}")
+
+
+async def score(client, rng, ids):
+    return await client.post(f"/lead/{rng.choice(ids)}/score", data={})
+
+
+async def draft(client, rng, ids):
+    return await client.post(f"/lead/{rng.choice(ids)}/message", data={"tone": "concise"})
+
+
+async def evals(client, rng, ids):
+    return await client.post("/evals/run", data={"suite": "core", "samples": "1"})
+
+
+WORKLOADS: Dict[str, Callable] = {
+    "search": search, "detail": lead_detail, "score": score, "draft": draft, "evals": evals,
+}
+
+
+# ---- measurement ----
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list (0 for an empty one)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat) + errors,
+        "errors": errors,
+        "rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+        **{f"p{q}_ms": round(percentile(lat, q) * 1000, 1) for q in (50, 90, 95, 99)},
+        "max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+    }
+
+
+async def drive(client: httpx.AsyncClient, workload: Callable, ids: List[int], concurrency: int,
+                duration: float, warmup: float = 1.0) -> Dict:
+    """Closed loop: `concurrency` clients issue requests back to back; warm-up requests aren't counted."""
+    latencies: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def worker(n: int):
+        nonlocal errors
+        rng = random.Random(n)
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            try:
+                resp = await workload(client, rng, ids)
+                ok = resp.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if sent >= measure_from:
+                if ok:
+                    latencies.append(time.perf_counter() - sent)
+                else:
+                    errors += 1
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = max(time.perf_counter(), stop_at) - measure_from
+    return summarize(latencies, errors, elapsed)
+
+
+# ---- processes ----
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+@contextmanager
+def spawn(args: List[str], env: Dict[str, str], ready_url: str):
+    proc = subprocess.Popen([sys.executable, *args], cwd=BACKEND, env={**os.environ, **env})
+    try:
+        wait_ready(ready_url)
+        yield proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def leads_csv(count: int, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["company", "contact_name", "email", "title", "website", "notes"])
+    for i in range(count):
+        company = f"{rng.choice(WORDS)} {rng.choice(('Labs', 'Systems', 'Corp', 'Cloud'))} {i}"
+        writer.writerow([company, f"Contact {i}", f"contact{i}@bench{i % 97}.example.com",
+                         rng.choice(TITLES), f"https://bench{i}.example.com", "Seeded by bench.run"])
+    return buf.getvalue().encode()
+
+
+def seed(base_url: str, count: int) -> List[int]:
+    """Import `count` leads (skipped if already present) and return up to `count` lead ids."""
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        if count:
+            client.post("/leads/import", files={"file": ("leads.csv", leads_csv(count), "text/csv")}).raise_for_status()
+        ids: List[int] = []
+        cursor = None
+        while len(ids) < max(count, 1):
+            page = client.get("/leads", params={"limit": 200, **({"cursor": cursor} if cursor else {})},
+                              headers={"Accept": "application/json"}).json()
+            ids += [item["id"] for item in page["items"]]
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+    if not ids:
+        raise RuntimeError("no leads to benchmark against")
+    return ids[:max(count, 1)]
+
+
+# ---- baselines ----
+
+def key(workload: str, concurrency: int, profile: str) -> str:
+    return f"{workload}@{concurrency}/{profile}"
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regression messages for entries present in both runs."""
+    problems = []
+    for name, now in results.items():
+        was = baseline.get(name)
+        if not was:
+            continue
+        if was["rps"] and now["rps"] < was["rps"] * (1 - tolerance):
+            problems.append(f"{name}: rps {was['rps']} -> {now['rps']}")
+        if was["p95_ms"] and now["p95_ms"] > was["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {was['p95_ms']}ms -> {now['p95_ms']}ms")
+    return problems
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: Dict[str, Dict]):
+    cols = ("requests", "errors", "rps", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms")
+    print(f"{'workload':<28}" + "".join(f"{c:>10}" for c in cols))
+    for name, row in results.items():
+        print(f"{name:<28}" + "".join(f"{row[c]:>10}" for c in cols))
+
+
+# ---- entry point ----
+
+async def run_all(base_url: str, ids: List[int], workloads: List[str], levels: List[int],
+                  duration: float, profile: str) -> Dict[str, Dict]:
+    results = {}
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        for name in workloads:
+            for level in levels:
+                results[key(name, level, profile)] = row = await drive(client, WORKLOADS[name], ids, level, duration)
+                print(f"  {key(name, level, profile)}: {row['rps']} rps, p50 {row['p50_ms']}ms, "
+                      f"p95 {row['p95_ms']}ms, {row['errors']} errors", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run")
+    parser.add_argument("-w", "--workloads", default=",".join(WORKLOADS),
+                        help=f"comma-separated: {', '.join(WORKLOADS)}")
+    parser.add_argument("-c", "--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds per measurement")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast", help="fake Grok behaviour")
+    parser.add_argument("--leads", type=int, default=2000, help="leads to seed")
+    parser.add_argument("--url", help="benchmark this running app instead of spawning one")
+    parser.add_argument("--database-url", help="database for the spawned app (default: fresh SQLite file)")
+    parser.add_argument("--save", type=Path, help="write results as a baseline JSON file")
+    parser.add_argument("--compare", type=Path, help="baseline to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            results = asyncio.run(run_all(base_url, seed(base_url, args.leads), workloads, levels,
+                                          args.duration, args.profile))
+        else:
+            grok_port, app_port = free_port(), free_port()
+            grok_url, base_url = f"http://127.0.0.1:{grok_port}", f"http://127.0.0.1:{app_port}"
+            app_env = {
+                "XAI_BASE_URL": grok_url, "XAI_API_KEY": "bench",
+                "DATABASE_URL": args.database_url or f"sqlite:///{tmp}/bench.db",
+                "GROK_CACHE": "0",  # measure the app and client, not cache hits
+                "XAI_RPM": "1000000", "XAI_TPM": "1000000000", "LOG_LEVEL": "WARNING",
+            }
+            with spawn(["-m", "bench.fake_grok", "--port", str(grok_port), "--profile", args.profile],
+                       {}, f"{grok_url}/_stats"), \
+                 spawn(["-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+                       app_env, f"{base_url}/metrics"):
+                results = asyncio.run(run_all(base_url, seed(base_url, args.leads), workloads, levels,
+                                              args.duration, args.profile))
+
+    print()
+    print_table(results)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"revision": git_revision(), "python": platform.python_version(), "machine": platform.node(),
+                "leads": args.leads, "duration_s": args.duration, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        args.save.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+        print(f"\nbaseline written to {args.save}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["results"]
+        if not set(results) & set(baseline):
+            print(f"\n{args.compare} has no entries for these workloads/concurrency/profile")
+            sys.exit(1)
+        problems = compare(results, baseline, args.tolerance)
+        if problems:
+            print(f"\nregressions against {args.compare} (tolerance {args.tolerance:.0%}):")
+            for line in problems:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nno regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
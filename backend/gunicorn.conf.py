@@ -0,0 +1,53 @@
+"""
+Production server profile: a gunicorn master forking uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master (preload_app) and forked, so workers come up
+with every module already loaded; each worker then runs the app lifespan (logging,
+template compilation) and is serving within milliseconds. Schema changes are not made
+here: run `python -m app.manage init-db` as its own step before rolling out.
+
+On SIGTERM a worker stops accepting connections, finishes in-flight requests, waits
+up to XAI_DRAIN_TIMEOUT for in-flight Grok calls (background jobs included) and exits;
+GRACEFUL_TIMEOUT must stay above that or the master kills it mid-drain.
+
+Prometheus metrics run in multiprocess mode: workers write them to files under
+PROMETHEUS_MULTIPROC_DIR and GET /metrics sums every worker's, so counters don't jump
+between scrapes answered by different workers. The directory's files are cleared
+when the master starts.
+"""
+
+import glob, multiprocessing, os, tempfile
+
+# read before the preload imports app.db; workers never touch the schema
+os.environ.setdefault("DB_AUTO_CREATE", "0")
+# likewise read when prometheus_client is imported, so set before the preload
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "grok-sdr-metrics"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+for _stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(_stale)  # a previous run's counters would be summed into this one's
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))  # a worker silent this long is restarted
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+accesslog = None  # the app logs each request itself (telemetry.py)
+
+
+def post_fork(server, worker):
+    # pooled connections must not be shared across processes; the master opens none,
+    # but drop anything inherited so each worker starts its own pool
+    from app import db
+
+    db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # drop the dead worker's live-gauge files; its counters and histograms keep counting
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,45 @@
+import os
+
+# keep the test run off the developer's grok_cache.db
+os.environ.setdefault("GROK_CACHE_PATH", "")
+
+import pytest
+
+from app import db as database, ratelimit, similarity
+
+# Point at a throwaway server database to run the suite there, e.g.
+# TEST_DATABASE_URL=postgresql+psycopg://postgres@localhost/sdr_test pytest -q
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite://")
+
+
+@pytest.fixture
+def engine():
+    eng = database.make_engine(TEST_DATABASE_URL)
+    database.Base.metadata.drop_all(bind=eng)
+    database.init_db(eng)
+    previous = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=eng)
+    try:
+        yield eng
+    finally:
+        database.SessionLocal.configure(bind=previous)
+        database.Base.metadata.drop_all(bind=eng)
+        eng.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with database.SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    """Each test gets its own Grok limiter so pauses and AIMD state don't leak between tests."""
+    monkeypatch.setattr(ratelimit, "_limiter", None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_similarity_index(monkeypatch):
+    """The lead embedding index is per process; each test's database starts it over."""
+    monkeypatch.setattr(similarity, "_index", None)
@@ -0,0 +1,92 @@
+from fastapi.testclient import TestClient
+
+from app import evals, main, models
+
+LEAD = {"company": "Contoso", "contact_name": "Jane", "email": "jane@contoso.com", "title": "VP Sales"}
+
+
+def test_lead_etag_conditional_get_and_if_match(engine, db):
+    client = TestClient(main.app)
+    created = client.post("/api/leads", json=LEAD)
+    assert created.status_code == 201 and created.headers["Location"] == "/api/leads/1"
+    etag = created.headers["ETag"]
+
+    got = client.get("/api/leads/1")
+    assert got.json()["company"] == "Contoso" and got.headers["ETag"] == etag
+    not_modified = client.get("/api/leads/1", headers={"If-None-Match": f"W/{etag}"})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    patched = client.patch("/api/leads/1", json={"stage": "qualified", "notes": "hiring SDRs"},
+                           headers={"If-Match": etag})
+    assert patched.json()["stage"] == "qualified" and patched.headers["ETag"] != etag
+    assert client.get("/api/leads/1", headers={"If-None-Match": etag}).status_code == 200
+    assert client.patch("/api/leads/1", json={"stage": "lost"}, headers={"If-Match": etag}).status_code == 412
+    # a PATCH that changes nothing keeps the ETag (other clients' If-Match stays valid)
+    same = client.patch("/api/leads/1", json={"stage": "qualified", "company": "Contoso"},
+                        headers={"If-Match": patched.headers["ETag"]})
+    assert same.headers["ETag"] == patched.headers["ETag"]
+    assert [a.type for a in db.query(models.Activity).order_by(models.Activity.id)] == ["created", "stage_change"]
+    assert db.query(models.LeadEmbedding).count() == 1
+
+    assert client.post("/api/leads", json={**LEAD, "email": "nope"}).status_code == 422
+    assert client.get("/api/leads/99").status_code == 404
+
+
+def test_job_polling_gets_304_until_progress(engine, db):
+    db.add(models.Job(kind="score", status="running", total=2))
+    db.commit()
+    client = TestClient(main.app)
+    etag = client.get("/jobs/1").headers["ETag"]
+    assert client.get("/jobs/1", headers={"If-None-Match": etag}).status_code == 304
+    db.get(models.Job, 1).done = 1
+    db.commit()
+    assert client.get("/jobs/1", headers={"If-None-Match": etag}).json()["done"] == 1
+
+
+def test_htmx_forms_get_fragments_and_plain_posts_redirect(engine, db):
+    client = TestClient(main.app)
+    hx = {"HX-Request": "true"}
+    row = client.post("/leads", data=LEAD, headers=hx)
+    assert row.text.count("<tr>") == 1 and "<html" not in row.text
+
+    page = client.get("/lead/1").text
+    reply = client.post("/lead/1/stage", data={"stage": "won"}, headers=hx)
+    assert reply.text.lstrip().startswith('<span id="stage-pill" class="pill">Stage: won</span>')
+    assert 'hx-swap-oob="afterbegin:#activity-list"' in reply.text and "Stage -&gt; won" in reply.text
+    assert len(reply.content) * 10 < len(page)
+    meeting = client.post("/lead/1/meeting", data={"when": "Fri <3pm>"}, headers=hx).text
+    assert "Stage: meeting" in meeting and "Fri &lt;3pm&gt;" in meeting
+
+    plain = client.post("/lead/1/stage", data={"stage": "lost"}, follow_redirects=False)
+    assert plain.status_code == 303 and plain.headers["location"] == "/lead/1"
+
+
+def test_eval_run_renders_the_table_fragment(engine, monkeypatch):
+    async def run_suite(scenarios, concurrency):
+        return [{"scenario": "greeting", "ok": ok, "notes": "pass" if ok else "too <long>", "sample": i,
+                 "latency_ms": 100.0, "prompt_tokens": 10, "completion_tokens": 5}
+                for i, ok in enumerate([True, False])]
+
+    monkeypatch.setattr(evals, "run_suite", run_suite)
+    html = TestClient(main.app).post("/evals/run", data={"suite": "core"}).text
+    assert "Run #1: 1/2 passed" in html
+    assert ">1/2</td>" in html and "too &lt;long&gt;" in html and ">30</td>" in html
+    for bad in ({"concurrency": 0}, {"concurrency": 1000}, {"samples": 10_000}):
+        assert TestClient(main.app).post("/evals/run", data={"suite": "core", **bad}).status_code == 422
+
+
+def test_stream_saves_the_draft_once_and_skips_empty_streams(engine, db, monkeypatch):
+    replies = [["Hi ", "Jane"], []]
+
+    async def achat_stream(messages, temperature=0.3, max_tokens=400):
+        for delta in replies.pop(0):
+            yield delta
+
+    monkeypatch.setattr(main, "achat_stream", achat_stream)
+    client = TestClient(main.app)
+    client.post("/api/leads", json=LEAD)
+    for _ in range(2):
+        body = client.get("/lead/1/message/stream").text
+        assert body.endswith("event: done\ndata: \n\n")
+    assert [m.content for m in db.query(models.Message)] == ["Hi Jane"]
+    assert client.get("/lead/99/message/stream").status_code == 404
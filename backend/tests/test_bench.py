@@ -0,0 +1,46 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from bench import fake_grok, run
+from app.qualification import QUALIFICATION_SCHEMA
+
+
+def _chat(client, content, **extra):
+    return client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": content}], **extra})
+
+
+def test_fake_grok_answers_qualification_with_json_and_outreach_with_text():
+    fake_grok.set_profile("fast", latency_ms=0, jitter_ms=0)
+    client = TestClient(fake_grok.app)
+    reply = _chat(client, "Reply with JSON.\nCompany: Acme", response_format=QUALIFICATION_SCHEMA).json()
+    scores = json.loads(reply["choices"][0]["message"]["content"])
+    assert set(scores) >= {"overall", "industry", "size", "intent", "data_quality", "rationale"}
+    assert reply["usage"]["prompt_tokens"] > 0
+
+    email = _chat(client, "Write a first-touch email to Jane Doe at Acme (CTO).").json()
+    assert "Hi Jane" in email["choices"][0]["message"]["content"]
+
+
+def test_fake_grok_profiles_throttle_and_malform():
+    client = TestClient(fake_grok.app)
+    fake_grok.set_profile("fast", latency_ms=0, jitter_ms=0, throttle_rate=1, retry_after_s=2)
+    resp = _chat(client, "hi")
+    assert resp.status_code == 429 and float(resp.headers["retry-after"]) == 2
+
+    fake_grok.set_profile("fast", latency_ms=0, jitter_ms=0, malformed_rate=1)
+    content = _chat(client, "JSON please").json()["choices"][0]["message"]["content"]
+    with pytest.raises(ValueError):
+        json.loads(content)
+    fake_grok.set_profile("fast")
+
+
+def test_summary_percentiles_and_regression_check():
+    row = run.summarize([i / 1000 for i in range(1, 101)], errors=2, elapsed=10)
+    assert (row["requests"], row["rps"], row["p50_ms"], row["p99_ms"]) == (102, 10.0, 50.0, 99.0)
+
+    baseline = {"search@8/fast": {"rps": 100.0, "p95_ms": 50.0}}
+    assert run.compare({"search@8/fast": {"rps": 90.0, "p95_ms": 55.0}}, baseline, 0.2) == []
+    problems = run.compare({"search@8/fast": {"rps": 70.0, "p95_ms": 80.0}}, baseline, 0.2)
+    assert len(problems) == 2
@@ -0,0 +1,51 @@
+import csv, io, json
+
+from fastapi.testclient import TestClient
+
+from app import bulk, models
+from app.main import app
+
+CSV = (
+    "Company,Contact_Name,Email,Title,Extra\n"
+    "Contoso,Jane,jane@contoso.com,CTO,x\n"
+    "Fabrikam,Bob,not-an-email,,\n"
+    "Contoso,Jane again,jane@contoso.com,,\n"
+    "Initech,Peter,peter@initech.com,,\n"
+)
+
+
+def test_csv_import_validates_dedupes_and_reports_rows(db):
+    db.add(models.Lead(company="Initech", contact_name="Peter", email="peter@initech.com"))
+    db.commit()
+    out = bulk.import_leads(db, io.BytesIO(CSV.encode()), "csv", batch_size=2)
+    assert (out.total, out.inserted, out.duplicates, out.failed) == (4, 1, 2, 1)
+    assert out.errors[0].row == 3 and "email" in out.errors[0].error
+    assert db.query(models.Lead).filter_by(email="jane@contoso.com").one().title == "CTO"
+
+
+def test_jsonl_import_reports_bad_lines(db):
+    body = "\n".join([
+        json.dumps({"company": "A", "contact_name": "a", "email": "a@a.com"}),
+        "{not json",
+        "[1, 2]",
+        "",
+        json.dumps({"company": "B", "contact_name": "b", "email": "b@b.com", "notes": "hi"}),
+    ])
+    out = bulk.import_leads(db, io.BytesIO(body.encode()), "jsonl")
+    assert (out.inserted, out.failed) == (2, 2)
+    assert [e.row for e in out.errors] == [2, 3]
+
+
+def test_import_and_export_endpoints_round_trip(engine):
+    client = TestClient(app)
+    resp = client.post("/leads/import", files={"file": ("leads.csv", CSV, "text/csv")})
+    assert resp.status_code == 200 and resp.json()["inserted"] == 2
+
+    resp = client.get("/leads/export?format=csv")
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert [r["email"] for r in rows] == ["jane@contoso.com", "peter@initech.com"]
+
+    lines = client.get("/leads/export?format=jsonl").text.splitlines()
+    assert json.loads(lines[1])["company"] == "Initech"
+    assert client.get("/leads/export?format=xml").status_code == 400
@@ -0,0 +1,36 @@
+import time
+from app.cache import cache_key, LRUCache, DiskCache, ResponseCache
+
+
+def test_cache_key_is_stable_and_content_addressed():
+    msgs = [{"role": "user", "content": "hi"}]
+    assert cache_key("grok", msgs, 0.0, 300) == cache_key("grok", list(msgs), 0.0, 300)
+    assert cache_key("grok", msgs, 0.0, 300) != cache_key("grok", msgs, 0.0, 200)
+
+
+def test_lru_evicts_least_recently_used_and_expires():
+    lru = LRUCache(max_items=2, ttl=60)
+    lru.set("a", "1"); lru.set("b", "2")
+    lru.get("a")
+    lru.set("c", "3")
+    assert lru.get("b") is None and lru.get("a") == "1"
+    lru.set("d", "4", ttl=-1)
+    assert lru.get("d") is None
+
+
+def test_disk_tier_persists_and_promotes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(LRUCache(), DiskCache(path)).set("k", "v")
+    fresh = ResponseCache(LRUCache(), DiskCache(path))
+    assert fresh.get("k") == "v"
+    assert fresh.get("k") == "v"
+    assert fresh.counters["disk_hits"] == 1 and fresh.counters["memory_hits"] == 1
+
+
+def test_disk_tier_prunes_to_max_items(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.db"), max_items=10)
+    disk.PRUNE_EVERY = 1
+    for i in range(25):
+        disk.set(str(i), "x")
+    assert len(disk) == 10
+    assert disk.get("24") == "x" and disk.get("0") is None
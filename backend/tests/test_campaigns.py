@@ -0,0 +1,47 @@
+import asyncio, json, re
+
+from app import campaigns, jobs, models, schemas
+
+
+def test_split_reply_keeps_only_requested_non_empty_drafts():
+    reply = "Here you go:\n" + json.dumps({"emails": [
+        {"lead_id": 1, "email": " Hi Jane "}, {"lead_id": "2", "email": "Hi Bob"},
+        {"lead_id": 9, "email": "not asked for"}, {"lead_id": 3, "email": ""}, "junk",
+    ]})
+    assert campaigns.split_reply(reply, [1, 2, 3]) == {1: "Hi Jane", 2: "Hi Bob"}
+    assert campaigns.split_reply("no json at all", [1]) == {}
+
+
+def _fake_achat(calls):
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        prompt = messages[-1]["content"]
+        calls.append(response_format)
+        ids = [int(i) for i in re.findall(r"^- lead_id (\d+):", prompt, re.MULTILINE)]
+        if ids:  # packed: "forget" the last lead of each pack
+            return json.dumps({"emails": [{"lead_id": i, "email": f"Hello #{i}"} for i in ids[:-1]]})
+        return "Hello single"
+    return achat
+
+
+def test_campaign_packs_leads_and_bulk_writes_messages(monkeypatch, db):
+    db.add_all([models.Lead(company=f"Co {i}", contact_name=f"Name {i}", email=f"n{i}@co{i}.com",
+                            stage="meeting" if i == 0 else "new")
+                for i in range(7)])
+    db.commit()
+    calls = []
+    monkeypatch.setattr(campaigns, "achat", _fake_achat(calls))
+    req = schemas.CampaignCreate(pack_size=3, concurrency=2)
+    job, lead_ids = jobs.create_job(db, req, kind="campaign")
+
+    asyncio.run(jobs.run_campaign_job(job.id, lead_ids, req))
+
+    db.expire_all()
+    job = db.get(models.Job, job.id)
+    assert (job.status, job.total, job.done, job.failed) == ("done", 7, 7, 0)
+    # packs of 3, 3 and 1: two packed calls, plus one single call per lead they left out (2) and the lone lead
+    assert calls.count(campaigns.CAMPAIGN_SCHEMA) == 2 and calls.count(None) == 3
+    contents = sorted(m.content for m in db.query(models.Message))
+    assert len(contents) == 7 and contents.count("Hello single") == 3
+    # drafting advances new/qualified leads only; a booked meeting stays booked
+    assert [lead.stage for lead in db.query(models.Lead).order_by(models.Lead.id)] == ["meeting"] + ["contacted"] * 6
+    assert db.query(models.Activity).filter_by(type="messaged").count() == 7
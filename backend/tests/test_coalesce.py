@@ -0,0 +1,132 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import coalesce, grok_client, jobs, models, qualification, schemas
+from app.main import app
+
+
+def test_single_flight_shares_one_execution_and_its_errors():
+    flight, runs = coalesce.SingleFlight(), []
+
+    async def work(value):
+        runs.append(value)
+        await asyncio.sleep(0.01)
+        if value == "boom":
+            raise ValueError(value)
+        return value
+
+    async def main():
+        same = await asyncio.gather(*(flight.do("k", lambda: work("x")) for _ in range(3)))
+        errors = await asyncio.gather(*(flight.do("e", lambda: work("boom")) for _ in range(2)),
+                                      return_exceptions=True)
+        again = await flight.do("k", lambda: work("y"))  # finished flights aren't reused
+        return same, errors, again
+
+    same, errors, again = asyncio.run(main())
+    assert [r for r, _ in same] == ["x"] * 3 and [s for _, s in same] == [False, True, True]
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert again == ("y", False) and runs == ["x", "boom", "y"]
+
+
+def test_concurrent_identical_deterministic_grok_calls_go_upstream_once(monkeypatch):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        n = len(requests)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"draft {n}"}}],
+                                         "usage": {"prompt_tokens": 5, "completion_tokens": 2}})
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", httpx.AsyncClient(
+        base_url="http://grok.test", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(grok_client.response_cache, "ENABLED", False)  # coalescing only, no cache hits
+    messages = [{"role": "user", "content": "write an email"}]
+
+    async def main(temperature):
+        return await asyncio.gather(*(grok_client.achat_completion(messages, temperature=temperature)
+                                      for _ in range(3)))
+
+    results = asyncio.run(main(0.0))
+    assert len(requests) == 1
+    assert [r["content"] for r in results] == ["draft 1"] * 3
+    assert sorted(r["coalesced"] for r in results) == [False, True, True]
+    assert sum(r["usage"]["prompt_tokens"] for r in results) == 5  # spend counted once
+
+    # sampled calls (eval samples, drafts) are meant to differ: each one goes upstream
+    samples = asyncio.run(main(0.4))
+    assert len(requests) == 4 and len({r["content"] for r in samples}) == 3
+    assert not any(r["coalesced"] for r in samples)
+    assert [r["usage"]["completion_tokens"] for r in samples] == [2, 2, 2]
+
+
+@pytest.fixture
+def lead_id(db):
+    lead = models.Lead(company="Contoso", contact_name="Jane", email="jane@contoso.com", stage="new")
+    db.add(lead)
+    db.commit()
+    return lead.id
+
+
+def _post(path, times=1):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app.test") as client:
+            return await asyncio.gather(*(client.post(path) for _ in range(times)))
+    return asyncio.run(main())
+
+
+def test_double_click_scores_once(monkeypatch, db, lead_id):
+    calls = []
+
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        calls.append(messages)
+        await asyncio.sleep(0.02)
+        return '{"overall": 80, "industry": 90, "size": 70, "intent": 80, "data_quality": 60}'
+
+    monkeypatch.setattr(qualification, "achat", achat)
+    first, second = _post(f"/lead/{lead_id}/score", times=2)
+    assert first.status_code == second.status_code == 200 and first.text == second.text
+    assert len(calls) == 1
+    assert db.query(models.Activity).filter_by(lead_id=lead_id, type="scored").count() == 1
+
+
+def test_score_keeps_a_stage_set_while_scoring(monkeypatch, db, lead_id):
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        # a rep books a meeting while the model call is in flight
+        db.get(models.Lead, lead_id).stage = "meeting"
+        db.commit()
+        return '{"overall": 90, "industry": 90, "size": 90, "intent": 90, "data_quality": 90}'
+
+    monkeypatch.setattr(qualification, "achat", achat)
+    [resp] = _post(f"/lead/{lead_id}/score")
+    assert "meeting" in resp.text
+    db.expire_all()
+    lead = db.get(models.Lead, lead_id)
+    assert (lead.stage, lead.score, lead.industry_score) == ("meeting", 90, 90)
+
+
+def test_job_batches_keep_later_stages(db, lead_id):
+    db.add(models.Lead(company="Fabrikam", contact_name="Bob", email="bob@fabrikam.com", stage="meeting"))
+    job = models.Job(kind="score", status="running")
+    db.add(job)
+    db.commit()
+    data = {"overall": 90, "industry": 90, "size": 90, "intent": 90, "data_quality": 90}
+    upd = qualification.score_update(data, schemas.ScoreWeights())
+    jobs._write_batch(job.id, [(lead_id, data, upd), (lead_id + 1, data, upd)], [])
+    db.expire_all()
+    assert [(l.stage, l.score) for l in db.query(models.Lead).order_by(models.Lead.id)] == [
+        ("qualified", 90), ("meeting", 90)]
+
+
+def test_failed_score_logs_the_failure(monkeypatch, db, lead_id):
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        return "no idea, sorry"
+
+    monkeypatch.setattr(qualification, "achat", achat)
+    [resp] = _post(f"/lead/{lead_id}/score")
+    assert resp.status_code == 502
+    assert db.query(models.Activity).filter_by(lead_id=lead_id, type="scored").count() == 1
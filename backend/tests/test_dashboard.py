@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, update
+
+from app import dashboard, db as database, models
+from app.main import app
+
+
+def _counters(db):
+    return sorted(db.query(models.PipelineStat.metric, models.PipelineStat.bucket, models.PipelineStat.count)
+                  .filter(models.PipelineStat.count != 0).all())
+
+
+def test_triggers_track_every_write_path(engine, db):
+    db.add(models.Lead(company="A", contact_name="a", email="a@a.com"))
+    db.execute(insert(models.Lead), [
+        {"company": f"B{i}", "contact_name": "b", "email": f"b{i}@b.com", "score": 10.0 * i, "stage": "new"}
+        for i in range(11)
+    ])
+    db.commit()
+    db.execute(update(models.Lead).where(models.Lead.score >= 60).values(stage="qualified"))
+    db.get(models.Lead, 1).stage = "meeting"
+    db.get(models.Lead, 2).score = 95.5
+    db.execute(delete(models.Lead).where(models.Lead.company == "B10"))
+    db.add_all([models.Activity(lead_id=1, type="note", detail="x"),
+                models.Activity(lead_id=2, type="note", detail="y",
+                                created_at=database.now_utc() - timedelta(days=2))])
+    db.commit()
+
+    maintained = _counters(db)
+    dashboard.rebuild_stats(engine)
+    db.expire_all()
+    assert _counters(db) == maintained  # incremental == full recount
+
+    out = dashboard.summary(db, days=3)
+    assert out["total_leads"] == 11
+    assert [s["stage"] for s in out["stages"]] == ["new", "qualified", "meeting"]
+    assert [s["count"] for s in out["stages"]] == [6, 4, 1]
+    assert out["scores"][0] == {"bucket": "0-9", "count": 2}  # A scores 0.0 by default
+    assert out["scores"][-1] == {"bucket": "90-100", "count": 2}
+    assert [d["count"] for d in out["activity_per_day"]] == [1, 0, 1]
+
+
+def test_dashboard_endpoint(engine, db):
+    db.add(models.Lead(company="A", contact_name="a", email="a@a.com"))
+    db.commit()
+    body = TestClient(app).get("/dashboard?days=7").json()
+    assert body["total_leads"] == 1 and len(body["activity_per_day"]) == 7
@@ -0,0 +1,24 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app import db as database
+
+
+def test_server_engine_uses_configured_pool():
+    eng = database.make_engine("postgresql+psycopg://u:p@db.invalid/sdr", pool_size=3, max_overflow=4)
+    assert isinstance(eng.pool, QueuePool)
+    assert eng.pool.size() == 3 and eng.pool._max_overflow == 4
+    assert eng.pool._pre_ping is database.DB_POOL_PRE_PING
+
+
+def test_sqlite_file_engine_runs_in_wal_mode(tmp_path):
+    eng = database.make_engine(f"sqlite:///{tmp_path / 'sdr.db'}")
+    with eng.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert isinstance(database.make_engine("sqlite://").pool, StaticPool)
+
+
+def test_init_db_is_idempotent(engine):
+    database.init_db(engine)
+    tables = set(inspect(engine).get_table_names())
+    assert {"leads", "messages", "activities", "jobs"} <= tables
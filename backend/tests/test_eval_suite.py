@@ -0,0 +1,27 @@
+import asyncio
+
+from app import evals
+from app.schemas import EvalScenario
+
+
+def test_check_output_combines_basic_eval_and_registered_checks():
+    sc = EvalScenario(name="p", prompt="x", must_include="Jane", checks=["no_placeholders"])
+    assert evals.check_output("Hi Jane", sc) == {"ok": True, "notes": "pass"}
+    res = evals.check_output("Hi [[FILL]]", sc)
+    assert not res["ok"] and "missing 'Jane'" in res["notes"] and "placeholder" in res["notes"]
+
+
+def test_run_suite_runs_samples_concurrently_and_summarizes():
+    async def complete(messages, temperature, max_tokens):
+        await asyncio.sleep(0.05)
+        return {"content": "Hi Jane", "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+    scenarios = [EvalScenario(name=f"s{i}", prompt="x", must_include="Jane", samples=5) for i in range(20)]
+    results = asyncio.run(evals.run_suite(scenarios, concurrency=100, complete=complete))
+    assert len(results) == 100 and all(r["ok"] for r in results)
+    summary = evals.summarize(results)
+    assert summary[0].samples == 5 and summary[0].completion_tokens == 25 and summary[0].p95_ms >= 50
+
+
+def test_default_registry_loads():
+    assert "core" in evals.load_registry()
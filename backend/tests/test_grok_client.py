@@ -0,0 +1,130 @@
+import asyncio, threading
+import httpx
+from app import grok_client
+from app.cache import ResponseCache, LRUCache
+
+
+def _mock_client(handler):
+    return httpx.AsyncClient(base_url="http://grok.test", transport=httpx.MockTransport(handler))
+
+
+def test_achat_retries_then_returns_content(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, text="slow down")
+        return httpx.Response(200, json={"choices": [{"message": {"content": "hi Jane"}}]})
+
+    async def no_sleep(_):
+        return None
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", _mock_client(handler))
+    monkeypatch.setattr(grok_client.response_cache, "_cache", ResponseCache(LRUCache()))
+    monkeypatch.setattr(grok_client.asyncio, "sleep", no_sleep)
+
+    out = asyncio.run(grok_client.achat([{"role": "user", "content": "hello"}]))
+    assert out == "hi Jane"
+    assert len(calls) == 2
+
+
+def test_achat_serves_deterministic_calls_from_cache(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})
+
+    cache = ResponseCache(LRUCache())
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", _mock_client(handler))
+    monkeypatch.setattr(grok_client.response_cache, "_cache", cache)
+
+    msgs = [{"role": "user", "content": "score this"}]
+    for _ in range(2):
+        assert asyncio.run(grok_client.achat(msgs, temperature=0.0)) == "{}"
+    asyncio.run(grok_client.achat(msgs, temperature=0.7))
+    assert len(calls) == 2
+    assert cache.counters["memory_hits"] == 1
+    assert cache.counters["bypassed"] == 1
+
+
+def test_achat_reads_and_writes_the_cache_off_the_event_loop(monkeypatch):
+    threads = []
+
+    class RecordingCache(ResponseCache):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+        def set(self, key, value):
+            threads.append(threading.current_thread())
+            super().set(key, value)
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", _mock_client(
+        lambda request: httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})))
+    monkeypatch.setattr(grok_client.response_cache, "_cache", RecordingCache(LRUCache()))
+
+    asyncio.run(grok_client.achat([{"role": "user", "content": "score this"}], temperature=0.0))
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+
+def test_achat_stream_yields_deltas_until_done(monkeypatch):
+    def handler(request):
+        chunks = ["Hi ", "Jane", ""]
+        body = "".join(
+            'data: {"choices":[{"delta":{"content":"%s"}}]}\n\n' % c for c in chunks
+        ) + "data: [DONE]\n\n"
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", _mock_client(handler))
+
+    async def collect():
+        return [d async for d in grok_client.achat_stream([{"role": "user", "content": "hello"}])]
+
+    assert asyncio.run(collect()) == ["Hi ", "Jane"]
+
+
+def test_arespond_retries_a_throttle_and_feeds_the_governor(monkeypatch):
+    calls, observed = [], []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after": "0"}, text="slow down")
+        return httpx.Response(200, json={"output_text": '{"overall": 70}',
+                                         "usage": {"input_tokens": 12, "output_tokens": 5}})
+
+    async def no_sleep(_):
+        return None
+
+    real_slot = grok_client.ratelimit.get_limiter().slot
+
+    def slot(estimate):
+        cm = real_slot(estimate)
+
+        class Spy:
+            async def __aenter__(self):
+                ticket = await cm.__aenter__()
+                observe, usage = ticket.observe, ticket.usage
+                ticket.observe = lambda status, headers: (observed.append(status), observe(status, headers))
+                ticket.usage = lambda n: (observed.append(("usage", n)), usage(n))
+                return ticket
+
+            async def __aexit__(self, *exc):
+                observed.append("released")
+                return await cm.__aexit__(*exc)
+        return Spy()
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", _mock_client(handler))
+    monkeypatch.setattr(grok_client.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(grok_client.ratelimit.get_limiter(), "slot", slot)
+
+    assert asyncio.run(grok_client.arespond("score this", temperature=0.0)) == '{"overall": 70}'
+    assert [c.url.path for c in calls] == ["/v1/responses"] * 2
+    assert observed == [429, "released", 200, ("usage", 17), "released"]
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app.db import now_utc
+from app import models, pagination
+
+
+def test_keyset_pages_cover_every_lead_once_with_ties(db):
+    t = now_utc()
+    # three leads share each updated_at, so the id tiebreak matters
+    db.execute(insert(models.Lead), [
+        {"company": f"c{i}", "contact_name": "n", "email": "e", "updated_at": t - timedelta(seconds=i // 3)}
+        for i in range(20)
+    ])
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = pagination.lead_page(db, cursor, limit=7)
+        seen += [r.id for r in rows]
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(1, 21)) and len(seen) == 20
+
+
+def test_bad_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        pagination.decode_cursor("not-a-cursor")
+
+
+def test_history_page_is_per_lead_and_newest_first(db):
+    t = now_utc()
+    db.add_all([models.Lead(company=c, contact_name="n", email="e") for c in ("a", "b")])
+    db.flush()
+    db.execute(insert(models.Activity), [
+        {"lead_id": 1 + i % 2, "type": "t", "detail": str(i), "created_at": t + timedelta(seconds=i)}
+        for i in range(30)
+    ])
+    db.commit()
+    rows, cursor = pagination.history_page(db, models.Activity, 1, limit=10)
+    assert [r.detail for r in rows] == [str(i) for i in range(28, 8, -2)]
+    rows, cursor = pagination.history_page(db, models.Activity, 1, cursor, limit=10)
+    assert [r.detail for r in rows] == ["8", "6", "4", "2", "0"] and cursor is None
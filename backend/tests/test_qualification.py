@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import campaigns, qualification
+from app.grok_client import GrokAPIError
+
+LEAD = SimpleNamespace(company="Contoso", contact_name="Jane", title="CTO", website=None, notes=None)
+
+
+def test_extract_json_recovers_fenced_and_prefixed_objects():
+    fenced = 'Sure!\n```json\n{"overall": 70, "rationale": "uses {dbt}",}\n```'
+    assert qualification.extract_json(fenced) == {"overall": 70, "rationale": "uses {dbt}"}
+    prefixed = 'Note {"x": 1} then the answer: {"overall": 5, "industry": 3}.'
+    assert qualification.extract_json(prefixed) == {"overall": 5, "industry": 3}
+    assert qualification.extract_json("I can't score this lead.") is None
+    assert qualification.extract_json('Sorry: {"error": "no data", "lead": {"name": "Jane"}}') is None
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    monkeypatch.setattr(qualification, "PATHS", qualification.Counter())
+    monkeypatch.setattr(qualification, "STRUCTURED_OUTPUT", True)
+    return []
+
+
+def _fake_achat(calls, *replies):
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        calls.append(response_format)
+        reply = replies[len(calls) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+    return achat
+
+
+def test_structured_reply_parses_in_one_call(monkeypatch, calls):
+    monkeypatch.setattr(qualification, "achat", _fake_achat(calls, '{"overall": 80, "industry": 90}'))
+    assert asyncio.run(qualification.qualify(LEAD))["overall"] == 80
+    assert calls == [qualification.QUALIFICATION_SCHEMA]
+    assert qualification.PATHS == {"structured": 1}
+
+
+def test_chatty_reply_is_extracted_without_repair_call(monkeypatch, calls):
+    monkeypatch.setattr(qualification, "achat", _fake_achat(calls, 'Here you go: {"overall": 40}'))
+    assert asyncio.run(qualification.qualify(LEAD)) == {"overall": 40}
+    assert len(calls) == 1 and qualification.PATHS == {"extracted": 1}
+
+
+def test_rejected_response_format_falls_back_to_plain_prompt(monkeypatch, calls):
+    monkeypatch.setattr(qualification, "achat", _fake_achat(
+        calls, GrokAPIError(400, "response_format not supported"), "nope", '{"overall": 10}'))
+    assert asyncio.run(qualification.qualify(LEAD)) == {"overall": 10}
+    assert calls == [qualification.QUALIFICATION_SCHEMA, None, None]
+    assert qualification.STRUCTURED_OUTPUT is False
+    assert qualification.path_stats()["repair"] == 1
+
+
+def test_other_bad_requests_raise_and_keep_structured_output(monkeypatch, calls):
+    monkeypatch.setattr(qualification, "achat", _fake_achat(calls, GrokAPIError(400, "prompt too long")))
+    with pytest.raises(GrokAPIError):
+        asyncio.run(qualification.qualify(LEAD))
+    assert qualification.STRUCTURED_OUTPUT is True
+
+
+def test_campaign_packs_share_the_qualification_flag(monkeypatch, calls):
+    monkeypatch.setattr(campaigns, "achat", _fake_achat(
+        calls, GrokAPIError(422, "unknown field: response_format"), "plain", "plain again"))
+    for _ in range(2):
+        assert asyncio.run(campaigns._ask_pack([], 300)).startswith("plain")
+    assert calls == [campaigns.CAMPAIGN_SCHEMA, None, None]
+    assert qualification.STRUCTURED_OUTPUT is False
+
+
+def test_component_parts_rejects_non_numeric_scores():
+    assert qualification.component_parts({"industry": "80", "size": 3}) == {
+        "industry": 80.0, "size": 3.0, "intent": 0.0, "data_quality": 0.0}
+    for bad in ({"industry": "high"}, {"size": None}, {"intent": [1]}, {"data_quality": "nan"}):
+        with pytest.raises(qualification.QualificationError):
+            qualification.component_parts(bad)
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+
+from app import grok_client, ratelimit
+
+
+def test_parse_rate_limit_durations():
+    assert ratelimit.parse_duration("6m0s") == 360
+    assert ratelimit.parse_duration("250ms") == 0.25
+    assert ratelimit.parse_duration("2") == 2
+    assert ratelimit.retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert ratelimit.retry_after({}) is None
+
+
+def test_token_bucket_queues_callers_once_empty():
+    bucket = ratelimit.TokenBucket(per_minute=60)  # 1/s, burst of 60
+    assert bucket.reserve(60) == 0
+    assert 0.9 < bucket.reserve(1) <= 1.0
+    assert 1.9 < bucket.reserve(1) <= 2.0
+
+
+def test_aimd_grows_only_when_saturated_and_halves_once_per_burst_of_429s():
+    gov = ratelimit.AIMDGovernor(start=8, minimum=1, maximum=64)
+
+    async def cycle(n, **outcome):
+        for _ in range(n):
+            await gov.acquire()
+        for _ in range(n):
+            gov.release(**outcome)
+
+    asyncio.run(cycle(2, ok=True))
+    assert gov.limit == 8  # headroom left: no evidence more would help
+    asyncio.run(cycle(8, ok=True))
+    assert gov.limit == 8 + 1 / 8
+    asyncio.run(cycle(5, congested=True))
+    assert gov.limit == (8 + 1 / 8) / 2 and gov.in_flight == 0
+
+
+def test_429_retry_after_pauses_every_caller(monkeypatch):
+    calls, sleeps = [], []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after": "3"}, text="slow down")
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}],
+                                         "usage": {"prompt_tokens": 5, "completion_tokens": 2}})
+
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        ratelimit.get_limiter()._paused_until -= seconds  # as if the time had passed
+        await real_sleep(0)
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", httpx.AsyncClient(
+        base_url="http://grok.test", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(grok_client.asyncio, "sleep", fake_sleep)
+
+    out = asyncio.run(grok_client.achat([{"role": "user", "content": "hi"}]))
+    stats = ratelimit.get_limiter().stats()
+    assert out == "ok" and len(calls) == 2
+    assert sleeps and sleeps[0] >= 3  # Retry-After honoured, not the default backoff
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+    assert stats["concurrency_limit"] < ratelimit.CONCURRENCY_START
@@ -0,0 +1,40 @@
+from app import models, rescore, schemas
+
+
+def test_rescore_all_reweights_from_stored_components(db):
+    db.add_all([
+        # strong intent, weak industry fit
+        models.Lead(company="a", contact_name="n", email="e", stage="new", score=40,
+                    industry_score=20, size_score=50, intent_score=100, data_quality_score=50),
+        models.Lead(company="b", contact_name="n", email="e", stage="meeting", score=40,
+                    industry_score=20, size_score=50, intent_score=100, data_quality_score=50),
+        models.Lead(company="c", contact_name="n", email="e", stage="new", score=0),  # never scored
+    ])
+    db.commit()
+
+    intent_only = schemas.ScoreWeights(industry_fit=0, size_fit=0, intent_signals=1, data_quality=0)
+    out = rescore.rescore_all(db, intent_only, chunk_size=1)
+    assert (out["total"], out["changed"], out["promoted"]) == (2, 2, 1)
+
+    db.expire_all()
+    leads = {l.company: l for l in db.query(models.Lead)}
+    assert (leads["a"].score, leads["a"].stage) == (100, "qualified")
+    assert (leads["b"].score, leads["b"].stage) == (100, "meeting")  # later stages kept
+    assert leads["c"].score == 0
+    assert db.get(models.Job, out["job_id"]).kind == "rescore"
+
+
+def test_backfill_reads_components_from_latest_scored_activity(db):
+    lead = models.Lead(company="a", contact_name="n", email="e")
+    db.add(lead)
+    db.flush()
+    db.add_all([
+        models.Activity(lead_id=lead.id, type="scored", detail="Parts={'industry': 1.0, 'size': 1.0, "
+                        "'intent': 1.0, 'data_quality': 1.0} -> weighted=1.0. Rationale: old"),
+        models.Activity(lead_id=lead.id, type="scored", detail="Parts={'industry': 80.0, 'size': 60.0, "
+                        "'intent': 70.0, 'data_quality': 90.0} -> weighted=74.0. Rationale: x"),
+    ])
+    db.commit()
+    assert rescore.backfill_components(db) == 1
+    db.expire_all()
+    assert (lead.industry_score, lead.data_quality_score) == (80.0, 90.0)
@@ -5,3 +5,16 @@ def test_weights_normalize():
     w = SimpleNamespace(industry_fit=1, size_fit=0, intent_signals=0, data_quality=0)
     parts = {"industry":50}
     assert weighted_score(parts, w) == 50.0
+
+
+def test_batch_scores_match_single_lead_scores():
+    import numpy as np
+    from app.scoring import weighted_scores, restage
+    w = SimpleNamespace(industry_fit=0.4, size_fit=0.2, intent_signals=0.3, data_quality=0.1)
+    rng = np.random.default_rng(0)
+    comps = rng.integers(0, 101, size=(500, 4)).astype(float)
+    expected = [weighted_score(dict(zip(("industry", "size", "intent", "data_quality"), row)), w) for row in comps]
+    assert weighted_scores(comps, w).tolist() == expected
+
+    stages = np.array(["new", "qualified", "meeting", "new"], dtype=object)
+    assert restage(np.array([70, 10, 10, 59.99]), stages).tolist() == ["qualified", "new", "meeting", "new"]
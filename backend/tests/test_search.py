@@ -0,0 +1,27 @@
+import pytest
+
+from app import models, search
+
+
+def test_fts_query_prefix_terms():
+    assert search.fts_query("conto jan") == '"conto"* "jan"*'
+    assert search.fts_query("  !! ") is None
+    assert search.pg_tsquery("conto jan") == "conto:* & jan:*"
+
+
+def test_search_ranks_prefix_matches_and_tracks_updates(db):
+    if search.detect_mode(db.get_bind()) == search.ILIKE:
+        pytest.skip("no full-text index on this database")
+    db.add_all([
+        models.Lead(company="Contoso", contact_name="Jane", email="j@c.com", notes="uses snowflake"),
+        models.Lead(company="Fabrikam", contact_name="Bob", email="b@f.com", notes="talked to contoso"),
+    ])
+    db.commit()
+    names = [l.company for l in search.search_leads(db, "conto")]
+    assert names == ["Contoso", "Fabrikam"]  # company match outranks a notes match
+
+    lead = db.query(models.Lead).filter_by(company="Fabrikam").one()
+    lead.notes = "no mention"
+    db.commit()
+    assert [l.company for l in search.search_leads(db, "conto")] == ["Contoso"]
+    assert search.filter_matching(db.query(models.Lead), "snow").count() == 1
@@ -0,0 +1,96 @@
+import io, json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import embeddings, models, similarity
+from app.main import app
+
+
+def test_hashing_embedder_ignores_legal_forms_and_tolerates_typos():
+    e = embeddings.HashingEmbedder(dim=256)
+    a, b, typo, other = e.embed(["Contoso, Inc.", "contoso", "Contosso", "Fabrikam Ltd"])
+    assert embeddings.normalize("Contoso, Inc.") == "contoso"
+    assert np.isclose(a @ b, 1.0)
+    assert a @ typo > 0.5 > a @ other
+    assert np.allclose(e.embed(["Contoso"]), embeddings.HashingEmbedder(dim=256).embed(["Contoso"]))
+
+
+def _create(client, company, name, email, title="", notes=""):
+    client.post("/leads", data={"company": company, "contact_name": name, "email": email,
+                                "title": title, "notes": notes}, follow_redirects=False)
+
+
+def test_similar_leads_rank_lookalikes_first(engine, db):
+    client = TestClient(app)
+    _create(client, "Contoso", "Jane", "jane@contoso.com", "VP Sales", "B2B SaaS, hiring SDRs")
+    _create(client, "Contoso Inc", "Bob", "bob@contoso.com", "Head of Sales", "SaaS")
+    _create(client, "Northwind Traders", "Ann", "ann@northwind.com", "Buyer", "wholesale food")
+    assert db.query(models.LeadEmbedding).count() == 3
+
+    similar = client.get("/lead/1/similar?k=2").json()
+    assert [s["company"] for s in similar] == ["Contoso Inc", "Northwind Traders"]
+    assert similar[0]["similarity"] > similar[1]["similarity"]
+    assert client.get("/lead/999/similar").status_code == 404
+
+
+def test_import_stores_vectors_and_reports_near_duplicates(engine, db):
+    client = TestClient(app)
+    _create(client, "Contoso", "Jane Doe", "jane@contoso.com")
+    rows = [
+        {"company": "Contoso Inc.", "contact_name": "jane doe", "email": "jdoe@contoso.io"},
+        {"company": "Contoso", "contact_name": "Bob Smith", "email": "bob@contoso.com"},
+    ]
+    body = "\n".join(json.dumps(r) for r in rows).encode()
+    out = client.post("/leads/import?format=jsonl&dedup=true",
+                      files={"file": ("leads.jsonl", io.BytesIO(body))}).json()
+    assert out["inserted"] == 2
+    assert out["possible_duplicates"] == [{"row": 1, "lead_id": 1, "similarity": 1.0}]
+    assert db.query(models.LeadEmbedding).count() == 3
+
+
+def test_index_catches_rows_committed_out_of_order_and_loads_snapshots(engine, db, monkeypatch, tmp_path):
+    leads = [models.Lead(company=f"Company {i}", contact_name="n", email=f"n{i}@x.com") for i in range(4)]
+    db.add_all(leads)
+    db.flush()
+    similarity.store(db, leads[1:])
+    db.commit()
+    index = similarity.get_index(db)
+    assert sorted(index.ids().tolist()) == [2, 3, 4]
+
+    similarity.store(db, leads[:1])  # id 1 lands after the index has seen id 4
+    db.commit()
+    monkeypatch.setattr(similarity, "RESYNC_SECONDS", 0)
+    assert sorted(similarity.get_index(db).ids().tolist()) == [1, 2, 3, 4]
+
+    assert similarity.write_snapshot(db, str(tmp_path)) == 4
+    monkeypatch.setattr(similarity, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(similarity, "_index", None)
+    index = similarity.get_index(db)
+    assert isinstance(index.base_vectors, np.memmap) and len(index) == 4
+    ids, scores = index.top_k(embeddings.lead_vectors(leads[2:3]), 1)
+    assert ids[0, 0] == leads[2].id and np.isclose(scores[0, 0], 1.0)
+
+
+def test_running_indexes_swap_in_rewritten_vectors(engine, db, monkeypatch, tmp_path):
+    leads = [models.Lead(company=c, contact_name="n", email=f"{c}@x.com") for c in ("Contoso", "Fabrikam")]
+    db.add_all(leads)
+    db.flush()
+    similarity.store(db, leads)
+    db.commit()
+    assert similarity.write_snapshot(db, str(tmp_path)) == 2
+    monkeypatch.setattr(similarity, "INDEX_DIR", str(tmp_path))
+    index = similarity.get_index(db)  # memory-mapped base, as in another worker
+    assert len(index._dead) == 0
+
+    leads[0].company = "Northwind Traders"
+    similarity.store(db, leads[:1], replace=True)  # what PATCH /api/leads/{id} does
+    db.commit()
+    index = similarity.get_index(db)
+    assert len(index) == 2 and sorted(index.ids().tolist()) == [1, 2]
+    ids, scores = index.top_k(embeddings.lead_vectors(leads), 2)
+    assert ids[0].tolist() == [1, 2] and np.isclose(scores[0, 0], 1.0)
+    assert ids[1, 0] == 2 and np.isclose(scores[1, 0], 1.0)
+
+    similarity.get_index(db)  # nothing new: the rewritten row is not read again
+    assert len(index._dead) == 1 and len(index) == 2
@@ -0,0 +1,94 @@
+import asyncio, subprocess, sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app import campaigns, grok_client, jobs, main, models, schemas
+
+
+def test_import_leaves_heavy_optional_modules_unloaded():
+    code = "import sys, app.main; print(sorted({'numpy', 'requests', 'dotenv'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parents[1],
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_templates_compile_and_healthz(engine):
+    assert main.compile_templates() == len(list((main.TEMPLATE_DIR).glob("*.html")))
+    assert TestClient(main.app).get("/healthz").json() == {"status": "ok"}
+
+
+def test_drain_waits_for_in_flight_calls():
+    async def call():
+        with grok_client._tracked():
+            await asyncio.sleep(0.05)
+
+    async def run(timeout):
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        left = await grok_client.drain(timeout)
+        await task
+        return left
+
+    assert asyncio.run(run(1.0)) == 0
+    assert asyncio.run(run(0.0)) == 1
+
+
+def test_shutdown_writes_in_flight_leads_and_interrupts_the_job(monkeypatch, db):
+    db.add_all([models.Lead(company=f"Co {i}", contact_name="n", email=f"n{i}@co.com") for i in range(10)])
+    db.commit()
+
+    started = []
+
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        started.append(messages)
+        await asyncio.sleep(0.05)
+        return "Hello"
+
+    monkeypatch.setattr(campaigns, "achat", achat)
+    req = schemas.CampaignCreate(pack_size=1, concurrency=2, rate_per_minute=60000)
+    job, lead_ids = jobs.create_job(db, req, kind="campaign")
+
+    async def run():
+        jobs.start(jobs.run_campaign_job(job.id, lead_ids, req))
+        while len(started) < 2:  # two drafts in flight
+            await asyncio.sleep(0.001)
+        return await jobs.shutdown(timeout=5)
+
+    assert asyncio.run(run()) == 0
+    db.expire_all()
+    job = db.get(models.Job, job.id)
+    assert (job.status, job.done) == ("interrupted", 2)
+    assert db.query(models.Message).count() == 2
+    assert jobs._stopping is False
+
+
+def test_shutdown_cancels_jobs_that_outlive_the_drain(monkeypatch, db):
+    db.add_all([models.Lead(company=f"Co {i}", contact_name="n", email=f"n{i}@co.com") for i in range(3)])
+    db.commit()
+
+    async def achat(messages, temperature=0.3, max_tokens=400, cache=None, response_format=None):
+        await asyncio.sleep(60)  # a call that never comes back in time
+
+    monkeypatch.setattr(campaigns, "achat", achat)
+    req = schemas.CampaignCreate(pack_size=1, concurrency=1, rate_per_minute=60000)
+    job, lead_ids = jobs.create_job(db, req, kind="campaign")
+
+    async def run():
+        jobs.start(jobs.run_campaign_job(job.id, lead_ids, req))
+        await asyncio.sleep(0.01)
+        return await jobs.shutdown(timeout=0.05)
+
+    assert asyncio.run(run()) == 1
+    db.expire_all()
+    assert db.get(models.Job, job.id).status == "interrupted"
+    assert jobs._stopping is False and not jobs._tasks
+
+
+def test_a_short_count_without_shutdown_is_not_reported_as_interrupted(db):
+    job = models.Job(kind="score", status="running", total=3)
+    db.add(job)
+    db.commit()
+    asyncio.run(jobs._finish(job.id, jobs._BatchWriter(job.id), total=3))
+    db.expire_all()
+    assert db.get(models.Job, job.id).status == "done"
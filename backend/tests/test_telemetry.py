@@ -0,0 +1,83 @@
+import asyncio, json, logging, os, subprocess, sys
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app import grok_client, ratelimit, telemetry
+from app.main import app
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_grok_latency_retries_and_tokens_are_recorded(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, text="busy")
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}],
+                                         "usage": {"prompt_tokens": 7, "completion_tokens": 3}})
+
+    async def no_sleep(seconds):
+        ratelimit.get_limiter()._paused_until = 0
+
+    monkeypatch.setattr(grok_client, "XAI_API_KEY", "test")
+    monkeypatch.setattr(grok_client, "_client", httpx.AsyncClient(
+        base_url="http://grok.test", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(grok_client.asyncio, "sleep", no_sleep)
+    before = {
+        "ok": _sample("grok_request_seconds_count", endpoint="chat", status="200"),
+        "busy": _sample("grok_request_seconds_count", endpoint="chat", status="503"),
+        "retry": _sample("grok_retries_total", endpoint="chat", reason="503"),
+        "prompt": _sample("grok_tokens_total", kind="prompt"),
+    }
+
+    timing = telemetry.start_request()
+    assert asyncio.run(grok_client.achat([{"role": "user", "content": "hi"}], cache=False)) == "ok"
+
+    assert _sample("grok_request_seconds_count", endpoint="chat", status="200") == before["ok"] + 1
+    assert _sample("grok_request_seconds_count", endpoint="chat", status="503") == before["busy"] + 1
+    assert _sample("grok_retries_total", endpoint="chat", reason="503") == before["retry"] + 1
+    assert _sample("grok_tokens_total", kind="prompt") == before["prompt"] + 7
+    assert timing.grok_calls == 2
+
+
+def test_metrics_endpoint_and_server_timing_header(engine):
+    client = TestClient(app)
+    before = _sample("db_query_seconds_count", operation="SELECT")
+    resp = client.get("/leads/export")
+    assert resp.status_code == 200
+    assert "db;dur=" in resp.headers["server-timing"]
+    assert _sample("db_query_seconds_count", operation="SELECT") > before
+
+    body = client.get("/metrics").text
+    assert 'http_request_seconds_count{method="GET",route="/leads/export",status="200"}' in body
+    assert "grok_concurrency_limit" in body and "qualification_parse_total" in body
+
+
+def test_json_log_lines_carry_structured_fields():
+    record = logging.LogRecord("app.grok", logging.WARNING, __file__, 1, "grok call failed, retrying",
+                               None, None)
+    record.fields = {"status": 429, "attempt": 2}
+    line = json.loads(telemetry.JsonFormatter().format(record))
+    assert line["level"] == "warning" and line["logger"] == "app.grok"
+    assert line["status"] == 429 and line["attempt"] == 2
+
+
+def test_multiprocess_metrics_sum_across_workers(tmp_path):
+    def run(code):
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+        return subprocess.run([sys.executable, "-c", "from app import telemetry; " + code],
+                              cwd=Path(__file__).resolve().parents[1], env=env,
+                              capture_output=True, text=True, check=True).stdout
+
+    for _ in range(2):  # two "workers", each retrying once
+        run("telemetry.GROK_RETRIES.labels('chat', '429').inc()")
+    body = run("print(telemetry.render_metrics()[0].decode())")
+    assert 'grok_retries_total{endpoint="chat",reason="429"} 2.0' in body
+    assert 'grok_in_flight{pid="' in body